@@ -0,0 +1,300 @@
+import hashlib
+import heapq
+import json
+import math
+from collections import OrderedDict
+
+# Event-name keywords used by the analysis scripts
+JOURNEY_KEYWORDS = ('view', 'click', 'start', 'complete', 'submit', 'create',
+                    'edit', 'update', 'delete', 'search', 'filter')
+STRUGGLE_KEYWORDS = ('error', 'fail', 'abandon', 'cancel', 'timeout', 'invalid',
+                     'retry', 'exception')
+
+
+class EventCounts:
+    """Occurrences per event name"""
+
+    def __init__(self):
+        self.counts = {}
+
+    def update(self, event, weight):
+        name = event['event']
+        self.counts[name] = self.counts.get(name, 0) + weight
+
+    def result(self):
+        return dict(self.counts)
+
+
+class PropertyKeys:
+    """Property names seen on each event name"""
+
+    def __init__(self):
+        self.keys = {}
+
+    def update(self, event, weight):
+        keys = self.keys.get(event['event'])
+        if keys is None:
+            keys = self.keys[event['event']] = set()
+        keys.update(event['properties'])
+
+    def result(self):
+        return {name: sorted(keys) for name, keys in self.keys.items()}
+
+
+class UserSequences:
+    """The latest event names of each user by event time, oldest first
+
+    Keeps the max_length newest events (by properties.time, whatever order
+    they arrive in; exports come newest-first) for at most max_users users,
+    dropping the user seen least recently first.
+    """
+
+    def __init__(self, max_length=20, max_users=10000):
+        self.max_length = max_length
+        self.max_users = max_users
+        self.dropped_users = 0
+        self.order = 0
+        self.sequences = OrderedDict()
+
+    def update(self, event, weight):
+        user_id = event['properties'].get('distinct_id')
+        if user_id is None:
+            return
+        sequence = self.sequences.get(user_id)
+        if sequence is None:
+            sequence = self.sequences[user_id] = []
+            if len(self.sequences) > self.max_users:
+                self.sequences.popitem(last=False)
+                self.dropped_users += 1
+        else:
+            self.sequences.move_to_end(user_id)
+        self.order += 1
+        # Min-heap on (time, arrival) holding the user's newest events
+        entry = (event['properties'].get('time', 0), self.order, event['event'])
+        if len(sequence) < self.max_length:
+            heapq.heappush(sequence, entry)
+        elif entry > sequence[0]:
+            heapq.heapreplace(sequence, entry)
+
+    def result(self):
+        return {user_id: [name for _, _, name in sorted(sequence)] for user_id, sequence in self.sequences.items()}
+
+
+class TopK:
+    """Approximate heaviest event names in bounded memory (Space-Saving)
+
+    Tracks at most capacity names; counts are exact while fewer distinct
+    names than that have been seen and otherwise overestimate by at most
+    the reported error.
+    """
+
+    def __init__(self, k=10, capacity=None):
+        self.k = k
+        self.capacity = capacity or k * 10
+        self.counts = {}
+        self.errors = {}
+
+    def update(self, event, weight):
+        name = event['event']
+        if name in self.counts:
+            self.counts[name] += weight
+        elif len(self.counts) < self.capacity:
+            self.counts[name] = weight
+            self.errors[name] = 0
+        else:
+            # Take over the smallest counter, inheriting its count as error
+            smallest = min(self.counts, key=self.counts.__getitem__)
+            floor = self.counts.pop(smallest)
+            del self.errors[smallest]
+            self.counts[name] = floor + weight
+            self.errors[name] = floor
+
+    def result(self):
+        top = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:self.k]
+        return [{'event': name, 'count': count, 'error': self.errors[name]} for name, count in top]
+
+
+class KeywordClassifier:
+    """Buckets event names by keywords in their lowercased name
+
+    Each distinct name is classified once; categories maps a label to its
+    keywords and a name can fall in several categories.
+    """
+
+    def __init__(self, categories):
+        self.categories = {label: tuple(words) for label, words in categories.items()}
+        self._labels = {}
+        self.matches = {label: {} for label in self.categories}
+
+    def update(self, event, weight):
+        name = event['event']
+        labels = self._labels.get(name)
+        if labels is None:
+            lowered = name.lower()
+            labels = self._labels[name] = [
+                label for label, words in self.categories.items()
+                if any(word in lowered for word in words)
+            ]
+        for label in labels:
+            counts = self.matches[label]
+            counts[name] = counts.get(name, 0) + weight
+
+    def result(self):
+        return {label: dict(counts) for label, counts in self.matches.items()}
+
+
+class HyperLogLog:
+    """Cardinality estimate in 2**precision bytes (about 1.6% error at 12)"""
+
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value):
+        digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest()
+        hashed = int.from_bytes(digest, 'big')
+        index = hashed >> (64 - self.precision)
+        remainder = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class DistinctUsers:
+    """Approximate distinct distinct_ids, overall and optionally per event name"""
+
+    def __init__(self, precision=12, per_event=False):
+        self.precision = precision
+        self.per_event = per_event
+        self.total = HyperLogLog(precision)
+        self.by_event = {}
+
+    def update(self, event, weight):
+        user_id = event['properties'].get('distinct_id')
+        if user_id is None:
+            return
+        self.total.add(user_id)
+        if self.per_event:
+            sketch = self.by_event.get(event['event'])
+            if sketch is None:
+                sketch = self.by_event[event['event']] = HyperLogLog(self.precision)
+            sketch.add(user_id)
+
+    def result(self):
+        result = {'total': self.total.count()}
+        if self.per_event:
+            result['by_event'] = {name: sketch.count() for name, sketch in self.by_event.items()}
+        return result
+
+
+class AnalysisEngine:
+    """Runs every registered aggregator over an event stream in one pass
+
+    Aggregators expose update(event, weight) and result(). Events are
+    Mixpanel-shaped dicts from any source; consume() can be handed to
+    event_loader.load_events or PartitionCache.load as the batch sink.
+    """
+
+    def __init__(self):
+        self.aggregators = {}
+        self.events = 0
+
+    def register(self, name, aggregator):
+        self.aggregators[name] = aggregator
+        return aggregator
+
+    def consume(self, events, weight=1):
+        updates = [aggregator.update for aggregator in self.aggregators.values()]
+        for event in events:
+            if not event.get('event'):
+                continue
+            event.setdefault('properties', {})
+            self.events += 1
+            for update in updates:
+                update(event, weight)
+
+    def consume_weighted(self, pairs):
+        """Consume (event, weight) pairs, e.g. pre-aggregated JQL rows"""
+        for event, weight in pairs:
+            self.consume((event,), weight)
+
+    def results(self):
+        return {name: aggregator.result() for name, aggregator in self.aggregators.items()}
+
+
+def jql_events(rows):
+    """Adapt JQL groupBy(["name"(, "properties")], count()) rows to (event, weight)
+
+    Grouped rows carry no distinct_id, so user-level aggregators skip them.
+    """
+    for row in rows:
+        key = row['key']
+        properties = key[1] if len(key) > 1 and isinstance(key[1], dict) else {}
+        yield {'event': key[0], 'properties': properties}, row['value']
+
+
+def standard_engine():
+    """The aggregators behind the analyze_events reports
+
+    Event counts are exact; register TopK as well for bounded-memory top
+    names when the number of distinct names is too large to count exactly.
+    """
+    engine = AnalysisEngine()
+    engine.register('event_counts', EventCounts())
+    engine.register('event_properties', PropertyKeys())
+    engine.register('keywords', KeywordClassifier({'journey': JOURNEY_KEYWORDS, 'struggle': STRUGGLE_KEYWORDS}))
+    engine.register('distinct_users', DistinctUsers())
+    engine.register('user_sequences', UserSequences())
+    return engine
+
+
+def report(engine, path='event_analysis.json'):
+    """Print the analysis summary and save the detailed results to path"""
+    results = engine.results()
+    event_counts = results['event_counts']
+    event_properties = results['event_properties']
+    keywords = results['keywords']
+
+    print("\n=== Event Analysis Summary ===")
+    print(f"Total unique events: {len(event_counts)}")
+    print(f"Distinct users (approx.): {results['distinct_users']['total']}")
+    print("\nTop 10 most frequent events:")
+    for event, count in sorted(event_counts.items(), key=lambda x: x[1], reverse=True)[:10]:
+        print(f"\n- {event}: {count} occurrences")
+        if event_properties.get(event):
+            print("  Properties:", ", ".join(event_properties[event]))
+
+    print("\n=== Potential User Journey Analysis ===")
+    print("\nIdentified journey events:")
+    for event in sorted(keywords['journey']):
+        print(f"- {event}")
+
+    print("\n=== Potential Struggle Points ===")
+    for event, count in sorted(keywords['struggle'].items(), key=lambda x: x[1], reverse=True):
+        print(f"- {event}: {count} occurrences")
+        if event_properties.get(event):
+            print("  Properties:", ", ".join(event_properties[event]))
+
+    analysis = {
+        "total_events": len(event_counts),
+        "event_counts": event_counts,
+        "event_properties": event_properties,
+        "journey_events": sorted(keywords['journey']),
+        "struggle_events": sorted(keywords['struggle']),
+        "distinct_users": results['distinct_users']['total'],
+        "users_with_sequences": len(results['user_sequences'])
+    }
+    with open(path, 'w') as f:
+        json.dump(analysis, f, indent=2)
+    print(f"\nDetailed analysis saved to {path}")
+    return analysis
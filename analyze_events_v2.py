@@ -1,19 +1,14 @@
 import os
 import requests
 from datetime import datetime, timedelta
-import json
-from collections import defaultdict
-from base64 import b64encode
 from dotenv import load_dotenv
 
+from analysis_engine import jql_events, report, standard_engine
+from mixpanel_export import get_auth_header
+
 # Load environment variables
 load_dotenv()
 
-def get_auth_header(api_secret):
-    """Create authorization header for Mixpanel API"""
-    credentials = b64encode(f"{api_secret}:".encode("utf-8")).decode("utf-8")
-    return {"Authorization": f"Basic {credentials}"}
-
 def analyze_event_patterns():
     """Analyze Mixpanel events to identify high-impact AI agent opportunities"""
     try:
@@ -52,38 +47,10 @@ def analyze_event_patterns():
             print(f"Response: {response.text}")
             return False
             
-        # Process events
-        event_counts = {}
-        data = response.json()
-        
-        for event in data:
-            event_name = event['key'][0]
-            event_count = event['value']
-            event_counts[event_name] = event_count
-            
-            # Look for potential error or struggle patterns
-            if any(word in event_name.lower() for word in ['error', 'fail', 'abandon', 'cancel']):
-                print(f"Potential struggle event found: {event_name} (count: {event_count})")
-        
-        # Print summary
-        print("\n=== Event Analysis Summary ===")
-        print(f"Total unique events: {len(event_counts)}")
-        print("\nTop 10 most frequent events:")
-        for event, count in sorted(event_counts.items(), key=lambda x: x[1], reverse=True)[:10]:
-            print(f"- {event}: {count} occurrences")
-            
-        # Save detailed analysis
-        analysis = {
-            "total_events": len(event_counts),
-            "event_counts": event_counts,
-            "potential_struggle_events": [
-                event for event in event_counts.keys()
-                if any(word in event.lower() for word in ['error', 'fail', 'abandon', 'cancel'])
-            ]
-        }
-        
-        with open('event_analysis.json', 'w') as f:
-            json.dump(analysis, f, indent=2)
+        # Analyze patterns in one pass over the grouped rows
+        engine = standard_engine()
+        engine.consume_weighted(jql_events(response.json()))
+        report(engine)
             
         return True
         
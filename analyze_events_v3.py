@@ -1,18 +1,25 @@
 import os
-import requests
-from datetime import datetime, timedelta
-import json
-from collections import defaultdict
-from base64 import b64encode
+from datetime import timedelta
 from dotenv import load_dotenv
 
+from analysis_engine import report, standard_engine
+from event_store import EventStore
+from mixpanel_export import ExportError, ExportFetcher, day_range
+from partition_cache import DEFAULT_TIMEZONE, PartitionCache, project_today
+from sequence_mining import mine_sequences, print_journeys
+
 # Load environment variables
 load_dotenv()
 
-def get_auth_header(api_secret):
-    """Create authorization header for Mixpanel API"""
-    credentials = b64encode(f"{api_secret}:".encode("utf-8")).decode("utf-8")
-    return {"Authorization": f"Basic {credentials}"}
+def analysis_sink(engine, store):
+    """Batch sink feeding the engine every event and the store those with a user"""
+    def consume(batch):
+        engine.consume(batch)
+        store.extend(
+            event for event in batch
+            if event.get('event') and 'distinct_id' in event.get('properties', {})
+        )
+    return consume
 
 def analyze_event_patterns():
     """Analyze Mixpanel events to identify high-impact AI agent opportunities"""
@@ -20,102 +27,39 @@ def analyze_event_patterns():
         # Get credentials
         project_id = "3632652"  # Your project ID
         api_secret = os.getenv("MIXPANEL_API_SECRET")
+        offline = bool(os.getenv("MIXPANEL_OFFLINE"))
         
-        if not api_secret:
-            print("❌ Error: Missing Mixpanel credentials")
+        if not api_secret and not offline:
+            print("❌ Error: Missing Mixpanel credentials (set MIXPANEL_OFFLINE=1 to use the local cache only)")
             return False
             
-        # Set up date range
-        end_date = datetime.now()
+        # Set up date range; export days follow the project's timezone
+        timezone = os.getenv("MIXPANEL_PROJECT_TIMEZONE", DEFAULT_TIMEZONE)
+        end_date = project_today(timezone)
         start_date = end_date - timedelta(days=7)
+        days = day_range(start_date, end_date)
         
-        # Query Mixpanel Export API
-        url = "https://data.mixpanel.com/api/2.0/export"
-        params = {
-            "project_id": project_id,
-            "from_date": start_date.strftime("%Y-%m-%d"),
-            "to_date": end_date.strftime("%Y-%m-%d")
-        }
-        headers = get_auth_header(api_secret)
-        
-        print("Fetching events from Mixpanel...")
-        response = requests.get(url, params=params, headers=headers, stream=True)
-        
-        if response.status_code != 200:
-            print(f"❌ Error: Failed to fetch data. Status code: {response.status_code}")
-            print(f"Response: {response.text}")
-            return False
+        # Only recent (still mutable) and missing days are downloaded; the rest
+        # come from the local cache
+        cache = PartitionCache(os.getenv("MIXPANEL_CACHE_DIR", "export_cache"), timezone)
+        if not offline:
+            print("Fetching events from Mixpanel...")
+            try:
+                fetched = cache.refresh(ExportFetcher(api_secret, project_id, cache.staging), start_date, end_date)
+            except ExportError as e:
+                print(f"❌ Error: Failed to fetch data. {e}")
+                return False
+            print(f"Fetched {len(fetched)} day(s), {len(days) - len(fetched)} from cache")
             
-        # Process events
-        event_counts = defaultdict(int)
-        event_properties = defaultdict(set)
-        user_sequences = defaultdict(list)
+        # Every aggregate in one streaming pass over the cached partitions;
+        # the columnar store keeps per-user order for sequence mining
+        engine = standard_engine()
+        store = EventStore()
         
         print("Processing events...")
-        for line in response.iter_lines():
-            if line:
-                try:
-                    event = json.loads(line)
-                    event_name = event.get('event')
-                    properties = event.get('properties', {})
-                    
-                    if event_name:
-                        event_counts[event_name] += 1
-                        # Store unique property names for each event
-                        event_properties[event_name].update(properties.keys())
-                        
-                except json.JSONDecodeError:
-                    continue
-        
-        # Print summary
-        print("\n=== Event Analysis Summary ===")
-        print(f"Total unique events: {len(event_counts)}")
-        print("\nTop 10 most frequent events:")
-        for event, count in sorted(event_counts.items(), key=lambda x: x[1], reverse=True)[:10]:
-            print(f"\n- {event}: {count} occurrences")
-            print("  Properties:", ", ".join(sorted(event_properties[event])))
-            
-        # Look for potential user journey patterns
-        print("\n=== Potential User Journey Analysis ===")
-        journey_events = [
-            event for event, props in event_properties.items()
-            if any(word in event.lower() for word in [
-                'view', 'click', 'start', 'complete', 'submit', 'create', 
-                'edit', 'update', 'delete', 'search', 'filter'
-            ])
-        ]
-        
-        print("\nIdentified journey events:")
-        for event in sorted(journey_events):
-            print(f"- {event}")
-            
-        # Look for potential struggle points
-        print("\n=== Potential Struggle Points ===")
-        struggle_events = [
-            (event, count) for event, count in event_counts.items()
-            if any(word in event.lower() for word in [
-                'error', 'fail', 'abandon', 'cancel', 'timeout', 'invalid',
-                'retry', 'exception'
-            ])
-        ]
-        
-        for event, count in sorted(struggle_events, key=lambda x: x[1], reverse=True):
-            print(f"- {event}: {count} occurrences")
-            print("  Properties:", ", ".join(sorted(event_properties[event])))
-            
-        # Save detailed analysis
-        analysis = {
-            "total_events": len(event_counts),
-            "event_counts": dict(event_counts),
-            "event_properties": {k: list(v) for k, v in event_properties.items()},
-            "journey_events": journey_events,
-            "struggle_events": [e[0] for e in struggle_events]
-        }
-        
-        with open('event_analysis.json', 'w') as f:
-            json.dump(analysis, f, indent=2)
-            
-        print("\nDetailed analysis saved to event_analysis.json")
+        cache.load(analysis_sink(engine, store), days=days)
+        report(engine)
+        print_journeys(mine_sequences(store))
         return True
         
     except Exception as e:
@@ -1,12 +1,33 @@
-from flask import Flask, render_template, jsonify, request, send_from_directory
+from flask import Flask, Response, render_template, jsonify, request, send_from_directory, stream_with_context
+import base64
+import hashlib
 import json
 from datetime import datetime, timedelta
 import speech_recognition as sr
 from gtts import gTTS
 import os
 import re
-import subprocess
 import logging
+import threading
+import time
+import uuid
+
+from audio_cache import AudioCache
+from audio_pipeline import SAMPLE_WIDTH, TARGET_RATE, decode_audio
+from audio_workspace import AudioWorkspace
+from dialog import Dialog
+from event_snapshot import load_store
+from event_store import EventStore
+from funnel import FunnelIndex
+from partition_cache import PartitionCache
+from recognizers import router_from_config
+from session_store import session_store_from_config
+from sessions import DEFAULT_SESSION_GAP
+from stuck_detector import InvalidEvent, StuckUserDetector
+from stuck_rules import load_rules
+from struggle_scoring import score_struggles
+from voice_jobs import DEFAULT_STAGE_TIMEOUTS, QueueFull, VoiceJobPool
+from voice_stream import VoiceStreamRegistry
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -17,214 +38,124 @@ app = Flask(__name__, static_folder='static')
 # Ensure static/audio directory exists
 os.makedirs('static/audio', exist_ok=True)
 
-# Load events data
-try:
-    with open('events-export-3632652-1742487314667.json', 'r') as f:
-        events = json.load(f)
-except FileNotFoundError:
-    logger.warning("Events file not found. Using empty events list.")
-    events = []
+# Map the export's binary snapshot, or stream-parse the export and write one
+EVENTS_FILE = os.getenv('EVENTS_FILE', 'events-export-3632652-1742487314667.json')
+# Partition cache kept current by partition_cache.py; takes precedence over EVENTS_FILE
+EVENTS_CACHE_DIR = os.getenv('EVENTS_CACHE_DIR')
+if EVENTS_CACHE_DIR:
+    event_store = EventStore()
+    PartitionCache(EVENTS_CACHE_DIR).load(event_store.extend)
+    logger.info(f"Loaded {len(event_store)} events from partition cache {EVENTS_CACHE_DIR}")
+else:
+    try:
+        event_store = load_store(EVENTS_FILE)
+        logger.info(f"Loaded {len(event_store)} events from {EVENTS_FILE}")
+    except FileNotFoundError:
+        logger.warning("Events file not found. Using empty events list.")
+        event_store = EventStore()
+# Inactivity gap (seconds) that ends a session for dwell-time tracking
+SESSION_GAP = float(os.getenv('SESSION_GAP_SECONDS', DEFAULT_SESSION_GAP))
+# Optional JSON list of stuck-user rules; defaults to stuck_rules.DEFAULT_RULES
+STUCK_RULES_PATH = os.getenv('STUCK_RULES_PATH')
+stuck_rules = load_rules(STUCK_RULES_PATH) if STUCK_RULES_PATH else None
+stuck_detector = StuckUserDetector(event_store, session_gap=SESSION_GAP, rules=stuck_rules)
+# First/last occurrence arrays for local funnels, built per event on first use
+funnel_index = FunnelIndex(event_store, lock=stuck_detector.store_lock)
 
-# Conversation states
-conversation_states = {}
+# Optional retention for ingested events, so memory stays bounded
+EVENT_RETENTION_DAYS = os.getenv('EVENT_RETENTION_DAYS')
 
-def convert_webm_to_wav(webm_path, wav_path):
-    """Convert WebM audio to WAV using ffmpeg"""
-    try:
-        subprocess.run([
-            'ffmpeg', '-i', webm_path,
-            '-acodec', 'pcm_s16le',
-            '-ar', '44100',
-            '-ac', '1',
-            wav_path
-        ], check=True, capture_output=True)
-        return True
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Error converting audio: {e.stderr.decode()}")
-        return False
-
-def analyze_user_context(user_events):
-    """Analyze user's behavior to understand their context and struggles"""
-    context = {
-        'feature_attempts': {},
-        'last_actions': [],
-        'time_spent': {},
-        'error_events': [],
-        'navigation_pattern': []
-    }
-    
-    # Sort events by time
-    sorted_events = sorted(user_events, key=lambda x: x['properties']['time'])
-    
-    for event in sorted_events:
-        event_name = event['event']
-        properties = event['properties']
-        
-        # Track feature attempts
-        if event_name.startswith('feature_'):
-            feature = event_name.replace('feature_', '')
-            if feature not in context['feature_attempts']:
-                context['feature_attempts'][feature] = 0
-            context['feature_attempts'][feature] += 1
-        
-        # Track last actions
-        context['last_actions'].append({
-            'event': event_name,
-            'time': properties['time'],
-            'properties': properties
-        })
-        
-        # Track error events
-        if 'error' in event_name.lower() or 'failed' in event_name.lower():
-            context['error_events'].append(event)
-        
-        # Track navigation
-        if event_name == 'page_view' or event_name == 'screen_view':
-            context['navigation_pattern'].append({
-                'screen': properties.get('screen_name', 'unknown'),
-                'time': properties['time']
-            })
-    
-    # Keep only last 10 actions
-    context['last_actions'] = context['last_actions'][-10:]
-    
-    return context
+def start_event_retention(retention, interval=3600):
+    """Compact the event store periodically on a daemon thread"""
+    def sweep():
+        while True:
+            try:
+                dropped = stuck_detector.apply_retention(retention)
+                logger.debug(f"Event retention dropped {dropped} events")
+            except Exception as e:
+                logger.warning(f"Event retention failed: {e}")
+            time.sleep(interval)
+
+    threading.Thread(target=sweep, daemon=True).start()
+
+if EVENT_RETENTION_DAYS:
+    start_event_retention(float(EVENT_RETENTION_DAYS) * 24 * 3600)
+
+# Conversation states, bounded and expiring (SESSION_STORE=sqlite to share across workers)
+conversation_store = session_store_from_config()
+
+def synthesize_speech(text, lang, path):
+    """Render text to an mp3 file with gTTS"""
+    gTTS(text=text, lang=lang, timeout=DEFAULT_STAGE_TIMEOUTS['respond']).save(path)
+
+# Synthesized speech is cached by content, so repeated prompts are a file lookup
+AUDIO_CACHE_MAX_BYTES = int(os.getenv('AUDIO_CACHE_MAX_BYTES', 50 * 1024 * 1024))
+audio_cache = AudioCache('static/audio/cache', synthesize_speech, max_bytes=AUDIO_CACHE_MAX_BYTES)
+
+# Scratch space for uploads/conversions, one directory per request
+audio_workspace = AudioWorkspace(os.getenv('AUDIO_WORKDIR'))
+audio_workspace.cleanup_expired()
+audio_workspace.start_cleanup()
+
+def audio_url(filename):
+    return f'/static/audio/cache/{filename}'
+
+# Fields kept by /api/stuck-users?summary=1
+SUMMARY_FIELDS = ('user_id', 'app_opens', 'features', 'struggling_with')
+# Distinguishes this process's snapshot versions in ETags across restarts
+INSTANCE_ID = uuid.uuid4().hex[:8]
 
 def detect_stuck_users():
-    # Group events by user
-    user_events = {}
-    for event in events:
-        user_id = event['properties']['distinct_id']
-        if user_id not in user_events:
-            user_events[user_id] = []
-        user_events[user_id].append(event)
-    
-    # Find stuck users with context
-    stuck_users = []
-    for user_id, user_events_list in user_events.items():
-        app_opens = [e for e in user_events_list if e['event'] == 'app open']
-        feature_uses = [e for e in user_events_list if e['event'] == 'favorite sandwich']
-        
-        if len(app_opens) >= 5 and len(feature_uses) == 0:
-            # Analyze user context
-            context = analyze_user_context(user_events_list)
-            
-            # Determine what they're trying to do
-            struggling_with = determine_struggle(context)
-            
-            stuck_users.append({
-                'user_id': user_id,
-                'app_opens': len(app_opens),
-                'last_event': max(user_events_list, key=lambda x: x['properties']['time']),
-                'context': context,
-                'struggling_with': struggling_with
-            })
-    
-    return stuck_users
+    """Return the materialized stuck-user snapshot"""
+    return stuck_detector.stuck_users()
 
-def determine_struggle(context):
-    """Determine what the user is struggling with based on their behavior"""
-    struggles = []
-    
-    # Check for repeated feature attempts
-    for feature, attempts in context['feature_attempts'].items():
-        if attempts >= 3:
-            struggles.append(f"repeated_attempts_{feature}")
-    
-    # Check for error patterns
-    if len(context['error_events']) >= 2:
-        struggles.append("frequent_errors")
-    
-    # Check navigation patterns
-    if len(context['navigation_pattern']) >= 3:
-        # Look for back-and-forth navigation
-        screens = [n['screen'] for n in context['navigation_pattern']]
-        if len(set(screens)) >= 3 and len(screens) >= 5:
-            struggles.append("confused_navigation")
-    
-    # Check time spent on specific screens
-    for screen, time in context['time_spent'].items():
-        if time > 300:  # More than 5 minutes
-            struggles.append(f"long_time_{screen}")
-    
-    return struggles
+# Every canned reply generate_response can give, so their audio can be pre-rendered
+INITIAL_MESSAGE = "I notice you haven't used the favorite sandwich feature yet. What are you trying to do?"
+RESPONSES = {
+    'struggle_repeated_attempts': "I notice you've tried to use the favorite sandwich feature several times. Let me help you with that. What specific part are you finding difficult?",
+    'struggle_frequent_errors': "I see you've encountered some errors. Let me help you avoid those. Could you tell me what you're trying to do?",
+    'struggle_confused_navigation': "I notice you've been looking around different screens. Let me help you find what you're looking for. What are you trying to accomplish?",
+    'struggle_long_time_builder': "I see you've spent some time in the sandwich builder. Would you like help saving your creation as a favorite?",
+    'help_needed': "I understand you need help. Could you tell me what you're trying to do with the favorite sandwich feature?",
+    'explanation_needed': "Let me explain how the favorite sandwich feature works. You can save your favorite sandwich combinations to quickly reorder them later. Would you like me to show you how to use it?",
+    'clarification_needed': "I'm not sure I understand. Are you having trouble finding the favorite sandwich feature, or would you like to know more about how it works?",
+    'save_tutorial': "Great! To save a sandwich as your favorite, first customize your sandwich, then look for the heart icon. Click it to save your creation. Would you like me to guide you through this process?",
+    'help_needed_retry': "Could you be more specific about what you're trying to do? Are you trying to save a sandwich, find your saved sandwiches, or something else?",
+    'tutorial_start': "Perfect! Let's start by creating your first favorite sandwich. First, go to the sandwich builder. Can you see that option on your screen?",
+    'explanation_declined': "No problem! Let me know if you change your mind and want to learn more about the favorite sandwich feature.",
+    'location_help': "The favorite sandwich feature is located in the sandwich builder. Look for the heart icon at the top of the screen. Can you see it?",
+    'clarification_declined': "I understand. If you need help with the favorite sandwich feature in the future, just let me know!",
+    'next_step': "Great! Now, customize your sandwich as you like. Once you're happy with your creation, look for the heart icon and click it to save. Let me know when you've done that!",
+    'tutorial_retry': "Take your time to find the sandwich builder. It should be on the main menu. Can you see it?",
+    'complete': "Excellent! You've successfully saved your favorite sandwich. You can find it anytime by clicking the 'Favorites' tab. Is there anything else you'd like to know?",
+    'next_step_retry': "No rush! Let me know when you've saved your sandwich, and I'll help you with the next step."
+}
+
+# Stage flow from dialog.DIALOG, keyword lists compiled once at startup
+dialog = Dialog()
+
+def new_conversation(context=None):
+    """Initial conversation state; only the struggle labels are kept from context"""
+    return {
+        'stage': 'initial',
+        'context': {'struggling_with': context['struggling_with']} if context else None
+    }
 
 def generate_response(user_text, user_id, context=None):
     """Generate a contextual response based on user's behavior"""
-    # Initialize conversation state if not exists
-    if user_id not in conversation_states:
-        conversation_states[user_id] = {
-            'stage': 'initial',
-            'context': context
-        }
-    
-    state = conversation_states[user_id]
-    
-    # Convert to lowercase for easier matching
-    text = user_text.lower()
-    
-    # Use context to personalize the response
-    if context and state['context']:
-        struggles = state['context'].get('struggling_with', [])
-        
-        if 'repeated_attempts_favorite_sandwich' in struggles:
-            return "I notice you've tried to use the favorite sandwich feature several times. Let me help you with that. What specific part are you finding difficult?"
-        elif 'frequent_errors' in struggles:
-            return "I see you've encountered some errors. Let me help you avoid those. Could you tell me what you're trying to do?"
-        elif 'confused_navigation' in struggles:
-            return "I notice you've been looking around different screens. Let me help you find what you're looking for. What are you trying to accomplish?"
-        elif 'long_time_sandwich_builder' in struggles:
-            return "I see you've spent some time in the sandwich builder. Would you like help saving your creation as a favorite?"
-    
-    # Fall back to the original conversation flow if no specific context
-    if state['stage'] == 'initial':
-        # Check for common issues
-        if any(word in text for word in ['help', 'stuck', 'confused', 'how', 'what']):
-            state['stage'] = 'help_needed'
-            return "I understand you need help. Could you tell me what you're trying to do with the favorite sandwich feature?"
-        elif any(word in text for word in ['don\'t know', 'not sure', 'explain']):
-            state['stage'] = 'explanation_needed'
-            return "Let me explain how the favorite sandwich feature works. You can save your favorite sandwich combinations to quickly reorder them later. Would you like me to show you how to use it?"
-        else:
-            state['stage'] = 'clarification_needed'
-            return "I'm not sure I understand. Are you having trouble finding the favorite sandwich feature, or would you like to know more about how it works?"
-    
-    elif state['stage'] == 'help_needed':
-        if any(word in text for word in ['save', 'remember', 'store']):
-            state['stage'] = 'tutorial'
-            return "Great! To save a sandwich as your favorite, first customize your sandwich, then look for the heart icon. Click it to save your creation. Would you like me to guide you through this process?"
-        else:
-            return "Could you be more specific about what you're trying to do? Are you trying to save a sandwich, find your saved sandwiches, or something else?"
-    
-    elif state['stage'] == 'explanation_needed':
-        if any(word in text for word in ['yes', 'sure', 'okay', 'show']):
-            state['stage'] = 'tutorial'
-            return "Perfect! Let's start by creating your first favorite sandwich. First, go to the sandwich builder. Can you see that option on your screen?"
-        else:
-            state['stage'] = 'initial'
-            return "No problem! Let me know if you change your mind and want to learn more about the favorite sandwich feature."
+    # Initialize conversation state if not exists (or expired)
+    state = conversation_store.get(user_id)
+    if state is None:
+        state = new_conversation(context)
     
-    elif state['stage'] == 'clarification_needed':
-        if any(word in text for word in ['find', 'where', 'location']):
-            state['stage'] = 'location_help'
-            return "The favorite sandwich feature is located in the sandwich builder. Look for the heart icon at the top of the screen. Can you see it?"
-        else:
-            state['stage'] = 'initial'
-            return "I understand. If you need help with the favorite sandwich feature in the future, just let me know!"
-    
-    elif state['stage'] == 'tutorial':
-        if any(word in text for word in ['yes', 'see', 'found']):
-            state['stage'] = 'next_step'
-            return "Great! Now, customize your sandwich as you like. Once you're happy with your creation, look for the heart icon and click it to save. Let me know when you've done that!"
-        else:
-            return "Take your time to find the sandwich builder. It should be on the main menu. Can you see it?"
-    
-    elif state['stage'] == 'next_step':
-        if any(word in text for word in ['done', 'finished', 'saved']):
-            state['stage'] = 'complete'
-            return "Excellent! You've successfully saved your favorite sandwich. You can find it anytime by clicking the 'Favorites' tab. Is there anything else you'd like to know?"
-        else:
-            return "No rush! Let me know when you've saved your sandwich, and I'll help you with the next step."
+    response = advance_conversation(state, user_text, context)
+    conversation_store.set(user_id, state)
+    return response
+
+def advance_conversation(state, user_text, context=None):
+    """Pick the reply for user_text, moving state to the next stage"""
+    reply = dialog.respond(state, user_text, context)
+    return RESPONSES[reply] if reply else None
 
 @app.route('/')
 def index():
@@ -232,84 +163,400 @@ def index():
 
 @app.route('/api/stuck-users')
 def get_stuck_users():
-    stuck_users = detect_stuck_users()
-    return jsonify(stuck_users)
+    """Stuck users as a JSON list, optionally paged, filtered and trimmed
+
+    ?limit=N&cursor=C pages through users in user_id order (the next cursor
+    is in X-Next-Cursor, the match count in X-Total-Count), ?struggle=label
+    filters, ?summary=1 keeps only SUMMARY_FIELDS and ?fields=a,b picks
+    fields. Responses carry an ETag on the snapshot version, so polling
+    with If-None-Match gets a 304 until the set changes.
+    """
+    snapshot = stuck_detector.snapshot()
+    etag = f"{INSTANCE_ID}-{snapshot.version}-{hashlib.sha1(request.query_string).hexdigest()[:16]}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    try:
+        limit = request.args.get('limit', type=int)
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be positive")
+        cursor = request.args.get('cursor')
+        after = base64.urlsafe_b64decode(cursor).decode('utf-8') if cursor else None
+    except ValueError as e:
+        return jsonify({'error': f"Invalid paging parameters: {e}"}), 400
+
+    fields = request.args.get('fields')
+    if fields:
+        fields = ['user_id'] + [f for f in fields.split(',') if f and f != 'user_id']
+    elif request.args.get('summary') in ('1', 'true'):
+        fields = SUMMARY_FIELDS
+
+    users, last, total = snapshot.page(after, limit, request.args.get('struggle'))
+    if fields:
+        users = [{field: user[field] for field in fields if field in user} for user in users]
+
+    response = jsonify(users)
+    response.headers['X-Total-Count'] = str(total)
+    if last is not None:
+        response.headers['X-Next-Cursor'] = base64.urlsafe_b64encode(last.encode('utf-8')).decode('ascii')
+    response.headers['X-Change-Sequence'] = str(snapshot.sequence)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.set_etag(etag)
+    return response
+
+# Seconds between keep-alive comments on an idle change stream
+CHANGE_STREAM_KEEPALIVE = 15
+
+@app.route('/api/stuck-users/changes')
+def stream_stuck_user_changes():
+    """Server-Sent Events feed of became_stuck / recovered / label_changed deltas
+
+    Starts after ?since=N (the X-Change-Sequence of a /api/stuck-users
+    response) or, on reconnect, after the browser's Last-Event-ID. A
+    'reset' event means the changes can't be replayed and the client
+    should reload the list.
+    """
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        since = int(since) if since else stuck_detector.sequence
+    except ValueError:
+        return jsonify({'error': 'Invalid change sequence'}), 400
+
+    def events(sequence):
+        yield 'retry: 3000\n\n'
+        while True:
+            changes = stuck_detector.changes_since(sequence, timeout=CHANGE_STREAM_KEEPALIVE)
+            if changes is None:
+                sequence = stuck_detector.sequence
+                yield f"id: {sequence}\nevent: reset\ndata: {{}}\n\n"
+            elif not changes:
+                yield ': keep-alive\n\n'
+            for change in changes or ():
+                sequence = change['seq']
+                yield f"id: {sequence}\nevent: {change['type']}\ndata: {json.dumps(change)}\n\n"
+
+    return Response(stream_with_context(events(since)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/funnel')
+def get_funnel():
+    # ?steps=app open,order sandwich,favorite sandwich&window=3600
+    steps = [step.strip() for step in request.args.get('steps', '').split(',') if step.strip()]
+    if not steps:
+        return jsonify({'error': 'steps is required'}), 400
+    window = request.args.get('window', type=float)
+    return jsonify(funnel_index.funnel(steps, window=window))
+
+@app.route('/api/intervention-impact')
+def get_intervention_impact():
+    # ?intervention=<event name>&success=<event name>[&attempt=<event name>]
+    intervention = request.args.get('intervention')
+    success = request.args.get('success')
+    if not intervention or not success:
+        return jsonify({'error': 'intervention and success are required'}), 400
+    return jsonify(funnel_index.compare_intervention(intervention, success, request.args.get('attempt')))
+
+@app.route('/api/struggles')
+def get_struggles():
+    # ?users=u1,u2 limits scoring to those users; everyone otherwise
+    users = [user.strip() for user in request.args.get('users', '').split(',') if user.strip()]
+    with stuck_detector.store_lock:
+        labels = score_struggles(event_store, users or None, session_gap=stuck_detector.session_gap)
+    return jsonify(labels)
+
+@app.route('/api/events', methods=['POST'])
+def append_events():
+    try:
+        new_events = request.get_json(silent=True)
+        if isinstance(new_events, dict):
+            new_events = [new_events]
+        if not isinstance(new_events, list):
+            return jsonify({'error': 'Expected a JSON event or list of events'}), 400
+        changed = stuck_detector.append_events(new_events)
+        return jsonify({
+            'status': 'success',
+            'appended': len(new_events),
+            'stuck_users_changed': len(changed),
+            'version': stuck_detector.version
+        })
+    except InvalidEvent as e:
+        # Nothing from the batch was stored, so the client can fix and resend it
+        return jsonify({'error': str(e), 'index': e.index}), 400
+    except Exception as e:
+        logger.error(f"Error in append_events: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/start-conversation', methods=['POST'])
 def start_conversation():
     try:
         user_id = request.json.get('user_id')
-        # Generate speech
-        text = "I notice you haven't used the favorite sandwich feature yet. What are you trying to do?"
-        tts = gTTS(text=text, lang='en')
-        tts.save('static/audio/initial_message.mp3')
-        return jsonify({'status': 'success'})
+        # Start over with the user's precomputed struggle context, if flagged
+        conversation_store.set(user_id, new_conversation(stuck_detector.get_context(user_id)))
+        # Generate speech (cached after the first request)
+        filename = audio_cache.get(INITIAL_MESSAGE)
+        return jsonify({'status': 'success', 'text': INITIAL_MESSAGE, 'audio_url': audio_url(filename)})
     except Exception as e:
         logger.error(f"Error in start_conversation: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def run_voice_turn(job, payload):
+    """Decode, recognize and answer one voice turn (runs on a pool worker)
+
+    payload carries either 'audio' (an uploaded WebM file) or 'pcm' (16 kHz
+    mono PCM already decoded by a voice stream). With 'stream_reply' the
+    reply audio is left for the reply endpoint to stream instead of being
+    synthesized here.
+    """
+    user_id = payload['user_id']
+    
+    if 'pcm' in payload:
+        audio = sr.AudioData(payload['pcm'], TARGET_RATE, SAMPLE_WIDTH)
+    else:
+        # Decode in memory straight to 16 kHz mono, using the per-request
+        # directory only if we have to fall back to the ffmpeg CLI
+        with audio_workspace.request_dir() as workdir:
+            with job.run_stage('decode'):
+                audio, decoder = decode_audio(payload['audio'], workdir, timeout=job.timeout('decode'))
+            logger.debug(f"Decoded audio with {decoder} in {job.timings['decode']}s")
+        if audio is None:
+            return {'error': 'Could not process audio format. Please try again.'}
+    
+    # Convert speech to text
+    with job.run_stage('recognize'):
+        recognizer = sr.Recognizer()
+        recognizer.operation_timeout = job.timeout('recognize')
+        if not isinstance(audio, sr.AudioData):
+            with sr.AudioFile(audio) as source:
+                # Adjust for ambient noise
+                logger.debug("Adjusting for ambient noise...")
+                recognizer.adjust_for_ambient_noise(source, duration=0.5)
+                
+                # Record audio
+                logger.debug("Recording audio...")
+                audio = recognizer.record(source)
+        
+        try:
+            text, backend = recognizer_router.recognize(recognizer, audio)
+            logger.debug(f"Recognized text with {backend}: {text}")
+        except sr.UnknownValueError:
+            logger.error("Speech recognition failed - could not understand audio")
+            return {'error': 'Could not understand audio. Please try speaking more clearly.'}
+        except sr.RequestError as e:
+            logger.error(f"Speech recognition service error: {str(e)}")
+            return {'error': 'There was an error with the speech recognition service. Please try again.'}
+    
+    with job.run_stage('respond'):
+        # Generate response
+        response = generate_response(text, user_id, stuck_detector.get_context(user_id))
+        
+        # Convert response to speech, unless the caller streams it
+        if payload.get('stream_reply'):
+            return {'text': text, 'response': response}
+        filename = audio_cache.get(response)
+    
+    return {
+        'text': text,
+        'response': response,
+        'audio_url': audio_url(filename)
+    }
+
+# Speech-to-text engines, chosen by RECOGNIZER_BACKENDS (e.g. "google,sphinx")
+recognizer_router = router_from_config()
+
+# Voice turns run on a fixed pool of workers behind a bounded queue
+voice_pool = VoiceJobPool(
+    run_voice_turn,
+    workers=int(os.getenv('VOICE_WORKERS', 4)),
+    max_queue=int(os.getenv('VOICE_QUEUE_SIZE', 64))
+)
+
+# Longest a client may long-poll a voice job, in seconds
+MAX_JOB_WAIT = 30
+
+def submit_voice_job():
+    """Queue the uploaded audio; returns (job, None) or (None, 429 response)"""
+    audio_file = request.files['audio']
+    user_id = request.form.get('user_id', 'default_user')
+    try:
+        return voice_pool.submit({'audio': audio_file.read(), 'user_id': user_id}), None
+    except QueueFull as e:
+        response = jsonify({
+            'error': 'The voice service is busy. Please try again shortly.',
+            'queue_depth': e.depth,
+            'retry_after': e.retry_after
+        })
+        response.headers['Retry-After'] = str(e.retry_after)
+        return None, (response, 429)
+
+def voice_job_response(job):
+    """Flatten a finished job into the process-voice response shape"""
+    if job.status == 'done':
+        return jsonify(job.result)
+    logger.error(f"Unexpected error in voice job {job.id}: {job.error}")
+    return jsonify({'error': 'An unexpected error occurred. Please try again.'})
+
 @app.route('/api/process-voice', methods=['POST'])
 def process_voice():
     try:
-        # Get audio file from request
-        audio_file = request.files['audio']
-        user_id = request.form.get('user_id', 'default_user')
-        
-        # Save WebM audio temporarily
-        webm_path = 'temp_audio.webm'
-        wav_path = 'temp_audio.wav'
-        audio_file.save(webm_path)
-        logger.debug(f"Saved WebM audio to {webm_path}")
-        
-        # Convert WebM to WAV
-        if not convert_webm_to_wav(webm_path, wav_path):
-            return jsonify({'error': 'Could not process audio format. Please try again.'})
-        
-        # Convert speech to text
-        recognizer = sr.Recognizer()
-        with sr.AudioFile(wav_path) as source:
-            # Adjust for ambient noise
-            logger.debug("Adjusting for ambient noise...")
-            recognizer.adjust_for_ambient_noise(source, duration=0.5)
-            
-            # Record audio
-            logger.debug("Recording audio...")
-            audio = recognizer.record(source)
-            
-            try:
-                text = recognizer.recognize_google(audio)
-                logger.debug(f"Recognized text: {text}")
-                
-                # Generate response
-                response = generate_response(text, user_id)
-                
-                # Convert response to speech
-                tts = gTTS(text=response, lang='en')
-                tts.save('static/audio/response.mp3')
-                
-                # Clean up
-                os.remove(webm_path)
-                os.remove(wav_path)
-                return jsonify({
-                    'text': text,
-                    'response': response
-                })
-            except sr.UnknownValueError:
-                logger.error("Speech recognition failed - could not understand audio")
-                return jsonify({'error': 'Could not understand audio. Please try speaking more clearly.'})
-            except sr.RequestError as e:
-                logger.error(f"Speech recognition service error: {str(e)}")
-                return jsonify({'error': 'There was an error with the speech recognition service. Please try again.'})
-            except Exception as e:
-                logger.error(f"Unexpected error in speech recognition: {str(e)}")
-                return jsonify({'error': 'An unexpected error occurred. Please try again.'})
+        job, busy = submit_voice_job()
+        if busy:
+            return busy
+        if not job.wait(sum(voice_pool.stage_timeouts.values())):
+            return jsonify({'error': 'Processing your message took too long. Please try again.'}), 504
+        return voice_job_response(job)
     except Exception as e:
         logger.error(f"Error in process_voice: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/voice-jobs', methods=['POST'])
+def create_voice_job():
+    try:
+        job, busy = submit_voice_job()
+        if busy:
+            return busy
+        return jsonify({
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f'/api/voice-jobs/{job.id}'
+        }), 202
+    except Exception as e:
+        logger.error(f"Error in create_voice_job: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/voice-jobs/<job_id>')
+def get_voice_job(job_id):
+    job = voice_pool.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    # Long-poll: hold the request until the job finishes or the wait runs out
+    wait = min(request.args.get('wait', 0, type=float), MAX_JOB_WAIT)
+    if wait > 0:
+        job.wait(wait)
+    if not job.done:
+        return jsonify(job.to_dict()), 202
+    payload = job.to_dict()
+    if job.status == 'failed':
+        payload['error'] = 'An unexpected error occurred. Please try again.'
+    return jsonify(payload)
+
+# Voice turns uploaded in chunks while the user is still speaking
+voice_streams = VoiceStreamRegistry()
+stream_lock = threading.Lock()
+
+def start_stream_recognition(stream):
+    """Queue recognition for a stream as soon as its speech has ended"""
+    with stream_lock:
+        if stream.job is not None:
+            return
+        payload = {'user_id': stream.user_id, 'stream_reply': True}
+        if stream.incremental and stream.decode_error is None:
+            payload['pcm'] = stream.utterance_pcm()
+        else:
+            payload['audio'] = bytes(stream.received)
+        try:
+            stream.job = voice_pool.submit(payload)
+        except QueueFull as e:
+            logger.warning(f"Voice stream {stream.id} could not be queued: {e}")
+
+@app.route('/api/voice-streams', methods=['POST'])
+def create_voice_stream():
+    user_id = (request.get_json(silent=True) or {}).get('user_id', 'default_user')
+    stream = voice_streams.create(user_id, on_speech_end=start_stream_recognition)
+    if stream is None:
+        return jsonify({'error': 'Too many open voice streams. Please try again shortly.'}), 429
+    return jsonify(stream.to_dict()), 201
+
+@app.route('/api/voice-streams/<stream_id>/chunks', methods=['POST'])
+def add_voice_stream_chunk(stream_id):
+    stream = voice_streams.get(stream_id)
+    if stream is None:
+        return jsonify({'error': 'Unknown or expired voice stream'}), 404
+    try:
+        stream.add_chunk(request.args.get('seq', type=int), request.get_data())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    # Tells the client it can stop recording: recognition is already running
+    return jsonify(stream.to_dict())
+
+@app.route('/api/voice-streams/<stream_id>/finish', methods=['POST'])
+def finish_voice_stream(stream_id):
+    stream = voice_streams.get(stream_id)
+    if stream is None:
+        return jsonify({'error': 'Unknown or expired voice stream'}), 404
+    # Kept only while the client may retry /finish or still fetch /reply
+    keep_stream = False
+    try:
+        stream.finish()
+        if stream.job is None:
+            # No end of speech detected yet: use everything that was decoded
+            if stream.incremental:
+                stream.wait_decoded(voice_pool.stage_timeouts['decode'])
+            start_stream_recognition(stream)
+        if stream.job is None:
+            keep_stream = True
+            response = jsonify({'error': 'The voice service is busy. Please try again shortly.'})
+            response.headers['Retry-After'] = '1'
+            return response, 429
+        if not stream.job.wait(sum(voice_pool.stage_timeouts.values())):
+            return jsonify({'error': 'Processing your message took too long. Please try again.'}), 504
+        if stream.job.status != 'done':
+            return voice_job_response(stream.job)
+        result = dict(stream.job.result)
+        if 'response' in result:
+            stream.reply_text = result['response']
+            # Already-cached replies are served as files; the rest stream
+            filename = audio_cache.lookup(stream.reply_text)
+            keep_stream = not filename
+            result['audio_url'] = audio_url(filename) if filename else f'/api/voice-streams/{stream.id}/reply'
+        return jsonify(result)
+    except Exception as e:
+        logger.error(f"Error in finish_voice_stream: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if not keep_stream:
+            voice_streams.remove(stream.id)
+
+@app.route('/api/voice-streams/<stream_id>/reply')
+def stream_voice_reply(stream_id):
+    stream = voice_streams.get(stream_id)
+    if stream is None or stream.reply_text is None:
+        return jsonify({'error': 'No reply for this voice stream'}), 404
+    # The reply text is all that's needed from here on
+    voice_streams.remove(stream.id)
+    filename = audio_cache.lookup(stream.reply_text)
+    if filename:
+        return send_from_directory(audio_cache.directory, filename)
+    # Send MP3 bytes as gTTS produces them, caching the finished file
+    chunks = gTTS(text=stream.reply_text, lang='en', timeout=DEFAULT_STAGE_TIMEOUTS['respond']).stream()
+    return Response(stream_with_context(audio_cache.stream(stream.reply_text, 'en', chunks)), mimetype='audio/mpeg')
+
+@app.route('/api/metrics')
+def get_metrics():
+    return jsonify({
+        'audio_cache': audio_cache.stats(),
+        'audio_workspace': audio_workspace.stats(),
+        'voice_pool': voice_pool.stats(),
+        'recognizers': recognizer_router.stats(),
+        'voice_streams': voice_streams.stats(),
+        'conversations': conversation_store.stats(),
+        'stuck_users': {
+            'count': len(stuck_detector.stuck_users()),
+            'version': stuck_detector.version
+        }
+    })
+
 @app.route('/static/audio/<path:filename>')
 def serve_audio(filename):
     return send_from_directory('static/audio', filename)
 
+def prewarm_audio_cache():
+    """Render every canned prompt in the background so first use is a cache hit"""
+    texts = [INITIAL_MESSAGE] + list(RESPONSES.values())
+    threading.Thread(target=audio_cache.prewarm, args=(texts,), daemon=True).start()
+
+prewarm_audio_cache()
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=8080) 
\ No newline at end of file
+    app.run(debug=True, host='0.0.0.0', port=8080, threaded=True) 
\ No newline at end of file
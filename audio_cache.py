@@ -0,0 +1,162 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+
+class AudioCache:
+    """Content-addressed, size-bounded LRU cache of synthesized speech files
+
+    Files are named after a hash of (lang, text), so a given prompt is only
+    synthesized once and its URL never changes. synthesize(text, lang, path)
+    does the actual text-to-speech work on a miss.
+    """
+
+    def __init__(self, directory, synthesize, max_bytes=DEFAULT_MAX_BYTES, extension='.mp3'):
+        self.directory = directory
+        self.synthesize = synthesize
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_existing()
+
+    @staticmethod
+    def key(text, lang='en'):
+        return hashlib.sha256(f"{lang}\0{text}".encode('utf-8')).hexdigest()[:32]
+
+    def _load_existing(self):
+        """Adopt files left by a previous run, oldest first"""
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(self.extension):
+                stat = os.stat(os.path.join(self.directory, name))
+                files.append((stat.st_mtime, name[:-len(self.extension)], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._bytes += size
+        self._evict()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.extension)
+
+    def get(self, text, lang='en'):
+        """Return the file name for text, synthesizing it on a miss"""
+        key = self.key(text, lang)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return key + self.extension
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # One synthesis per key even when several requests miss at once
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return key + self.extension
+                self.misses += 1
+
+            path = self.path(key)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            try:
+                self.synthesize(text, lang, temp_path)
+                os.replace(temp_path, path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            size = os.path.getsize(path)
+
+            with self._lock:
+                self._entries[key] = size
+                self._bytes += size
+                self._key_locks.pop(key, None)
+                self._evict(keep=key)
+        return key + self.extension
+
+    def lookup(self, text, lang='en'):
+        """Return the cached file name for text without synthesizing, or None"""
+        key = self.key(text, lang)
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return key + self.extension
+
+    def stream(self, text, lang, chunks):
+        """Pass through audio chunks from a streaming synthesizer, caching the result
+
+        The caller can send each chunk to the client as soon as it is
+        produced; the complete file only joins the cache if the stream ends
+        normally.
+        """
+        key = self.key(text, lang)
+        path = self.path(key)
+        temp_path = f"{path}.{threading.get_ident()}.stream.tmp"
+        with self._lock:
+            self.misses += 1
+        try:
+            with open(temp_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            os.replace(temp_path, path)
+            size = os.path.getsize(path)
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = size
+                    self._bytes += size
+                self._evict(keep=key)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _evict(self, keep=None):
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = next(iter(self._entries.items()))
+            if key == keep:
+                break
+            del self._entries[key]
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    def prewarm(self, texts, lang='en'):
+        """Synthesize every text up front; failures are logged, not raised"""
+        for text in texts:
+            try:
+                self.get(text, lang)
+            except Exception as e:
+                logger.warning(f"Could not pre-warm audio for {text[:40]!r}: {e}")
+        logger.info(f"Audio cache pre-warmed: {self.stats()}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
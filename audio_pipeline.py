@@ -0,0 +1,87 @@
+import io
+import logging
+import os
+import subprocess
+import wave
+
+try:
+    import av
+except ImportError:  # PyAV is optional; fall back to the ffmpeg CLI
+    av = None
+
+logger = logging.getLogger(__name__)
+
+# Speech recognizers work on 16 kHz mono; anything more is wasted work
+TARGET_RATE = 16000
+SAMPLE_WIDTH = 2
+
+
+def pcm_to_wav(pcm, rate=TARGET_RATE):
+    """Wrap 16-bit mono PCM in an in-memory WAV container"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(SAMPLE_WIDTH)
+        wav.setframerate(rate)
+        wav.writeframes(pcm)
+    buffer.seek(0)
+    return buffer
+
+
+def decode_in_memory(data, rate=TARGET_RATE):
+    """Decode WebM/Opus bytes with PyAV and resample to 16-bit mono PCM"""
+    pcm = bytearray()
+    resampler = av.AudioResampler(format='s16', layout='mono', rate=rate)
+    with av.open(io.BytesIO(data)) as container:
+        for frame in container.decode(audio=0):
+            for resampled in resampler.resample(frame):
+                pcm += bytes(resampled.planes[0])[:resampled.samples * SAMPLE_WIDTH]
+    # Flush samples buffered inside the resampler
+    for resampled in resampler.resample(None):
+        pcm += bytes(resampled.planes[0])[:resampled.samples * SAMPLE_WIDTH]
+    return bytes(pcm)
+
+
+def convert_webm_to_wav(webm_path, wav_path, rate=TARGET_RATE, timeout=None):
+    """Convert WebM audio to WAV using ffmpeg"""
+    try:
+        subprocess.run([
+            'ffmpeg', '-y', '-i', webm_path,
+            '-acodec', 'pcm_s16le',
+            '-ar', str(rate),
+            '-ac', '1',
+            wav_path
+        ], check=True, capture_output=True, timeout=timeout)
+        return True
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Error converting audio: {e.stderr.decode()}")
+        return False
+    except subprocess.TimeoutExpired:
+        logger.error(f"ffmpeg conversion timed out after {timeout}s")
+        return False
+
+
+def decode_with_ffmpeg(data, workdir, rate=TARGET_RATE, timeout=None):
+    """Fallback path: write the upload to disk and convert it with ffmpeg"""
+    webm_path = os.path.join(workdir, 'input.webm')
+    wav_path = os.path.join(workdir, 'input.wav')
+    with open(webm_path, 'wb') as f:
+        f.write(data)
+    if not convert_webm_to_wav(webm_path, wav_path, rate, timeout):
+        return None
+    with open(wav_path, 'rb') as f:
+        return io.BytesIO(f.read())
+
+
+def decode_audio(data, workdir, rate=TARGET_RATE, timeout=None):
+    """Return (wav file object, decoder name) for uploaded audio, or (None, name)
+
+    The in-memory PyAV decoder is used when installed and able to read the
+    data; otherwise the ffmpeg subprocess converts via files in workdir.
+    """
+    if av is not None:
+        try:
+            return pcm_to_wav(decode_in_memory(data, rate), rate), 'pyav'
+        except (av.error.FFmpegError, ValueError) as e:
+            logger.warning(f"In-memory decode failed, falling back to ffmpeg: {e}")
+    return decode_with_ffmpeg(data, workdir, rate, timeout), 'ffmpeg'
@@ -0,0 +1,72 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 10 * 60
+
+
+class AudioWorkspace:
+    """Private scratch directories for each voice request
+
+    Every request gets its own temp directory, removed when the request ends.
+    A background sweep deletes directories older than ttl, which only exist
+    if a worker died mid-request.
+    """
+
+    def __init__(self, root=None, ttl=DEFAULT_TTL):
+        self.root = root or os.path.join(tempfile.gettempdir(), 'voice-chat-audio')
+        self.ttl = ttl
+        self.swept = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    @contextmanager
+    def request_dir(self):
+        """Yield a fresh directory that is deleted afterwards"""
+        path = tempfile.mkdtemp(prefix='voice-', dir=self.root)
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def cleanup_expired(self, now=None):
+        """Remove leftover request directories older than ttl"""
+        now = time.time() if now is None else now
+        removed = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    if os.path.isdir(path):
+                        shutil.rmtree(path, ignore_errors=True)
+                    else:
+                        os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        self.swept += removed
+        if removed:
+            logger.info(f"Removed {removed} expired audio workspaces")
+        return removed
+
+    def start_cleanup(self, interval=60):
+        """Sweep expired workspaces periodically on a daemon thread"""
+        def sweep():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.cleanup_expired()
+                except OSError as e:
+                    logger.warning(f"Audio workspace cleanup failed: {e}")
+
+        thread = threading.Thread(target=sweep, daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        return {'root': self.root, 'active': len(os.listdir(self.root)), 'swept': self.swept}
@@ -0,0 +1,59 @@
+import argparse
+import statistics
+import subprocess
+import tempfile
+import time
+
+import audio_pipeline
+
+
+def make_sample(seconds):
+    """Render a short Opus/WebM clip like the browser's MediaRecorder output"""
+    result = subprocess.run([
+        'ffmpeg', '-f', 'lavfi', '-i', f"sine=frequency=440:sample_rate=48000:duration={seconds}",
+        '-c:a', 'libopus', '-f', 'webm', 'pipe:1'
+    ], check=True, capture_output=True)
+    return result.stdout
+
+
+def time_path(decode, data, runs):
+    timings = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as workdir:
+            started = time.perf_counter()
+            wav_file = decode(data, workdir)
+            timings.append(time.perf_counter() - started)
+            assert wav_file is not None
+    return timings
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<8} median {statistics.median(timings) * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare in-memory and ffmpeg audio decoding latency")
+    parser.add_argument('--input', help="WebM file to decode (default: generated sine clip)")
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input, 'rb') as f:
+            data = f.read()
+    else:
+        data = make_sample(args.seconds)
+    print(f"{len(data)} bytes of WebM, {args.runs} runs each")
+
+    report('ffmpeg', time_path(audio_pipeline.decode_with_ffmpeg, data, args.runs))
+    if audio_pipeline.av is None:
+        print("pyav     not installed (pip install av)")
+    else:
+        in_memory = lambda data, workdir: audio_pipeline.pcm_to_wav(audio_pipeline.decode_in_memory(data))
+        report('pyav', time_path(in_memory, data, args.runs))
+
+
+if __name__ == '__main__':
+    main()
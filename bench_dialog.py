@@ -0,0 +1,35 @@
+import argparse
+import random
+import time
+
+from dialog import DIALOG, Dialog
+
+WORDS = [
+    'i', 'want', 'to', 'the', 'sandwich', 'favorite', 'button', 'please', 'can', 'you', 'my',
+    'order', 'again', 'menu', 'screen', 'it', 'help', 'explain', 'where', 'yes', 'done', 'save',
+]
+
+
+def generate_utterances(count, seed=0):
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 20))) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure dialog intent matching throughput")
+    parser.add_argument('--utterances', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    utterances = generate_utterances(args.utterances, args.seed)
+    dialog = Dialog()
+    for stage in DIALOG:
+        started = time.perf_counter()
+        for text in utterances:
+            dialog.respond({'stage': stage, 'context': None}, text)
+        elapsed = time.perf_counter() - started
+        print(f"{stage:22s} {len(utterances) / elapsed:12,.0f} turns/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+
+from event_store import EventStore
+
+EVENT_NAMES = [
+    'app open', 'view__ingredients__modal', 'order sandwich', 'favorite sandwich',
+    'receive sandwich', 'adjust payment method', 'rate sandwich',
+    'write__review__published', 'set meal preference', 'payment received'
+]
+CITIES = [('Shanghai', 'CN'), ('Ebetsu', 'JP'), ('Eagan', 'US'), ('Makati City', 'PH'), ('Madrid', 'ES')]
+
+
+def generate_export_lines(count, users, seed=42):
+    """Yield NDJSON lines shaped like the Mixpanel export"""
+    rng = random.Random(seed)
+    user_ids = [
+        f"{rng.getrandbits(32):08x}-{rng.getrandbits(16):04x}-5{rng.getrandbits(12):03x}-"
+        f"a{rng.getrandbits(12):03x}-{rng.getrandbits(48):012x}"
+        for _ in range(users)
+    ]
+    now = 1742486694.0
+    for i in range(count):
+        properties = {'time': round(now - i * 0.013, 3), 'distinct_id': rng.choice(user_ids)}
+        # Roughly half of the events carry geo properties, as in the sample export
+        if rng.random() < 0.5:
+            properties['$city'], properties['mp_country_code'] = rng.choice(CITIES)
+        yield json.dumps({'event': rng.choice(EVENT_NAMES), 'properties': properties})
+
+
+def measure(build):
+    """Return (result, retained bytes, seconds) for build()"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare list-of-dicts and columnar event memory")
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=5000)
+    args = parser.parse_args()
+
+    lines = list(generate_export_lines(args.events, args.users))
+
+    events, dict_bytes, dict_seconds = measure(lambda: [json.loads(line) for line in lines])
+    del events
+    store, store_bytes, store_seconds = measure(lambda: EventStore(json.loads(line) for line in lines))
+
+    print(f"{args.events} events, {args.users} users")
+    print(f"list of dicts: {dict_bytes / 1e6:8.1f} MB  {dict_bytes / args.events:6.0f} B/event  {dict_seconds:.2f}s")
+    print(f"EventStore:    {store_bytes / 1e6:8.1f} MB  {store_bytes / args.events:6.0f} B/event  {store_seconds:.2f}s")
+    print(f"ratio: {dict_bytes / store_bytes:.1f}x smaller")
+
+
+if __name__ == '__main__':
+    main()
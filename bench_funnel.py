@@ -0,0 +1,45 @@
+import argparse
+import json
+import time
+
+from bench_event_store import generate_export_lines
+from event_store import EventStore
+from funnel import FunnelIndex
+
+STEPS = ['app open', 'view__ingredients__modal', 'order sandwich', 'favorite sandwich']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time building the first-occurrence index and answering funnels")
+    parser.add_argument('--events', type=int, default=500000)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=20)
+    args = parser.parse_args()
+
+    store = EventStore(json.loads(line) for line in generate_export_lines(args.events, args.users))
+    for user_code in range(len(store.user_ids)):
+        store.user_rows(user_code)
+    index = FunnelIndex(store)
+
+    started = time.perf_counter()
+    index.funnel(STEPS)
+    build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(args.queries):
+        result = index.funnel(STEPS, window=3600)
+    query = (time.perf_counter() - started) / args.queries
+
+    started = time.perf_counter()
+    for _ in range(args.queries):
+        impact = index.compare_intervention('view__ingredients__modal', 'favorite sandwich', 'app open')
+    compare = (time.perf_counter() - started) / args.queries
+
+    print(f"{args.events} events, {len(store.user_ids)} users")
+    print(f"index build (4 events): {build:.2f}s")
+    print(f"funnel query:           {query * 1000:.1f} ms  {[step['users'] for step in result['steps']]}")
+    print(f"intervention compare:   {compare * 1000:.1f} ms  treated={impact['treated']}")
+
+
+if __name__ == '__main__':
+    main()
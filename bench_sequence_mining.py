@@ -0,0 +1,30 @@
+import argparse
+import json
+
+from bench_event_store import generate_export_lines, measure
+from event_store import EventStore
+from sequence_mining import SequenceMiner
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time sequence mining and show its memory stays flat as users grow")
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--users', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--n', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{args.events} events, {args.n}-grams")
+    for users in args.users:
+        store = EventStore(json.loads(line) for line in generate_export_lines(args.events, users))
+        # Sort every user's rows up front so only the mining is measured
+        for user_code in range(len(store.user_ids)):
+            store.user_rows(user_code)
+
+        miner, retained, seconds = measure(lambda: SequenceMiner(store, n=args.n).run())
+        top = miner.results(1)['ngrams']
+        print(f"{users:>8} users: {seconds:6.2f}s  {args.events / seconds:9.0f} events/s  "
+              f"{retained / 1e6:6.1f} MB retained  top path: {top[0] if top else None}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import argparse
+import io
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure end-to-end voice turn latency against the local app")
+    parser.add_argument('audio', help="WebM recording to send on every turn")
+    parser.add_argument('--turns', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--backends', default='fixture', help="RECOGNIZER_BACKENDS for the run")
+    args = parser.parse_args()
+
+    # Configure the app before importing it; fixture recognition needs no network
+    os.environ['RECOGNIZER_BACKENDS'] = args.backends
+    from app import app
+
+    with open(args.audio, 'rb') as f:
+        audio = f.read()
+    client = app.test_client()
+
+    def turn(i):
+        started = time.perf_counter()
+        response = client.post('/api/process-voice', data={
+            'audio': (io.BytesIO(audio), 'audio.webm'),
+            'user_id': f"bench_user_{i}"
+        })
+        return time.perf_counter() - started, response.status_code, response.get_json()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as executor:
+        results = list(executor.map(turn, range(args.turns)))
+    wall = time.perf_counter() - started
+
+    latencies = sorted(r[0] for r in results)
+    errors = [r for r in results if r[1] != 200 or 'error' in r[2]]
+    print(f"{args.turns} turns, concurrency {args.concurrency}, backends {args.backends}")
+    print(f"median {statistics.median(latencies) * 1000:.1f} ms  "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms  "
+          f"throughput {args.turns / wall:.1f} turns/s  errors {len(errors)}")
+    print(client.get('/api/metrics').get_json()['recognizers'])
+
+
+if __name__ == '__main__':
+    main()
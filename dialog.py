@@ -0,0 +1,120 @@
+import re
+
+# Struggle labels that override the stage flow, checked in priority order
+STRUGGLE_REPLIES = (
+    ('repeated_attempts_favorite_sandwich', 'struggle_repeated_attempts'),
+    ('frequent_errors', 'struggle_frequent_errors'),
+    ('confused_navigation', 'struggle_confused_navigation'),
+    ('long_time_sandwich_builder', 'struggle_long_time_builder'),
+)
+
+# stage -> intents tried in priority order, plus the fallback when none match.
+# Each intent is (keywords, next stage, reply key); a next stage of None keeps
+# the conversation where it is. Keywords match anywhere in the lowercased text.
+# Stages without an entry (location_help, complete) have no scripted reply.
+DIALOG = {
+    'initial': {
+        'intents': [
+            (('help', 'stuck', 'confused', 'how', 'what'), 'help_needed', 'help_needed'),
+            (("don't know", 'not sure', 'explain'), 'explanation_needed', 'explanation_needed'),
+        ],
+        'fallback': ('clarification_needed', 'clarification_needed'),
+    },
+    'help_needed': {
+        'intents': [
+            (('save', 'remember', 'store'), 'tutorial', 'save_tutorial'),
+        ],
+        'fallback': (None, 'help_needed_retry'),
+    },
+    'explanation_needed': {
+        'intents': [
+            (('yes', 'sure', 'okay', 'show'), 'tutorial', 'tutorial_start'),
+        ],
+        'fallback': ('initial', 'explanation_declined'),
+    },
+    'clarification_needed': {
+        'intents': [
+            (('find', 'where', 'location'), 'location_help', 'location_help'),
+        ],
+        'fallback': ('initial', 'clarification_declined'),
+    },
+    'tutorial': {
+        'intents': [
+            (('yes', 'see', 'found'), 'next_step', 'next_step'),
+        ],
+        'fallback': (None, 'tutorial_retry'),
+    },
+    'next_step': {
+        'intents': [
+            (('done', 'finished', 'saved'), 'complete', 'complete'),
+        ],
+        'fallback': (None, 'next_step_retry'),
+    },
+}
+
+
+class IntentMatcher:
+    """All of a stage's keyword lists compiled into one regex
+
+    Each intent is a capture group inside a lookahead, so a single scan sees
+    every position where any keyword starts; the lowest-numbered intent found
+    wins, matching the order the if/elif chain used to test them in.
+    """
+
+    def __init__(self, intents):
+        groups = '|'.join(f"({'|'.join(re.escape(word) for word in words)})" for words in intents)
+        self._pattern = re.compile(f"(?=(?:{groups}))")
+
+    def match(self, text):
+        """Return the index of the highest-priority intent in text, or None"""
+        best = None
+        for match in self._pattern.finditer(text):
+            index = match.lastindex - 1
+            if index == 0:
+                return 0
+            if best is None or index < best:
+                best = index
+        return best
+
+
+class Dialog:
+    """Table-driven conversation flow over a DIALOG-shaped table"""
+
+    def __init__(self, table=DIALOG, struggle_replies=STRUGGLE_REPLIES):
+        self.struggle_replies = struggle_replies
+        self.stages = {}
+        for stage, spec in table.items():
+            intents = spec['intents']
+            matcher = IntentMatcher([words for words, _, _ in intents])
+            transitions = [(next_stage, reply) for _, next_stage, reply in intents]
+            self.stages[stage] = (matcher, transitions, spec['fallback'])
+
+    def struggle_reply(self, context):
+        """Return the reply key for the highest-priority struggle label, or None"""
+        struggles = context.get('struggling_with', [])
+        for label, reply in self.struggle_replies:
+            if label in struggles:
+                return reply
+        return None
+
+    def respond(self, state, user_text, context=None):
+        """Return the reply key for user_text (or None), advancing state['stage']
+
+        A struggle-specific reply is given once per conversation; later turns
+        follow the stage flow.
+        """
+        if context and state['context'] and not state.get('struggle_addressed'):
+            reply = self.struggle_reply(state['context'])
+            if reply is not None:
+                state['struggle_addressed'] = True
+                return reply
+
+        stage = self.stages.get(state['stage'])
+        if stage is None:
+            return None
+        matcher, transitions, fallback = stage
+        index = matcher.match(user_text.lower())
+        next_stage, reply = fallback if index is None else transitions[index]
+        if next_stage is not None:
+            state['stage'] = next_stage
+        return reply
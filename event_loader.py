@@ -0,0 +1,176 @@
+import codecs
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1 << 16
+BATCH_SIZE = 10000
+PROGRESS_EVERY = 100000
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\r\n'
+
+
+class LoadProgress:
+    """Counts events and bytes read and reports throughput"""
+
+    def __init__(self, label, report_every=PROGRESS_EVERY):
+        self.label = label
+        self.report_every = report_every
+        self.events = 0
+        self.bytes_read = 0
+        self.skipped = 0
+        self.started = time.monotonic()
+        self._next_report = report_every
+
+    def add_bytes(self, count):
+        self.bytes_read += count
+
+    def add_event(self):
+        self.events += 1
+        if self.events >= self._next_report:
+            self._next_report += self.report_every
+            self.report()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def summary(self):
+        elapsed = max(self.elapsed, 1e-9)
+        return {
+            'events': self.events,
+            'bytes': self.bytes_read,
+            'skipped': self.skipped,
+            'seconds': round(elapsed, 3),
+            'events_per_second': round(self.events / elapsed, 1),
+            'mb_per_second': round(self.bytes_read / elapsed / 1e6, 2)
+        }
+
+    def report(self):
+        stats = self.summary()
+        logger.info(
+            f"{self.label}: {stats['events']} events, {stats['bytes'] / 1e6:.1f} MB "
+            f"in {stats['seconds']}s ({stats['events_per_second']:.0f} events/s)"
+        )
+
+
+def _iter_text_chunks(fp, progress, chunk_size=CHUNK_SIZE):
+    """Yield decoded text chunks from a binary or text file object"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    while True:
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, bytes):
+            progress.add_bytes(len(chunk))
+            chunk = decoder.decode(chunk)
+        else:
+            progress.add_bytes(len(chunk))
+        if chunk:
+            yield chunk
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def iter_json_array(chunks, progress):
+    """Incrementally parse a top-level JSON array, one element at a time"""
+    buffer = ''
+    position = 0
+    started = False
+    for chunk in chunks:
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            # Skip whitespace, the opening bracket and separators
+            while position < len(buffer) and (buffer[position] in _WHITESPACE or buffer[position] == ','):
+                position += 1
+            if position >= len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise ValueError("Expected a JSON array export")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                event, end = _decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Element is split across chunks; wait for more input
+                break
+            position = end
+            progress.add_event()
+            yield event
+    if buffer[position:].strip():
+        raise ValueError("Truncated JSON array export")
+
+
+def iter_ndjson(lines, progress=None, count_bytes=True):
+    """Parse newline-delimited JSON (the raw Export API format), skipping bad lines"""
+    if progress is None:
+        progress = LoadProgress('ndjson')
+    for line in lines:
+        if count_bytes:
+            progress.add_bytes(len(line))
+        if not line.strip():
+            continue
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError:
+            progress.skipped += 1
+            continue
+        progress.add_event()
+        yield event
+
+
+def iter_events(fp, progress):
+    """Stream events from a file object holding either a JSON array or NDJSON"""
+    chunks = _iter_text_chunks(fp, progress)
+    first = ''
+    for chunk in chunks:
+        first = chunk.lstrip(_WHITESPACE)
+        if first:
+            break
+    if not first:
+        return
+
+    def replay():
+        yield first
+        yield from chunks
+
+    if first[0] == '[':
+        yield from iter_json_array(replay(), progress)
+    else:
+        yield from iter_ndjson(_split_lines(replay()), progress, count_bytes=False)
+
+
+def _split_lines(chunks):
+    pending = ''
+    for chunk in chunks:
+        pending += chunk
+        lines = pending.split('\n')
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def load_events(path, sink, batch_size=BATCH_SIZE):
+    """Stream an export file into sink(batch) and return load statistics"""
+    progress = LoadProgress(f"Loading {path}")
+    batch = []
+    with open(path, 'rb') as fp:
+        for event in iter_events(fp, progress):
+            batch.append(event)
+            if len(batch) >= batch_size:
+                sink(batch)
+                batch = []
+    if batch:
+        sink(batch)
+    progress.report()
+    return progress.summary()
@@ -0,0 +1,175 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+from event_loader import load_events
+from event_store import EventStore, SparseColumn, StringDictionary
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'EVSNAP01'
+VERSION = 1
+ALIGNMENT = 8
+
+
+def snapshot_path(export_path):
+    """Return where the snapshot for an export lives (next to it)"""
+    return export_path + '.snapshot'
+
+
+def export_key(export_path):
+    """Identify an export file by path, size and mtime"""
+    stat = os.stat(export_path)
+    return {
+        'path': os.path.abspath(export_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        # Raw arrays are only valid on hosts with the same layout
+        'byteorder': sys.byteorder,
+        'itemsize': array('I').itemsize,
+        'version': VERSION
+    }
+
+
+def _csr(groups, typecode='I'):
+    """Flatten a list of sequences into (values, offsets) arrays"""
+    values = array(typecode)
+    offsets = array('I', [0])
+    for group in groups:
+        values.extend(group)
+        offsets.append(len(values))
+    return values, offsets
+
+
+def write_snapshot(store, path, key):
+    """Write the store's columns and dictionaries to a binary snapshot"""
+    user_count = len(store.user_ids)
+    event_count = len(store.event_names)
+
+    user_rows, user_row_offsets = _csr(store.user_rows(code) for code in range(user_count))
+    counts = [store.user_counts(code) for code in range(user_count)]
+    user_count_names, user_count_offsets = _csr(c.keys() for c in counts)
+    user_count_values, _ = _csr(c.values() for c in counts)
+    event_users, event_user_offsets = _csr(store._users_of(code).keys() for code in range(event_count))
+
+    arrays = {
+        'name_col': store.name_col,
+        'user_col': store.user_col,
+        'time_col': store.time_col,
+        'user_rows': user_rows,
+        'user_row_offsets': user_row_offsets,
+        'user_count_names': user_count_names,
+        'user_count_values': user_count_values,
+        'user_count_offsets': user_count_offsets,
+        'event_users': event_users,
+        'event_user_offsets': event_user_offsets
+    }
+    properties = {}
+    for name, column in store.properties.items():
+        arrays[f"prop_rows:{name}"] = column.rows
+        arrays[f"prop_codes:{name}"] = column.codes
+        properties[name] = column.values
+
+    # Lay the arrays out back to back, each aligned for its item size
+    layout = {}
+    offset = 0
+    for name, column in arrays.items():
+        column = memoryview(column)
+        layout[name] = {'format': column.format, 'offset': offset, 'nbytes': column.nbytes}
+        offset += column.nbytes + (-column.nbytes % ALIGNMENT)
+
+    header = json.dumps({
+        'key': key,
+        'event_names': store.event_names.values,
+        'user_ids': store.user_ids.values,
+        'event_properties': {code: sorted(keys) for code, keys in store._event_properties.items()},
+        'properties': properties,
+        'layout': layout
+    }).encode('utf-8')
+    data_start = len(MAGIC) + 8 + len(header)
+    data_start += -data_start % ALIGNMENT
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        f.write(b'\0' * (data_start - f.tell()))
+        for name, column in arrays.items():
+            column = memoryview(column)
+            f.write(column.cast('B'))
+            f.write(b'\0' * (-column.nbytes % ALIGNMENT))
+    # Atomic swap so concurrently starting workers never read a partial file
+    os.replace(temp_path, path)
+    logger.info(f"Wrote event snapshot {path} ({data_start + offset} bytes)")
+
+
+def read_snapshot(path, key):
+    """Memory-map a snapshot into an EventStore, or return None if missing/stale"""
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            header_length, = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(header_length))
+            if header['key'] != key:
+                logger.info(f"Event snapshot {path} is stale; rebuilding")
+                return None
+            data_start = len(MAGIC) + 8 + header_length
+            data_start += -data_start % ALIGNMENT
+            # Read-only shared mapping: every worker on the host shares these pages
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Could not read event snapshot {path}: {e}")
+        return None
+
+    buffer = memoryview(mapped)
+    columns = {}
+    for name, spec in header['layout'].items():
+        start = data_start + spec['offset']
+        columns[name] = buffer[start:start + spec['nbytes']].cast(spec['format'])
+
+    store = EventStore()
+    store.event_names = StringDictionary(header['event_names'])
+    store.user_ids = StringDictionary(header['user_ids'])
+    store.name_col = columns['name_col']
+    store.user_col = columns['user_col']
+    store.time_col = columns['time_col']
+    for name, values in header['properties'].items():
+        store.properties[name] = SparseColumn(columns[f"prop_rows:{name}"], columns[f"prop_codes:{name}"], values)
+    for code, keys in header['event_properties'].items():
+        store._event_properties[int(code)] = set(keys)
+
+    user_count = len(store.user_ids)
+    store._user_rows = [None] * user_count
+    store._user_counts = [None] * user_count
+    store._user_buckets = [None] * user_count
+    store._snapshot = dict(columns, event_count=len(store.event_names))
+    return store
+
+
+def load_store(export_path):
+    """Load an export via its snapshot, parsing and snapshotting it on a miss"""
+    started = time.monotonic()
+    key = export_key(export_path)
+    path = snapshot_path(export_path)
+
+    store = read_snapshot(path, key)
+    if store is not None:
+        logger.info(f"Mapped {len(store)} events from {path} in {time.monotonic() - started:.3f}s")
+        return store
+
+    store = EventStore()
+    load_events(export_path, store.extend)
+    try:
+        write_snapshot(store, path, key)
+    except OSError as e:
+        logger.warning(f"Could not write event snapshot {path}: {e}")
+    return store
@@ -0,0 +1,514 @@
+import bisect
+import logging
+import math
+from array import array
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Properties stored in dedicated columns rather than sparse ones
+CORE_PROPERTIES = ('time', 'distinct_id')
+# Width of the per-user time buckets behind window_counts(), in seconds
+DEFAULT_BUCKET_SECONDS = 3600
+
+
+def _writable(column, typecode):
+    """Copy a read-only (memory-mapped) column into an appendable array"""
+    copy = array(typecode)
+    copy.frombytes(memoryview(column).cast('B'))
+    return copy
+
+
+def validate_event(event):
+    """Return (name, distinct_id, time) of a Mixpanel-shaped event, or raise ValueError"""
+    if not isinstance(event, dict):
+        raise ValueError(f"Event must be an object, got {type(event).__name__}")
+    name = event.get('event')
+    if not isinstance(name, str) or not name:
+        raise ValueError("Event needs a non-empty string 'event' name")
+    properties = event.get('properties')
+    if not isinstance(properties, dict):
+        raise ValueError(f"Event {name!r} needs a 'properties' object")
+    user_id = properties.get('distinct_id')
+    if not isinstance(user_id, (str, int)) or isinstance(user_id, bool):
+        raise ValueError(f"Event {name!r} needs a string or integer properties.distinct_id")
+    event_time = properties.get('time')
+    if not isinstance(event_time, (int, float)) or isinstance(event_time, bool) or not math.isfinite(event_time):
+        raise ValueError(f"Event {name!r} needs a numeric properties.time")
+    return name, user_id, event_time
+
+
+class StringDictionary:
+    """Dictionary-encodes strings as dense integer codes"""
+
+    def __init__(self, values=()):
+        self.values = list(values)
+        # Built on first lookup so loading a snapshot doesn't pay for it
+        self._codes = None
+
+    def _code_map(self):
+        if self._codes is None:
+            self._codes = {value: code for code, value in enumerate(self.values)}
+        return self._codes
+
+    def encode(self, value):
+        codes = self._code_map()
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def code(self, value):
+        """Return the code for value, or None if it was never seen"""
+        return self._code_map().get(value)
+
+    def __getitem__(self, code):
+        return self.values[code]
+
+    def __len__(self):
+        return len(self.values)
+
+
+class SparseColumn:
+    """A property present on only some rows: (row, value code) pairs in row order"""
+
+    def __init__(self, rows=None, codes=None, values=None):
+        # rows/codes may be read-only memoryviews over a snapshot
+        self.rows = rows if rows is not None else array('I')
+        self.codes = codes if codes is not None else array('I')
+        self.values = values if values is not None else []
+        self._value_codes = None
+
+    def append(self, row, value):
+        if not isinstance(self.rows, array):
+            self.rows = _writable(self.rows, 'I')
+            self.codes = _writable(self.codes, 'I')
+        if self._value_codes is None:
+            self._value_codes = {}
+            for code, existing in enumerate(self.values):
+                try:
+                    self._value_codes.setdefault((type(existing), existing), code)
+                except TypeError:
+                    pass
+        # Key on type too so 1, 1.0 and True stay distinct values
+        try:
+            key = (type(value), value)
+            code = self._value_codes.get(key)
+        except TypeError:
+            key = None
+            code = None
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            if key is not None:
+                self._value_codes[key] = code
+        self.rows.append(row)
+        self.codes.append(code)
+
+    def get(self, row, default=None):
+        position = bisect.bisect_left(self.rows, row)
+        if position < len(self.rows) and self.rows[position] == row:
+            return self.values[self.codes[position]]
+        return default
+
+
+class TimeBuckets:
+    """One user's event counts per fixed-width time bucket"""
+
+    __slots__ = ('width', 'keys', 'counts')
+
+    def __init__(self, width):
+        self.width = width
+        # Sorted bucket numbers (time // width) that hold at least one event
+        self.keys = []
+        # bucket number -> {name code: count}
+        self.counts = {}
+
+    def add(self, event_time, name_code):
+        bucket = int(event_time // self.width)
+        counts = self.counts.get(bucket)
+        if counts is None:
+            counts = self.counts[bucket] = {}
+            bisect.insort(self.keys, bucket)
+        counts[name_code] = counts.get(name_code, 0) + 1
+
+
+class EventStore:
+    """Columnar in-memory event store with a per-user, time-sorted row index
+
+    Event names and distinct_ids are dictionary-encoded, times live in an
+    array('d') column and every other property is a sparse column. Callers
+    still get Mixpanel-shaped event dicts back from user_events().
+    Each user's events are also counted in time buckets so window_counts()
+    touches a few buckets instead of every row.
+    """
+
+    def __init__(self, events=None, bucket_seconds=DEFAULT_BUCKET_SECONDS):
+        self.bucket_seconds = bucket_seconds
+        self.event_names = StringDictionary()
+        self.user_ids = StringDictionary()
+        self.name_col = array('I')
+        self.user_col = array('I')
+        self.time_col = array('d')
+        self.properties = {}
+
+        # Set by event_snapshot when columns are memory-mapped; the per-user
+        # structures below are then filled lazily from it
+        self._snapshot = None
+
+        # user code -> row ids, kept sorted by time on read
+        self._user_rows = []
+        # user codes whose rows received an out-of-order event
+        self._unsorted_users = set()
+        # user code -> {name code: count}
+        self._user_counts = []
+        # user code -> TimeBuckets, or None until the first window query
+        self._user_buckets = []
+        # name code -> user codes that fired it at least once (insertion ordered)
+        self._event_users = {}
+        # name code -> property keys seen on that event
+        self._event_properties = defaultdict(set)
+        # Newest event time, or None until first asked for
+        self._newest_time = None
+
+        if events:
+            self.extend(events)
+
+    @property
+    def total_events(self):
+        return len(self.time_col)
+
+    @property
+    def newest_time(self):
+        """Time of the newest event in the store, or None if it is empty"""
+        if self._newest_time is None and len(self.time_col):
+            self._newest_time = max(self.time_col)
+        return self._newest_time
+
+    def add(self, event):
+        """Index a single event and return the user id it belongs to
+
+        The event is checked with validate_event() before anything is
+        written, so a malformed one raises ValueError and leaves the store
+        untouched.
+        """
+        name, user_id, event_time = validate_event(event)
+        properties = event['properties']
+        name_code = self.event_names.encode(name)
+        user_code = self.user_ids.encode(user_id)
+        row = len(self.time_col)
+
+        if not isinstance(self.time_col, array):
+            self.name_col = _writable(self.name_col, 'I')
+            self.user_col = _writable(self.user_col, 'I')
+            self.time_col = _writable(self.time_col, 'd')
+        self.name_col.append(name_code)
+        self.user_col.append(user_code)
+        self.time_col.append(event_time)
+        if self._newest_time is not None and event_time > self._newest_time:
+            self._newest_time = event_time
+        for key, value in properties.items():
+            if key in CORE_PROPERTIES:
+                continue
+            column = self.properties.get(key)
+            if column is None:
+                column = self.properties[key] = SparseColumn()
+            column.append(row, value)
+        self._event_properties[name_code].update(properties.keys())
+
+        if user_code == len(self._user_rows):
+            self._user_rows.append(array('I', [row]))
+            self._user_counts.append({name_code: 1})
+            self._user_buckets.append(None)
+        else:
+            rows = self.user_rows(user_code)
+            if not isinstance(rows, array):
+                rows = self._user_rows[user_code] = _writable(rows, 'I')
+            # Exports are newest-first, so defer sorting until the rows are read
+            if rows and event_time < self.time_col[rows[-1]]:
+                self._unsorted_users.add(user_code)
+            rows.append(row)
+            counts = self._counts(user_code)
+            counts[name_code] = counts.get(name_code, 0) + 1
+            buckets = self._user_buckets[user_code]
+            if buckets is not None:
+                buckets.add(event_time, name_code)
+
+        self._users_of(name_code)[user_code] = None
+        return user_id
+
+    def extend(self, events):
+        """Index many events and return the set of user ids they touched"""
+        touched = set()
+        for event in events:
+            touched.add(self.add(event))
+        logger.debug(f"Indexed {self.total_events} events for {len(self.user_ids)} users")
+        return touched
+
+    def event(self, row):
+        """Materialize one row as a Mixpanel-shaped event dict"""
+        properties = {
+            'time': self.time_col[row],
+            'distinct_id': self.user_ids[self.user_col[row]]
+        }
+        for key, column in self.properties.items():
+            value = column.get(row, column)
+            if value is not column:
+                properties[key] = value
+        return {'event': self.event_names[self.name_col[row]], 'properties': properties}
+
+    def user_rows(self, user_code):
+        """Return a user's row ids sorted by time (oldest first)"""
+        rows = self._user_rows[user_code]
+        if rows is None:
+            offsets = self._snapshot['user_row_offsets']
+            rows = self._user_rows[user_code] = self._snapshot['user_rows'][offsets[user_code]:offsets[user_code + 1]]
+        if user_code in self._unsorted_users:
+            time_col = self.time_col
+            rows = self._user_rows[user_code] = array('I', sorted(rows, key=time_col.__getitem__))
+            self._unsorted_users.discard(user_code)
+        return rows
+
+    def _counts(self, user_code):
+        counts = self._user_counts[user_code]
+        if counts is None:
+            offsets = self._snapshot['user_count_offsets']
+            start, end = offsets[user_code], offsets[user_code + 1]
+            counts = self._user_counts[user_code] = dict(zip(
+                self._snapshot['user_count_names'][start:end],
+                self._snapshot['user_count_values'][start:end]
+            ))
+        return counts
+
+    def _buckets(self, user_code):
+        buckets = self._user_buckets[user_code]
+        if buckets is None:
+            # Built on first use; add() keeps it current from then on
+            buckets = self._user_buckets[user_code] = TimeBuckets(self.bucket_seconds)
+            name_col, time_col = self.name_col, self.time_col
+            for row in self.user_rows(user_code):
+                buckets.add(time_col[row], name_col[row])
+        return buckets
+
+    def _users_of(self, name_code):
+        users = self._event_users.get(name_code)
+        if users is None:
+            users = self._event_users[name_code] = {}
+            if self._snapshot is not None and name_code < self._snapshot['event_count']:
+                offsets = self._snapshot['event_user_offsets']
+                users.update(dict.fromkeys(
+                    self._snapshot['event_users'][offsets[name_code]:offsets[name_code + 1]]
+                ))
+        return users
+
+    def users(self):
+        """Return every known user id"""
+        return self.user_ids.values
+
+    def users_with_event(self, event_name):
+        """Return the user ids that fired event_name at least once"""
+        name_code = self.event_names.code(event_name)
+        if name_code is None:
+            return []
+        return [self.user_ids[code] for code in self._users_of(name_code)]
+
+    def user_events(self, user_id):
+        """Return a user's events sorted by time (oldest first)"""
+        user_code = self.user_ids.code(user_id)
+        if user_code is None:
+            return []
+        return [self.event(row) for row in self.user_rows(user_code)]
+
+    def event_count(self, user_id, event_name):
+        """Return how many times a user fired event_name"""
+        user_code = self.user_ids.code(user_id)
+        name_code = self.event_names.code(event_name)
+        if user_code is None or name_code is None:
+            return 0
+        return self._counts(user_code).get(name_code, 0)
+
+    def user_counts(self, user_code):
+        """Return a user's {name code: count} counters, keyed by codes (do not mutate)"""
+        return self._counts(user_code)
+
+    def event_counts(self, user_id):
+        """Return a user's {event_name: count} counters"""
+        user_code = self.user_ids.code(user_id)
+        if user_code is None:
+            return {}
+        return {self.event_names[code]: count for code, count in self._counts(user_code).items()}
+
+    def last_event(self, user_id):
+        """Return a user's most recent event, or None"""
+        user_code = self.user_ids.code(user_id)
+        if user_code is None:
+            return None
+        rows = self.user_rows(user_code)
+        if not rows:
+            return None
+        return self.event(rows[-1])
+
+    def latest_time(self, user_id):
+        """Return the time of a user's most recent event, or None"""
+        user_code = self.user_ids.code(user_id)
+        if user_code is None:
+            return None
+        rows = self.user_rows(user_code)
+        return self.time_col[rows[-1]] if rows else None
+
+    def window_counts(self, user_id, start, end=None):
+        """Return a user's {event_name: count} for start <= time < end
+
+        Buckets wholly inside the range contribute their counts; only the
+        partially covered buckets at either end are resolved row by row.
+        """
+        user_code = self.user_ids.code(user_id)
+        if user_code is None:
+            return {}
+        buckets = self._buckets(user_code)
+        width = buckets.width
+        keys = buckets.keys
+        low = bisect.bisect_left(keys, int(start // width))
+        high = len(keys) if end is None else bisect.bisect_right(keys, int(end // width))
+
+        totals = {}
+        partial = []
+        for bucket in keys[low:high]:
+            if bucket * width >= start and (end is None or (bucket + 1) * width <= end):
+                for name_code, count in buckets.counts[bucket].items():
+                    totals[name_code] = totals.get(name_code, 0) + count
+            else:
+                partial.append(bucket)
+
+        if partial:
+            rows = self.user_rows(user_code)
+            time_col, name_col = self.time_col, self.name_col
+            for bucket in partial:
+                lower = max(start, bucket * width)
+                upper = (bucket + 1) * width if end is None else min(end, (bucket + 1) * width)
+                position = bisect.bisect_left(rows, lower, key=time_col.__getitem__)
+                while position < len(rows) and time_col[rows[position]] < upper:
+                    name_code = name_col[rows[position]]
+                    totals[name_code] = totals.get(name_code, 0) + 1
+                    position += 1
+        return {self.event_names[code]: count for code, count in totals.items()}
+
+    def compaction_point(self):
+        """Capture (row count, [(key, column, length)]) for compacted()
+
+        Take it under the lock that guards writes: compacted() then reads
+        only what existed at that moment, even as rows and new property
+        keys keep arriving.
+        """
+        columns = [(key, column, len(column.rows)) for key, column in list(self.properties.items())]
+        return self.total_events, columns
+
+    def compacted(self, cutoff, point=None):
+        """Build a store from the rows in point no older than cutoff, or None if none are older
+
+        Columns, sparse properties and per-user indexes are rebuilt straight
+        from the surviving row ids. Name and user codes are reassigned so
+        names and users with no surviving rows are dropped. Only reads this
+        store, so it can run while other threads append; hand the result to
+        install() to bring in rows appended since and swap it in.
+        """
+        end, columns = self.compaction_point() if point is None else point
+        name_col, user_col, time_col = self.name_col, self.user_col, self.time_col
+        keep = array('I', (row for row in range(end) if time_col[row] >= cutoff))
+        if len(keep) == end:
+            return None
+
+        compacted = EventStore(bucket_seconds=self.bucket_seconds)
+        names, users = compacted.event_names.values, compacted.user_ids.values
+        name_codes = array('l', [-1]) * len(self.event_names)
+        user_codes = array('l', [-1]) * len(self.user_ids)
+        row_map = array('l', [-1]) * end
+        user_rows, user_counts = compacted._user_rows, compacted._user_counts
+        event_users, event_properties = compacted._event_users, compacted._event_properties
+        for new_row, row in enumerate(keep):
+            row_map[row] = new_row
+            name_code = name_codes[name_col[row]]
+            if name_code < 0:
+                name_code = name_codes[name_col[row]] = len(names)
+                names.append(self.event_names[name_col[row]])
+                event_users[name_code] = {}
+                event_properties[name_code].update(CORE_PROPERTIES)
+            user_code = user_codes[user_col[row]]
+            event_time = time_col[row]
+            if user_code < 0:
+                user_code = user_codes[user_col[row]] = len(users)
+                users.append(self.user_ids[user_col[row]])
+                user_rows.append(array('I'))
+                user_counts.append({})
+            rows = user_rows[user_code]
+            if rows and event_time < compacted.time_col[rows[-1]]:
+                compacted._unsorted_users.add(user_code)
+            rows.append(new_row)
+            counts = user_counts[user_code]
+            counts[name_code] = counts.get(name_code, 0) + 1
+            event_users[name_code][user_code] = None
+            compacted.name_col.append(name_code)
+            compacted.user_col.append(user_code)
+            compacted.time_col.append(event_time)
+        compacted._user_buckets = [None] * len(users)
+
+        for key, column, length in columns:
+            rebuilt = SparseColumn()
+            value_codes = {}
+            rows, codes = column.rows, column.codes
+            for position in range(length):
+                row, code = rows[position], codes[position]
+                new_row = row_map[row]
+                if new_row < 0:
+                    continue
+                value_code = value_codes.get(code)
+                if value_code is None:
+                    value_code = value_codes[code] = len(rebuilt.values)
+                    rebuilt.values.append(column.values[code])
+                rebuilt.rows.append(new_row)
+                rebuilt.codes.append(value_code)
+                event_properties[compacted.name_col[new_row]].add(key)
+            if rebuilt.rows:
+                compacted.properties[key] = rebuilt
+        return compacted
+
+    def install(self, compacted, point):
+        """Replace this store's contents with compacted(cutoff, point)'s result
+
+        Rows appended here since the compaction point are re-added to it
+        first. Callers must hold whatever lock guards writes to this store.
+        Returns the number of events dropped.
+        """
+        end = point[0]
+        for row in range(end, self.total_events):
+            compacted.add(self.event(row))
+        dropped = self.total_events - compacted.total_events
+        vars(self).update(vars(compacted))
+        logger.info(f"Compacted event store: dropped {dropped} events, kept {self.total_events}")
+        return dropped
+
+    def compact(self, cutoff):
+        """Drop every event older than cutoff in place and return how many were dropped"""
+        point = self.compaction_point()
+        compacted = self.compacted(cutoff, point)
+        if compacted is None:
+            return 0
+        return self.install(compacted, point)
+
+    def event_totals(self):
+        """Return {event_name: count} across all users"""
+        totals = [0] * len(self.event_names)
+        for name_code in self.name_col:
+            totals[name_code] += 1
+        return {self.event_names[code]: count for code, count in enumerate(totals)}
+
+    def event_property_keys(self, event_name):
+        """Return the property keys seen on event_name"""
+        name_code = self.event_names.code(event_name)
+        if name_code is None:
+            return set()
+        return set(self._event_properties[name_code])
+
+    def __len__(self):
+        return self.total_events
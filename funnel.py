@@ -0,0 +1,214 @@
+import logging
+import threading
+from array import array
+from bisect import bisect_left
+from statistics import median
+
+logger = logging.getLogger(__name__)
+
+NEVER = float('inf')
+
+
+class FunnelIndex:
+    """Dense per-event arrays of each user's first and last occurrence time
+
+    For every event name a funnel asks about, first[code][user_code] and
+    last[code][user_code] hold the user's earliest and latest time for it
+    (inf / -inf if never fired). The arrays are built in one pass over the
+    store's columns, extended with only the new rows as the store grows,
+    and rebuilt when the store is compacted. Pass the lock writers to the
+    store hold (StuckUserDetector.store_lock) when the store is shared.
+    """
+
+    def __init__(self, store, lock=None):
+        self.store = store
+        self.first = {}
+        self.last = {}
+        self._lock = lock or threading.Lock()
+        self._time_col = None
+        self._indexed_rows = 0
+        self._users = 0
+
+    def _sync(self, codes):
+        store = self.store
+        if self._time_col is not store.time_col or store.total_events < self._indexed_rows:
+            # New columns (compaction or a mapped snapshot turning writable)
+            self.first, self.last = {}, {}
+            self._time_col = store.time_col
+            self._indexed_rows = 0
+            self._users = 0
+        users = len(store.user_ids)
+        if users > self._users:
+            grow = users - self._users
+            for column in self.first.values():
+                column.extend([NEVER] * grow)
+            for column in self.last.values():
+                column.extend([-NEVER] * grow)
+            self._users = users
+
+        self._scan(set(self.first), self._indexed_rows, store.total_events)
+        self._indexed_rows = store.total_events
+        missing = {code for code in codes if code not in self.first}
+        if missing:
+            for code in missing:
+                self.first[code] = array('d', [NEVER]) * users
+                self.last[code] = array('d', [-NEVER]) * users
+            self._scan(missing, 0, self._indexed_rows)
+
+    def _scan(self, codes, start, end):
+        if not codes or start >= end:
+            return
+        store = self.store
+        name_col, user_col, time_col = store.name_col, store.user_col, store.time_col
+        first, last = self.first, self.last
+        for row in range(start, end):
+            code = name_col[row]
+            if code not in codes:
+                continue
+            user_code = user_col[row]
+            event_time = time_col[row]
+            if event_time < first[code][user_code]:
+                first[code][user_code] = event_time
+            if event_time > last[code][user_code]:
+                last[code][user_code] = event_time
+        logger.debug(f"Indexed first/last occurrences of {len(codes)} event(s) over rows {start}..{end}")
+
+    def _codes(self, event_names):
+        codes = [self.store.event_names.code(name) for name in event_names]
+        self._sync(code for code in codes if code is not None)
+        return codes
+
+    def _position(self, user_code, code, at):
+        """Position in the user's sorted rows of their first code row at time at"""
+        store = self.store
+        rows = store.user_rows(user_code)
+        name_col = store.name_col
+        position = bisect_left(rows, at, key=store.time_col.__getitem__)
+        while name_col[rows[position]] != code:
+            position += 1
+        return position
+
+    def _next_position(self, user_code, code, after):
+        """Position of the user's first code row after position after, or None"""
+        store = self.store
+        rows = store.user_rows(user_code)
+        name_col = store.name_col
+        for position in range(after + 1, len(rows)):
+            if name_col[rows[position]] == code:
+                return position
+        return None
+
+    def funnel(self, steps, window=None):
+        """Ordered conversion through steps (event names) within window seconds
+
+        A user enters at their first occurrence of the first step and must
+        fire each later step strictly after the row that matched the
+        previous one (ties in time go by row order), all within window of
+        entering. Most users are decided by comparing the dense first/last
+        arrays; only those whose first occurrence of a step does not come
+        after the previous step but whose last does not come before it are
+        resolved from their rows.
+        """
+        with self._lock:
+            codes = self._codes(steps)
+            time_col = self.store.time_col
+            result = []
+            if codes[0] is None:
+                entered = []
+            else:
+                # (user_code, entered at, previous step's time, its row position or None)
+                entered = [(user_code, at, at, None) for user_code, at in enumerate(self.first[codes[0]])
+                           if at != NEVER]
+            result.append({'event': steps[0], 'users': len(entered), 'conversion': 1.0 if entered else 0.0,
+                           'step_conversion': 1.0 if entered else 0.0, 'median_seconds': None})
+            total = len(entered)
+            current = entered
+
+            for index in range(1, len(steps)):
+                name, code, previous_code = steps[index], codes[index], codes[index - 1]
+                advanced = []
+                durations = []
+                if code is not None:
+                    first, last = self.first[code], self.last[code]
+                    for user_code, entered_at, previous, position in current:
+                        at = first[user_code]
+                        if at == NEVER or last[user_code] < previous:
+                            continue
+                        if at > previous:
+                            position = None
+                        else:
+                            if position is None:
+                                position = self._position(user_code, previous_code, previous)
+                            position = self._next_position(user_code, code, position)
+                            if position is None:
+                                continue
+                            at = time_col[self.store.user_rows(user_code)[position]]
+                        if window is not None and at - entered_at > window:
+                            continue
+                        advanced.append((user_code, entered_at, at, position))
+                        durations.append(at - previous)
+                result.append({
+                    'event': name,
+                    'users': len(advanced),
+                    'conversion': len(advanced) / total if total else 0.0,
+                    'step_conversion': len(advanced) / len(current) if current else 0.0,
+                    'median_seconds': median(durations) if durations else None
+                })
+                current = advanced
+            return {'steps': result, 'window': window}
+
+    def compare_intervention(self, intervention, success_event, attempt_event=None):
+        """Success before vs after each user's intervention, and against the rest
+
+        intervention is an event name (its first occurrence per user is the
+        intervention time) or a {user_id: time} mapping. Treated users count
+        as succeeding before if they fired success_event before their
+        intervention and after if they fired it at or after. The control
+        group is every other user who fired attempt_event (everyone if None).
+        """
+        with self._lock:
+            store = self.store
+            names = [success_event, attempt_event] + ([intervention] if isinstance(intervention, str) else [])
+            codes = self._codes(name for name in names if name is not None)
+            success_code = codes[0]
+            users = len(store.user_ids)
+
+            if isinstance(intervention, str):
+                code = store.event_names.code(intervention)
+                helped_at = self.first[code] if code is not None else array('d', [NEVER]) * users
+            else:
+                helped_at = array('d', [NEVER]) * users
+                for user_id, at in intervention.items():
+                    user_code = store.user_ids.code(user_id)
+                    if user_code is not None:
+                        helped_at[user_code] = at
+
+            if success_code is not None:
+                success_first, success_last = self.first[success_code], self.last[success_code]
+            else:
+                success_first, success_last = array('d', [NEVER]) * users, array('d', [-NEVER]) * users
+            attempt_code = store.event_names.code(attempt_event) if attempt_event is not None else None
+            attempted = self.first[attempt_code] if attempt_code is not None else None
+
+            treated = before = after = recovered = 0
+            control = control_success = 0
+            for user_code, at in enumerate(helped_at):
+                if at != NEVER:
+                    treated += 1
+                    succeeded_before = success_first[user_code] < at
+                    succeeded_after = success_last[user_code] >= at
+                    before += succeeded_before
+                    after += succeeded_after
+                    recovered += succeeded_after and not succeeded_before
+                elif attempt_event is None or (attempted is not None and attempted[user_code] != NEVER):
+                    control += 1
+                    control_success += success_first[user_code] != NEVER
+
+            return {
+                'treated': treated,
+                'success_before': before / treated if treated else 0.0,
+                'success_after': after / treated if treated else 0.0,
+                'recovered': recovered,
+                'control': control,
+                'control_success': control_success / control if control else 0.0
+            }
@@ -0,0 +1,220 @@
+import argparse
+import logging
+import os
+import time
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from event_loader import load_events
+
+logger = logging.getLogger(__name__)
+
+EXPORT_URL = "https://data.mixpanel.com/api/2.0/export"
+DEFAULT_WORKERS = 8
+DEFAULT_RETRIES = 5
+CHUNK_SIZE = 1 << 16
+# (connect, read) timeouts; a day's export can stall between lines for a while
+DEFAULT_TIMEOUT = (10, 300)
+
+
+class ExportError(Exception):
+    """One or more days could not be downloaded"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        super().__init__(f"Export failed for {', '.join(sorted(failures))}")
+
+
+def get_auth_header(api_secret):
+    """Create authorization header for Mixpanel API"""
+    credentials = b64encode(f"{api_secret}:".encode("utf-8")).decode("utf-8")
+    return {"Authorization": f"Basic {credentials}"}
+
+
+def make_session(pool_size=DEFAULT_WORKERS, retries=DEFAULT_RETRIES, backoff=1.0):
+    """A requests.Session whose pooled connections retry throttling and 5xx errors"""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        respect_retry_after_header=True
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def day_range(from_date, to_date):
+    """Every date from from_date to to_date inclusive"""
+    return [from_date + timedelta(days=offset) for offset in range((to_date - from_date).days + 1)]
+
+
+def partition_path(directory, day):
+    return os.path.join(directory, f"{day:%Y-%m-%d}.ndjson")
+
+
+def partition_paths(directory):
+    """Completed day partitions in a directory, oldest first"""
+    names = sorted(name for name in os.listdir(directory) if name.endswith('.ndjson'))
+    return [os.path.join(directory, name) for name in names]
+
+
+def load_partitions(directory, sink, days=None):
+    """Stream completed partitions (all, or those for days) into sink(batch)"""
+    if days is None:
+        paths = partition_paths(directory)
+    else:
+        paths = [path for path in (partition_path(directory, day) for day in days) if os.path.exists(path)]
+    totals = {'partitions': 0, 'events': 0, 'bytes': 0}
+    for path in paths:
+        stats = load_events(path, sink)
+        totals['partitions'] += 1
+        totals['events'] += stats['events']
+        totals['bytes'] += stats['bytes']
+    return totals
+
+
+def _trim_partial_line(path):
+    """Cut a .part file back to its last complete line; return its new size"""
+    with open(path, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        position = size
+        while position > 0:
+            step = min(CHUNK_SIZE, position)
+            f.seek(position - step)
+            block = f.read(step)
+            newline = block.rfind(b'\n')
+            if newline != -1:
+                position = position - step + newline + 1
+                break
+            position -= step
+        f.truncate(position)
+    return position
+
+
+class ExportFetcher:
+    """Downloads a date range from the Export API as one NDJSON file per day
+
+    Days are fetched concurrently over one pooled session, so a backfill
+    takes about as long as its slowest day. Each day streams into
+    <day>.ndjson.part and is renamed when complete; completed days are
+    skipped on the next run, and an interrupted day resumes from its last
+    complete line when the server honours Range requests.
+    """
+
+    def __init__(self, api_secret, project_id, directory, url=EXPORT_URL, workers=DEFAULT_WORKERS,
+                 retries=DEFAULT_RETRIES, backoff=1.0, timeout=DEFAULT_TIMEOUT):
+        self.project_id = project_id
+        self.directory = directory
+        self.url = url
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.headers = get_auth_header(api_secret)
+        self.session = make_session(workers, retries, backoff)
+        os.makedirs(directory, exist_ok=True)
+
+    def fetch_day(self, day, refresh=False):
+        """Download one day unless already complete; return its stats"""
+        path = partition_path(self.directory, day)
+        if os.path.exists(path) and not refresh:
+            return {'day': f"{day:%Y-%m-%d}", 'status': 'cached', 'bytes': os.path.getsize(path), 'seconds': 0.0}
+
+        started = time.monotonic()
+        part_path = path + '.part'
+        params = {'project_id': self.project_id, 'from_date': f"{day:%Y-%m-%d}", 'to_date': f"{day:%Y-%m-%d}"}
+        attempt = 0
+        while True:
+            # The session retries failed requests; this loop covers streams cut off midway
+            offset = _trim_partial_line(part_path) if os.path.exists(part_path) else 0
+            headers = dict(self.headers)
+            if offset:
+                headers['Range'] = f"bytes={offset}-"
+            try:
+                with self.session.get(self.url, params=params, headers=headers, stream=True,
+                                      timeout=self.timeout) as response:
+                    response.raise_for_status()
+                    # A plain 200 means the server ignored Range: start the day over
+                    mode = 'ab' if offset and response.status_code == 206 else 'wb'
+                    with open(part_path, mode) as f:
+                        for chunk in response.iter_content(CHUNK_SIZE):
+                            f.write(chunk)
+                break
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+                delay = self.backoff * 2 ** (attempt - 1)
+                logger.warning(f"Export of {day} interrupted ({e}); resuming in {delay:.1f}s")
+                time.sleep(delay)
+
+        os.replace(part_path, path)
+        return {
+            'day': f"{day:%Y-%m-%d}",
+            'status': 'downloaded',
+            'bytes': os.path.getsize(path),
+            'seconds': round(time.monotonic() - started, 3)
+        }
+
+    def fetch(self, from_date, to_date, refresh_days=()):
+        """Download every day in the range concurrently; return per-day stats"""
+        return self.fetch_days(day_range(from_date, to_date), refresh_days)
+
+    def fetch_days(self, days, refresh_days=()):
+        """Download the given days concurrently; return per-day stats
+
+        Days in refresh_days are downloaded again even if complete. Raises
+        ExportError naming the failed days once all others have finished.
+        """
+        refresh_days = set(refresh_days)
+        results, failures = [], {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {day: pool.submit(self.fetch_day, day, day in refresh_days) for day in days}
+            for day, future in futures.items():
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    logger.error(f"Export of {day} failed: {e}")
+                    failures[f"{day:%Y-%m-%d}"] = e
+        if failures:
+            raise ExportError(failures)
+        downloaded = [r for r in results if r['status'] == 'downloaded']
+        logger.info(
+            f"Exported {len(days)} days ({len(downloaded)} downloaded, "
+            f"{sum(r['bytes'] for r in downloaded) / 1e6:.1f} MB) to {self.directory}"
+        )
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download Mixpanel raw events as one NDJSON file per day")
+    parser.add_argument('--from-date', help="First day (YYYY-MM-DD); defaults to 7 days ago")
+    parser.add_argument('--to-date', help="Last day (YYYY-MM-DD); defaults to today")
+    parser.add_argument('--out', default=os.getenv('MIXPANEL_EXPORT_DIR', 'exports'))
+    parser.add_argument('--project-id', default=os.getenv('MIXPANEL_PROJECT_ID', '3632652'))
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    args = parser.parse_args()
+
+    api_secret = os.getenv('MIXPANEL_API_SECRET')
+    if not api_secret:
+        parser.error("MIXPANEL_API_SECRET environment variable not set")
+    to_date = datetime.strptime(args.to_date, '%Y-%m-%d').date() if args.to_date else date.today()
+    from_date = datetime.strptime(args.from_date, '%Y-%m-%d').date() if args.from_date else to_date - timedelta(days=7)
+
+    logging.basicConfig(level=logging.INFO)
+    fetcher = ExportFetcher(api_secret, args.project_id, args.out, workers=args.workers)
+    for result in fetcher.fetch(from_date, to_date):
+        print(f"{result['day']}: {result['status']}, {result['bytes']} bytes in {result['seconds']}s")
+
+
+if __name__ == '__main__':
+    main()
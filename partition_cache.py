@@ -0,0 +1,199 @@
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from event_loader import BATCH_SIZE, LoadProgress, iter_events
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+# Export days follow the project's timezone (Project Settings in Mixpanel)
+DEFAULT_TIMEZONE = 'UTC'
+# Late events keep landing for a while, so the most recent days stay mutable
+DEFAULT_MUTABLE_DAYS = 2
+
+
+def project_today(timezone=DEFAULT_TIMEZONE):
+    """The current date in the project's timezone"""
+    return datetime.now(ZoneInfo(timezone)).date()
+
+
+class PartitionCache:
+    """Local cache of gzipped per-day export partitions, described by a manifest
+
+    A day fetched at least mutable_days after it began (in the project's
+    timezone) is final and never downloaded again; more recent days may
+    still receive late events and are replaced on the next refresh. The
+    manifest records each partition's file, sizes, event count, checksum
+    and whether it is final.
+    """
+
+    def __init__(self, directory, timezone=DEFAULT_TIMEZONE, mutable_days=DEFAULT_MUTABLE_DAYS):
+        self.directory = directory
+        self.timezone = timezone
+        self.mutable_days = mutable_days
+        self.staging = os.path.join(directory, 'staging')
+        self._lock = threading.Lock()
+        os.makedirs(self.staging, exist_ok=True)
+        self.manifest = self._read_manifest()
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, MANIFEST_NAME)
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {'version': MANIFEST_VERSION, 'days': {}}
+        # Drop entries whose file has gone missing so they are fetched again
+        manifest['days'] = {
+            day: entry for day, entry in manifest['days'].items()
+            if os.path.exists(os.path.join(self.directory, entry['file']))
+        }
+        return manifest
+
+    def _write_manifest(self):
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+
+    def days(self):
+        """Cached days, oldest first"""
+        return sorted(datetime.strptime(day, '%Y-%m-%d').date() for day in self.manifest['days'])
+
+    def stale_days(self, days):
+        """The days that are missing or not yet final"""
+        entries = self.manifest['days']
+        return [day for day in days if not entries.get(f"{day:%Y-%m-%d}", {}).get('final')]
+
+    def add(self, day, ndjson_path, final):
+        """Compress a downloaded NDJSON day into the cache and record it"""
+        name = f"{day:%Y-%m-%d}.ndjson.gz"
+        path = os.path.join(self.directory, name)
+        temp_path = path + '.tmp'
+        digest = hashlib.sha256()
+        events = 0
+        with open(ndjson_path, 'rb') as source, gzip.open(temp_path, 'wb') as target:
+            for line in source:
+                digest.update(line)
+                if line.strip():
+                    events += 1
+                target.write(line)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            self.manifest['days'][f"{day:%Y-%m-%d}"] = {
+                'file': name,
+                'events': events,
+                'bytes': os.path.getsize(ndjson_path),
+                'compressed_bytes': os.path.getsize(path),
+                'sha256': digest.hexdigest(),
+                'fetched_at': time.time(),
+                'final': final
+            }
+            self._write_manifest()
+
+    def refresh(self, fetcher, from_date, to_date, today=None):
+        """Download only the missing and still-mutable days of a range
+
+        fetcher is a mixpanel_export.ExportFetcher; it downloads into the
+        staging directory and each finished day is compressed into the
+        cache, even when other days fail (the fetcher's error is re-raised
+        afterwards). today defaults to the project-timezone date. Returns
+        the days that were fetched.
+        """
+        today = today or project_today(self.timezone)
+        days = [day for day in self.stale_days(_day_range(from_date, to_date)) if day <= today]
+        if not days:
+            logger.info(f"Partition cache up to date for {from_date}..{to_date}")
+            return []
+        fetcher.directory = self.staging
+        try:
+            fetcher.fetch_days(days, refresh_days=days)
+        except Exception:
+            # Keep what completed; a day is only staged once fully downloaded
+            self._add_staged(days, today)
+            raise
+        self._add_staged(days, today)
+        logger.info(f"Refreshed {len(days)} day(s) into the partition cache")
+        return days
+
+    def _add_staged(self, days, today):
+        for day in days:
+            staged = os.path.join(self.staging, f"{day:%Y-%m-%d}.ndjson")
+            if os.path.exists(staged):
+                self.add(day, staged, final=(today - day).days >= self.mutable_days)
+                os.remove(staged)
+
+    def load(self, sink, days=None, batch_size=BATCH_SIZE):
+        """Stream cached events (all days, or those given) into sink(batch)"""
+        progress = LoadProgress(f"Loading partition cache {self.directory}")
+        wanted = self.days() if days is None else [day for day in days if f"{day:%Y-%m-%d}" in self.manifest['days']]
+        batch = []
+        for day in wanted:
+            entry = self.manifest['days'][f"{day:%Y-%m-%d}"]
+            with gzip.open(os.path.join(self.directory, entry['file']), 'rb') as fp:
+                for event in iter_events(fp, progress):
+                    batch.append(event)
+                    if len(batch) >= batch_size:
+                        sink(batch)
+                        batch = []
+        if batch:
+            sink(batch)
+        progress.report()
+        return dict(progress.summary(), partitions=len(wanted))
+
+    def stats(self):
+        entries = self.manifest['days'].values()
+        return {
+            'partitions': len(entries),
+            'final': sum(1 for entry in entries if entry['final']),
+            'events': sum(entry['events'] for entry in entries),
+            'bytes': sum(entry['bytes'] for entry in entries),
+            'compressed_bytes': sum(entry['compressed_bytes'] for entry in entries)
+        }
+
+
+# Same as mixpanel_export.day_range, without importing requests for offline reads
+def _day_range(from_date, to_date):
+    return [from_date + timedelta(days=offset) for offset in range((to_date - from_date).days + 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bring the local export partition cache up to date")
+    parser.add_argument('--days', type=int, default=7, help="How many days back from today to keep cached")
+    parser.add_argument('--cache', default=os.getenv('MIXPANEL_CACHE_DIR', 'export_cache'))
+    parser.add_argument('--project-id', default=os.getenv('MIXPANEL_PROJECT_ID', '3632652'))
+    parser.add_argument('--timezone', default=os.getenv('MIXPANEL_PROJECT_TIMEZONE', DEFAULT_TIMEZONE),
+                        help="Project timezone that export days follow")
+    parser.add_argument('--mutable-days', type=int, default=DEFAULT_MUTABLE_DAYS,
+                        help="How many recent days to keep re-fetching for late events")
+    args = parser.parse_args()
+
+    api_secret = os.getenv('MIXPANEL_API_SECRET')
+    if not api_secret:
+        parser.error("MIXPANEL_API_SECRET environment variable not set")
+
+    from mixpanel_export import ExportFetcher
+
+    logging.basicConfig(level=logging.INFO)
+    cache = PartitionCache(args.cache, args.timezone, args.mutable_days)
+    today = project_today(args.timezone)
+    fetched = cache.refresh(ExportFetcher(api_secret, args.project_id, cache.staging),
+                            today - timedelta(days=args.days), today, today)
+    print(f"Fetched {len(fetched)} day(s); cache now holds {cache.stats()}")
+
+
+if __name__ == '__main__':
+    main()
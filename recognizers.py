@@ -0,0 +1,183 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import speech_recognition as sr
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest sample in the latency moving average
+LATENCY_SMOOTHING = 0.2
+# How long a backend that raised RequestError is skipped, in seconds
+FAILURE_COOLDOWN = 30
+
+
+class RecognizerBackend:
+    """A speech-to-text engine usable by process_voice"""
+
+    name = None
+
+    def recognize(self, recognizer, audio):
+        """Return the transcript or raise sr.UnknownValueError / sr.RequestError"""
+        raise NotImplementedError
+
+
+class GoogleBackend(RecognizerBackend):
+    """Google Web Speech API (network)"""
+
+    name = 'google'
+
+    def recognize(self, recognizer, audio):
+        return recognizer.recognize_google(audio)
+
+
+class SphinxBackend(RecognizerBackend):
+    """CMU PocketSphinx, fully offline (pip install pocketsphinx)"""
+
+    name = 'sphinx'
+
+    def recognize(self, recognizer, audio):
+        return recognizer.recognize_sphinx(audio)
+
+
+class FixtureBackend(RecognizerBackend):
+    """Deterministic stand-in for tests and load tests: no network, no model
+
+    Transcripts are looked up by a hash of the raw audio in an optional JSON
+    fixture file ({sha256: text}); anything else gets default_text.
+    """
+
+    name = 'fixture'
+
+    def __init__(self, fixture_path=None, default_text=None):
+        self.transcripts = {}
+        if fixture_path:
+            with open(fixture_path) as f:
+                self.transcripts = json.load(f)
+        self.default_text = default_text
+
+    @staticmethod
+    def audio_key(audio):
+        return hashlib.sha256(audio.get_raw_data()).hexdigest()
+
+    def recognize(self, recognizer, audio):
+        text = self.transcripts.get(self.audio_key(audio), self.default_text)
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+
+class BackendStats:
+    """Latency and health bookkeeping for one backend"""
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.unrecognized = 0
+        self.latency = None
+        self.last_failure = None
+
+    def record(self, elapsed):
+        self.calls += 1
+        if self.latency is None:
+            self.latency = elapsed
+        else:
+            self.latency += LATENCY_SMOOTHING * (elapsed - self.latency)
+
+    def healthy(self, now):
+        return self.last_failure is None or now - self.last_failure > FAILURE_COOLDOWN
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'failures': self.failures,
+            'unrecognized': self.unrecognized,
+            'latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'healthy': self.healthy(time.time())
+        }
+
+
+class RecognizerRouter:
+    """Sends each utterance to a backend, failing over on service errors
+
+    With routing='ordered' backends are tried in configured order; with
+    routing='fastest' healthy backends are tried by measured latency.
+    """
+
+    def __init__(self, backends, routing='ordered'):
+        if not backends:
+            raise ValueError("At least one recognizer backend is required")
+        self.backends = backends
+        self.routing = routing
+        self._stats = {backend.name: BackendStats() for backend in backends}
+        self._lock = threading.Lock()
+
+    def _candidates(self):
+        now = time.time()
+        with self._lock:
+            healthy = [b for b in self.backends if self._stats[b.name].healthy(now)]
+            if self.routing == 'fastest':
+                # Unmeasured backends go first so each gets a latency sample
+                healthy.sort(key=lambda b: self._stats[b.name].latency or 0.0)
+        # If everything is cooling down, try them all rather than fail outright
+        return healthy or list(self.backends)
+
+    def recognize(self, recognizer, audio):
+        """Return (text, backend name); raise the last RequestError if all fail"""
+        last_error = None
+        for backend in self._candidates():
+            stats = self._stats[backend.name]
+            started = time.perf_counter()
+            try:
+                text = backend.recognize(recognizer, audio)
+            except sr.UnknownValueError:
+                # The engine worked but heard nothing usable; don't fail over
+                with self._lock:
+                    stats.record(time.perf_counter() - started)
+                    stats.unrecognized += 1
+                raise
+            except sr.RequestError as e:
+                logger.warning(f"Recognizer backend {backend.name} failed: {e}")
+                with self._lock:
+                    stats.failures += 1
+                    stats.last_failure = time.time()
+                last_error = e
+                continue
+            with self._lock:
+                stats.record(time.perf_counter() - started)
+            return text, backend.name
+        raise last_error
+
+    def stats(self):
+        with self._lock:
+            return {
+                'routing': self.routing,
+                'backends': {name: stats.to_dict() for name, stats in self._stats.items()}
+            }
+
+
+BACKENDS = {
+    'google': GoogleBackend,
+    'sphinx': SphinxBackend,
+    'fixture': lambda: FixtureBackend(
+        os.getenv('RECOGNIZER_FIXTURE_PATH'),
+        os.getenv('RECOGNIZER_FIXTURE_TEXT', 'help')
+    )
+}
+
+
+def router_from_config(names=None, routing=None):
+    """Build a router from RECOGNIZER_BACKENDS (comma-separated) and RECOGNIZER_ROUTING"""
+    names = names or os.getenv('RECOGNIZER_BACKENDS', 'google')
+    routing = routing or os.getenv('RECOGNIZER_ROUTING', 'ordered')
+    backends = []
+    for name in names.split(','):
+        name = name.strip()
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown recognizer backend: {name}")
+        backends.append(BACKENDS[name]())
+    logger.info(f"Speech recognition backends: {[b.name for b in backends]} ({routing})")
+    return RecognizerRouter(backends, routing)
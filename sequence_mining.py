@@ -0,0 +1,197 @@
+import argparse
+import heapq
+import logging
+from array import array
+
+from sessions import DEFAULT_SESSION_GAP
+from struggle_scoring import classify_event_name
+
+logger = logging.getLogger(__name__)
+
+TARGET_EVENT = 'favorite sandwich'
+# Odd 64-bit multipliers, one per sketch row
+_MULTIPLIERS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93)
+_MASK64 = (1 << 64) - 1
+
+
+class HeavyHitters:
+    """Count-min sketch with a bounded table of the heaviest keys
+
+    Memory is fixed by width_bits, depth and capacity however many distinct
+    keys are added; counts are upper bounds, exact when nothing collides.
+    """
+
+    def __init__(self, width_bits=16, depth=4, capacity=200):
+        self.width_bits = width_bits
+        self.rows = [array('I', bytes(4 << width_bits)) for _ in range(depth)]
+        self.capacity = capacity
+        self.candidates = {}
+        self._floor = 0
+
+    def add(self, key):
+        shift = 64 - self.width_bits
+        estimate = None
+        for multiplier, row in zip(_MULTIPLIERS, self.rows):
+            slot = ((key * multiplier) & _MASK64) >> shift
+            row[slot] += 1
+            if estimate is None or row[slot] < estimate:
+                estimate = row[slot]
+
+        candidates = self.candidates
+        if key in candidates or len(candidates) < self.capacity:
+            candidates[key] = estimate
+        elif estimate > self._floor:
+            # The floor can lag behind as candidates grow, so recheck it here
+            smallest = min(candidates, key=candidates.__getitem__)
+            if estimate > candidates[smallest]:
+                del candidates[smallest]
+                candidates[key] = estimate
+            self._floor = min(candidates.values())
+
+    def top(self, count):
+        return sorted(self.candidates.items(), key=lambda item: item[1], reverse=True)[:count]
+
+
+class SequenceMiner:
+    """Mines per-user event order from an EventStore's time-sorted row index
+
+    Event names are handled as the store's integer codes. Transitions are
+    counted in a dict keyed by the (from, to) code pair packed into one
+    integer, so only pairs that occur take space; longer n-grams and the
+    paths leading into struggle events go through HeavyHitters keyed by the
+    codes packed into one integer. A user's sequence restarts after
+    session_gap of inactivity.
+    """
+
+    def __init__(self, store, n=3, path_length=3, target_event=TARGET_EVENT,
+                 session_gap=DEFAULT_SESSION_GAP, width_bits=16, capacity=200):
+        self.store = store
+        self.n = n
+        self.path_length = path_length
+        self.session_gap = session_gap
+        self.names = list(store.event_names.values)
+        self.base = len(self.names) + 1
+        self.target = store.event_names.code(target_event)
+        self.struggle = bytearray(classify_event_name(name)[1] for name in self.names)
+
+        # from_code * len(names) + to_code -> count
+        self.transitions = {}
+        self.ngrams = HeavyHitters(width_bits, capacity=capacity)
+        self.struggle_paths = HeavyHitters(width_bits, capacity=capacity)
+        # Last event of users who never reached the target
+        self.dropoff = array('I', bytes(4 * len(self.names)))
+        self.users = 0
+        self.converted = 0
+
+    def _pack(self, codes):
+        key = 0
+        for code in codes:
+            key = key * self.base + code + 1
+        return key
+
+    def _unpack(self, key):
+        codes = []
+        while key:
+            key, digit = divmod(key, self.base)
+            codes.append(digit - 1)
+        return [self.names[code] for code in reversed(codes)]
+
+    def run(self):
+        store = self.store
+        name_col, time_col = store.name_col, store.time_col
+        names = len(self.names)
+        transitions = self.transitions
+        for user_code in range(len(store.user_ids)):
+            rows = store.user_rows(user_code)
+            if not rows:
+                continue
+            self.users += 1
+            window = []
+            previous_time = None
+            reached = False
+            for row in rows:
+                code = name_col[row]
+                event_time = time_col[row]
+                if previous_time is not None and event_time - previous_time > self.session_gap:
+                    window = []
+                previous_time = event_time
+
+                if window:
+                    pair = window[-1] * names + code
+                    transitions[pair] = transitions.get(pair, 0) + 1
+                if self.struggle[code] and window:
+                    self.struggle_paths.add(self._pack(window[-self.path_length:] + [code]))
+                window.append(code)
+                if len(window) > self.n:
+                    del window[0]
+                if len(window) == self.n:
+                    self.ngrams.add(self._pack(window))
+                if code == self.target:
+                    reached = True
+
+            if reached:
+                self.converted += 1
+            else:
+                self.dropoff[name_col[rows[-1]]] += 1
+        logger.debug(f"Mined sequences of {self.users} users over {names} event names")
+        return self
+
+    def results(self, top=10):
+        names = len(self.names)
+        transitions = heapq.nlargest(top, ((count, pair) for pair, count in self.transitions.items()))
+        dropoff = sorted(((count, code) for code, count in enumerate(self.dropoff) if count), reverse=True)[:top]
+        into_target = []
+        if self.target is not None:
+            into_target = heapq.nlargest(top, (
+                (count, pair // names) for pair, count in self.transitions.items() if pair % names == self.target
+            ))
+        return {
+            'users': self.users,
+            'converted': self.converted,
+            'transitions': [
+                {'from': self.names[pair // names], 'to': self.names[pair % names], 'count': count}
+                for count, pair in transitions
+            ],
+            'ngrams': [{'path': self._unpack(key), 'count': count} for key, count in self.ngrams.top(top)],
+            'dropoff': [{'event': self.names[code], 'users': count} for count, code in dropoff],
+            'before_target': [{'event': self.names[code], 'count': count} for count, code in into_target],
+            'paths_to_struggle': [
+                {'path': self._unpack(key), 'count': count} for key, count in self.struggle_paths.top(top)
+            ]
+        }
+
+
+def mine_sequences(store, top=10, **options):
+    """Run a SequenceMiner over store and return its top results"""
+    return SequenceMiner(store, **options).run().results(top)
+
+
+def print_journeys(results):
+    """Print mined journeys in the analyze_events report style"""
+    print("\n=== User Journeys ===")
+    print(f"Users: {results['users']} ({results['converted']} reached {TARGET_EVENT})")
+    print("\nMost common paths:")
+    for entry in results['ngrams']:
+        print(f"- {' → '.join(entry['path'])}: {entry['count']}")
+    print(f"\nWhere users who never reached {TARGET_EVENT} stopped:")
+    for entry in results['dropoff']:
+        print(f"- {entry['event']}: {entry['users']} users")
+    print("\nTop paths into struggle events:")
+    for entry in results['paths_to_struggle']:
+        print(f"- {' → '.join(entry['path'])}: {entry['count']}")
+
+
+def main():
+    from event_snapshot import load_store
+
+    parser = argparse.ArgumentParser(description="Mine user journeys from an events export")
+    parser.add_argument('export', help="Mixpanel export file (JSON array or NDJSON)")
+    parser.add_argument('--n', type=int, default=3, help="n-gram length")
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    print_journeys(mine_sequences(load_store(args.export), top=args.top, n=args.n))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 30 * 60
+DEFAULT_MAX_SESSIONS = 10000
+
+
+class MemorySessionStore:
+    """Per-process session store with sliding TTL expiry and an LRU size bound"""
+
+    def __init__(self, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.evictions = 0
+        self.expirations = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return a copy of the session, or None if missing or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= now:
+                del self._sessions[key]
+                self.expirations += 1
+                return None
+            # Reading a session keeps it alive, as in SQLiteSessionStore
+            self._sessions[key] = (now + self.ttl, value)
+            self._sessions.move_to_end(key)
+            # Copy so callers can't mutate stored state without set()
+            return json.loads(value)
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._sessions[key] = (now + self.ttl, json.dumps(value))
+            self._sessions.move_to_end(key)
+            self._expire(now)
+            while len(self._sessions) > self.max_size:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def _expire(self, now):
+        # Entries are in access order, so expired ones cluster at the front
+        while self._sessions:
+            key, (expires, _) = next(iter(self._sessions.items()))
+            if expires > now:
+                break
+            del self._sessions[key]
+            self.expirations += 1
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'live_sessions': len(self._sessions),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+
+class SQLiteSessionStore:
+    """Session store in a local SQLite file, shared by every worker on the host
+
+    Same semantics as MemorySessionStore; eviction/expiration counters are
+    per process, the live session count is global.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SESSIONS):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.evictions = 0
+        self.expirations = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        with self._connection() as db:
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                ' key TEXT PRIMARY KEY, value TEXT NOT NULL,'
+                ' expires REAL NOT NULL, accessed REAL NOT NULL)'
+            )
+            db.execute('CREATE INDEX IF NOT EXISTS sessions_accessed ON sessions (accessed)')
+
+    def _connection(self):
+        # sqlite3 connections can't be shared across threads
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=10)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+        return db
+
+    def get(self, key):
+        now = time.time()
+        with self._connection() as db:
+            row = db.execute('SELECT value, expires FROM sessions WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                db.execute('DELETE FROM sessions WHERE key = ?', (key,))
+                with self._lock:
+                    self.expirations += 1
+                return None
+            db.execute('UPDATE sessions SET accessed = ?, expires = ? WHERE key = ?', (now, now + self.ttl, key))
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        with self._connection() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO sessions (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value), now + self.ttl, now)
+            )
+            expired = db.execute('DELETE FROM sessions WHERE expires <= ?', (now,)).rowcount
+            overflow = db.execute('SELECT COUNT(*) FROM sessions').fetchone()[0] - self.max_size
+            evicted = 0
+            if overflow > 0:
+                evicted = db.execute(
+                    'DELETE FROM sessions WHERE key IN '
+                    '(SELECT key FROM sessions ORDER BY accessed LIMIT ?)', (overflow,)
+                ).rowcount
+        with self._lock:
+            self.expirations += expired
+            self.evictions += evicted
+
+    def delete(self, key):
+        with self._connection() as db:
+            db.execute('DELETE FROM sessions WHERE key = ?', (key,))
+
+    def __len__(self):
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM sessions WHERE expires > ?', (time.time(),)
+        ).fetchone()[0]
+
+    def stats(self):
+        return {
+            'backend': 'sqlite',
+            'path': self.path,
+            'live_sessions': len(self),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+
+def session_store_from_config():
+    """Build the store named by SESSION_STORE ('memory' or 'sqlite')"""
+    ttl = float(os.getenv('SESSION_TTL_SECONDS', DEFAULT_TTL))
+    max_size = int(os.getenv('SESSION_MAX_SESSIONS', DEFAULT_MAX_SESSIONS))
+    backend = os.getenv('SESSION_STORE', 'memory')
+    if backend == 'sqlite':
+        path = os.getenv('SESSION_DB_PATH', 'conversation_sessions.db')
+        logger.info(f"Conversation sessions stored in {path}")
+        return SQLiteSessionStore(path, ttl, max_size)
+    if backend != 'memory':
+        raise ValueError(f"Unknown session store: {backend}")
+    return MemorySessionStore(ttl, max_size)
@@ -0,0 +1,48 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# A gap longer than this between two events starts a new session
+DEFAULT_SESSION_GAP = 30 * 60
+NAVIGATION_EVENTS = ('page_view', 'screen_view')
+
+
+class SessionState:
+    """Incremental sessionization over one user's time-sorted events
+
+    Time between consecutive events in the same session is credited to the
+    screen the user was on, so per-screen dwell time, session boundaries and
+    session counts all come out of a single linear pass.
+    """
+
+    __slots__ = ('gap', 'last_time', 'screen', 'session_count', 'session_start', 'time_spent')
+
+    def __init__(self, gap=DEFAULT_SESSION_GAP):
+        self.gap = gap
+        self.last_time = None
+        self.screen = None
+        self.session_count = 0
+        self.session_start = None
+        self.time_spent = {}
+
+    def apply(self, event_name, properties):
+        """Fold one event into the session state (events must arrive in time order)"""
+        event_time = properties['time']
+        if self.last_time is None or event_time - self.last_time > self.gap:
+            # New session: whatever screen they were on is no longer current
+            self.session_count += 1
+            self.session_start = event_time
+            self.screen = None
+        elif self.screen is not None:
+            self.time_spent[self.screen] = self.time_spent.get(self.screen, 0) + event_time - self.last_time
+
+        if event_name in NAVIGATION_EVENTS:
+            self.screen = properties.get('screen_name', 'unknown')
+        self.last_time = event_time
+
+    def summary(self):
+        return {
+            'session_count': self.session_count,
+            'current_session_start': self.session_start,
+            'current_screen': self.screen
+        }
@@ -0,0 +1,153 @@
+import argparse
+import json
+import logging
+from array import array
+from collections import Counter
+
+from sessions import DEFAULT_SESSION_GAP, NAVIGATION_EVENTS, SessionState
+
+logger = logging.getLogger(__name__)
+
+
+def classify_event_name(event_name):
+    """Classify an event name once: (feature or None, is_error, is_navigation)"""
+    feature = event_name.replace('feature_', '') if event_name.startswith('feature_') else None
+    lowered = event_name.lower()
+    is_error = 'error' in lowered or 'failed' in lowered
+    return feature, is_error, event_name in NAVIGATION_EVENTS
+
+
+def score_struggles(store, user_ids=None, session_gap=DEFAULT_SESSION_GAP):
+    """Compute determine_struggle labels for many users in one pass over the columns
+
+    Event names are classified once per distinct name, then feature attempts,
+    error counts and navigation screens are reduced per user code while
+    walking the name/user/time columns. Dwell time only accrues after a
+    screen view, so only users with navigation events get a sessionization
+    pass over their sorted rows. Returns {user_id: struggling_with}.
+    """
+    user_count = len(store.user_ids)
+    if user_ids is None:
+        selected = None
+    else:
+        selected = bytearray(user_count)
+        for user_id in user_ids:
+            code = store.user_ids.code(user_id)
+            if code is not None:
+                selected[code] = 1
+
+    classes = [classify_event_name(name) for name in store.event_names.values]
+    # Only rows whose name matters for any rule are visited below
+    interesting = {code for code, (feature, is_error, is_nav) in enumerate(classes)
+                   if feature is not None or is_error or is_nav}
+
+    error_counts = array('I', bytes(4 * user_count)) if user_count else array('I')
+    # user code -> {feature: [count, first (time, row)]}
+    feature_attempts = {}
+    # user code -> [(time, row, screen)]
+    navigation = {}
+    screen_column = store.properties.get('screen_name')
+    time_col = store.time_col
+    user_col = store.user_col
+
+    for row, name_code in enumerate(store.name_col):
+        if name_code not in interesting:
+            continue
+        user_code = user_col[row]
+        if selected is not None and not selected[user_code]:
+            continue
+        feature, is_error, is_nav = classes[name_code]
+        if feature is not None:
+            attempts = feature_attempts.setdefault(user_code, {})
+            position = (time_col[row], row)
+            entry = attempts.get(feature)
+            if entry is None:
+                attempts[feature] = [1, position]
+            else:
+                entry[0] += 1
+                if position < entry[1]:
+                    entry[1] = position
+        if is_error:
+            error_counts[user_code] += 1
+        if is_nav:
+            screen = screen_column.get(row, 'unknown') if screen_column is not None else 'unknown'
+            navigation.setdefault(user_code, []).append(screen)
+
+    if selected is None:
+        codes = range(user_count)
+    else:
+        codes = [code for code in range(user_count) if selected[code]]
+
+    results = {}
+    for user_code in codes:
+        struggles = []
+
+        # determine_struggle walks features in the order they were first seen
+        attempts = feature_attempts.get(user_code)
+        if attempts:
+            for feature, (count, _) in sorted(attempts.items(), key=lambda item: item[1][1]):
+                if count >= 3:
+                    struggles.append(f"repeated_attempts_{feature}")
+
+        if error_counts[user_code] >= 2:
+            struggles.append("frequent_errors")
+
+        screens = navigation.get(user_code)
+        if screens and len(screens) >= 5 and len(set(screens)) >= 3:
+            struggles.append("confused_navigation")
+
+        if screens:
+            time_spent = _dwell_times(store, user_code, classes, screen_column, session_gap)
+            for screen, time in time_spent.items():
+                if time > 300:  # More than 5 minutes
+                    struggles.append(f"long_time_{screen}")
+
+        results[store.user_ids[user_code]] = struggles
+
+    logger.debug(f"Scored {len(results)} users over {len(store.name_col)} events")
+    return results
+
+
+def _dwell_times(store, user_code, classes, screen_column, session_gap):
+    """Run the sessionizer over one user's sorted rows and return time_spent"""
+    sessions = SessionState(session_gap)
+    name_col = store.name_col
+    time_col = store.time_col
+    for row in store.user_rows(user_code):
+        name_code = name_col[row]
+        properties = {'time': time_col[row]}
+        if classes[name_code][2] and screen_column is not None:
+            screen = screen_column.get(row, screen_column)
+            if screen is not screen_column:
+                properties['screen_name'] = screen
+        sessions.apply(store.event_names[name_code], properties)
+    return sessions.time_spent
+
+
+def print_struggles(labels):
+    """Print how many users carry each struggle label"""
+    counts = Counter(label for struggles in labels.values() for label in struggles)
+    struggling = sum(1 for struggles in labels.values() if struggles)
+    print("\n=== Struggles ===")
+    print(f"Users: {len(labels)} ({struggling} struggling)")
+    for label, count in counts.most_common():
+        print(f"- {label}: {count} users")
+
+
+def main():
+    from event_snapshot import load_store
+
+    parser = argparse.ArgumentParser(description="Score struggle labels for every user in an events export")
+    parser.add_argument('export', help="Mixpanel export file (JSON array or NDJSON)")
+    parser.add_argument('--output', help="Write {user_id: struggling_with} as JSON to this file")
+    args = parser.parse_args()
+
+    labels = score_struggles(load_store(args.export))
+    print_struggles(labels)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(labels, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
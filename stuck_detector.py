@@ -0,0 +1,372 @@
+import bisect
+import logging
+import threading
+from collections import deque
+from itertools import islice
+
+from event_store import EventStore, validate_event
+from sessions import DEFAULT_SESSION_GAP, NAVIGATION_EVENTS, SessionState
+from stuck_rules import RuleEngine
+
+logger = logging.getLogger(__name__)
+
+APP_OPEN_EVENT = 'app open'
+# How many stuck-set changes are kept for clients resuming a change stream
+CHANGE_LOG_SIZE = 10000
+
+
+class InvalidEvent(ValueError):
+    """An event in an appended batch is malformed; nothing was appended"""
+
+    def __init__(self, index, reason):
+        self.index = index
+        super().__init__(f"Event {index}: {reason}")
+
+
+class UserState:
+    """Running per-user aggregates behind analyze_user_context"""
+
+    __slots__ = ('feature_attempts', 'last_actions', 'error_events',
+                 'navigation_pattern', 'last_time', 'sessions')
+
+    def __init__(self, session_gap=DEFAULT_SESSION_GAP):
+        self.feature_attempts = {}
+        self.last_actions = deque(maxlen=10)
+        self.error_events = []
+        self.navigation_pattern = []
+        self.last_time = None
+        self.sessions = SessionState(session_gap)
+
+    def apply(self, event):
+        """Fold one event into the aggregates (events must arrive in time order)"""
+        event_name = event['event']
+        properties = event['properties']
+
+        # Track feature attempts
+        if event_name.startswith('feature_'):
+            feature = event_name.replace('feature_', '')
+            self.feature_attempts[feature] = self.feature_attempts.get(feature, 0) + 1
+
+        # Track last actions
+        self.last_actions.append({
+            'event': event_name,
+            'time': properties['time'],
+            'properties': properties
+        })
+
+        # Track error events
+        if 'error' in event_name.lower() or 'failed' in event_name.lower():
+            self.error_events.append(event)
+
+        # Track navigation
+        if event_name in NAVIGATION_EVENTS:
+            self.navigation_pattern.append({
+                'screen': properties.get('screen_name', 'unknown'),
+                'time': properties['time']
+            })
+
+        # Track dwell time per screen and session boundaries
+        self.sessions.apply(event_name, properties)
+
+        self.last_time = properties['time']
+
+    def context(self):
+        """Return the aggregates in the analyze_user_context shape"""
+        return {
+            'feature_attempts': dict(self.feature_attempts),
+            'last_actions': list(self.last_actions),
+            'time_spent': dict(self.sessions.time_spent),
+            'error_events': list(self.error_events),
+            'navigation_pattern': list(self.navigation_pattern),
+            'sessions': self.sessions.summary()
+        }
+
+
+def analyze_user_context(user_events, session_gap=DEFAULT_SESSION_GAP):
+    """Analyze user's behavior to understand their context and struggles"""
+    state = UserState(session_gap)
+    for event in sorted(user_events, key=lambda x: x['properties']['time']):
+        state.apply(event)
+    return state.context()
+
+
+def determine_struggle(context):
+    """Determine what the user is struggling with based on their behavior"""
+    struggles = []
+
+    # Check for repeated feature attempts
+    for feature, attempts in context['feature_attempts'].items():
+        if attempts >= 3:
+            struggles.append(f"repeated_attempts_{feature}")
+
+    # Check for error patterns
+    if len(context['error_events']) >= 2:
+        struggles.append("frequent_errors")
+
+    # Check navigation patterns
+    if len(context['navigation_pattern']) >= 3:
+        # Look for back-and-forth navigation
+        screens = [n['screen'] for n in context['navigation_pattern']]
+        if len(set(screens)) >= 3 and len(screens) >= 5:
+            struggles.append("confused_navigation")
+
+    # Check time spent on specific screens
+    for screen, time in context['time_spent'].items():
+        if time > 300:  # More than 5 minutes
+            struggles.append(f"long_time_{screen}")
+
+    return struggles
+
+
+def _feature_names(entry):
+    return [feature['feature'] for feature in entry['features']]
+
+
+class StuckSnapshot:
+    """One published version of the stuck-user set, ordered by user_id
+
+    Never mutated after publishing, so a request can page through it
+    without holding the detector lock.
+    """
+
+    __slots__ = ('version', 'sequence', 'users', 'user_ids', 'by_struggle')
+
+    def __init__(self, version, users, sequence=0):
+        self.version = version
+        # Last change-log sequence number reflected in this snapshot
+        self.sequence = sequence
+        self.users = sorted(users, key=lambda u: u['user_id'])
+        self.user_ids = [u['user_id'] for u in self.users]
+        # struggle label -> (entries, user ids), both in user_id order
+        self.by_struggle = {}
+        for user in self.users:
+            for label in user['struggling_with']:
+                entries, ids = self.by_struggle.setdefault(label, ([], []))
+                entries.append(user)
+                ids.append(user['user_id'])
+
+    def page(self, after=None, limit=None, struggle=None):
+        """Return (entries, last user_id if more follow, total) for one page
+
+        Pages continue after the user_id `after`, so a cursor stays valid
+        across versions even as users enter or leave the set.
+        """
+        if struggle is None:
+            users, ids = self.users, self.user_ids
+        else:
+            users, ids = self.by_struggle.get(struggle, ([], []))
+        start = 0 if after is None else bisect.bisect_right(ids, after)
+        end = len(users) if limit is None else min(len(users), start + limit)
+        return users[start:end], ids[end - 1] if end < len(users) else None, len(users)
+
+
+class StuckUserDetector:
+    """Keeps a materialized set of stuck users up to date as events are appended
+
+    Who counts as stuck is decided by the rules of a stuck_rules.RuleEngine
+    (by default the favorite sandwich rule plus the planned features).
+    """
+
+    def __init__(self, store=None, session_gap=DEFAULT_SESSION_GAP, rules=None):
+        self.store = store if store is not None else EventStore()
+        self.session_gap = session_gap
+        self.engine = RuleEngine(rules)
+        self.version = 0
+        self._states = {}
+        self._stuck = {}
+        self._snapshot = StuckSnapshot(0, [])
+        self._lock = threading.Lock()
+        # Serializes compactions, which run mostly outside _lock
+        self._retention_lock = threading.Lock()
+        # Newest event time when windowed rules were last re-evaluated for everyone
+        self._window_anchor = self.store.newest_time
+        # Deltas for change streams: became_stuck / recovered / label_changed
+        self.sequence = 0
+        self._changes = deque(maxlen=CHANGE_LOG_SIZE)
+        self._changed = threading.Condition(self._lock)
+
+        with self._lock:
+            # Only users who fired some rule's trigger event can qualify;
+            # per-user state is built lazily, for stuck users only
+            for user_id in self.engine.candidate_users(self.store):
+                self._refresh(user_id)
+            self._publish()
+
+    @property
+    def store_lock(self):
+        """Lock held whenever the detector writes to its store"""
+        return self._lock
+
+    def append_events(self, events):
+        """Ingest new events, updating only the users they touch
+
+        The whole batch is validated first: a malformed event raises
+        InvalidEvent with its index and nothing is appended.
+        """
+        events = list(events)
+        for index, event in enumerate(events):
+            try:
+                validate_event(event)
+            except ValueError as e:
+                raise InvalidEvent(index, e) from None
+
+        with self._lock:
+            touched = {event['properties']['distinct_id'] for event in events}
+            before = {user_id: self._stuck.get(user_id) for user_id in touched}
+            try:
+                for event in events:
+                    user_id = self.store.add(event)
+                    state = self._states.get(user_id)
+                    if state is None:
+                        continue
+                    if state.last_time is not None and event['properties']['time'] < state.last_time:
+                        # Late event: drop the state so it is replayed in time order
+                        del self._states[user_id]
+                    else:
+                        state.apply(event)
+            except BaseException:
+                # A state may be half-applied; rebuild those from the store
+                for user_id in touched:
+                    self._states.pop(user_id, None)
+                raise
+            finally:
+                # Windows end at the newest event, so as it moves on, users
+                # with no new events can recover or get stuck too; re-check
+                # them whenever it has advanced by a time bucket
+                newest = self.store.newest_time
+                if (self.engine.windowed and newest is not None and
+                        (self._window_anchor is None or newest - self._window_anchor >= self.store.bucket_seconds)):
+                    self._window_anchor = newest
+                    for user_id in self.engine.candidate_users(self.store, windowed_only=True):
+                        if user_id not in touched:
+                            touched.add(user_id)
+                            before[user_id] = self._stuck.get(user_id)
+                # Whatever was stored must show up in the snapshot and change log
+                changed = [user_id for user_id in touched if self._refresh(user_id)]
+                for user_id in changed:
+                    self._record(user_id, before[user_id], self._stuck.get(user_id))
+                if changed:
+                    self._publish()
+            logger.debug(f"Appended events for {len(touched)} users, {len(changed)} stuck entries changed")
+            return changed
+
+    def apply_retention(self, retention):
+        """Drop events more than retention seconds older than the newest one
+
+        Keeps memory bounded under continuous ingestion. The compacted store
+        is built without holding the lock, so ingest and readers carry on;
+        only catching up on rows appended meanwhile, the swap and
+        re-evaluating every candidate happen under it. Returns the number of
+        events dropped.
+        """
+        with self._retention_lock:
+            with self._lock:
+                point = self.store.compaction_point()
+            end = point[0]
+            if not end:
+                return 0
+            cutoff = max(islice(self.store.time_col, end)) - retention
+            compacted = self.store.compacted(cutoff, point)
+            if compacted is None:
+                return 0
+
+            with self._lock:
+                dropped = self.store.install(compacted, point)
+                before = self._stuck
+                self._states.clear()
+                self._stuck = {}
+                for user_id in self.engine.candidate_users(self.store):
+                    self._refresh(user_id)
+                self._window_anchor = self.store.newest_time
+                for user_id in before.keys() | self._stuck.keys():
+                    self._record(user_id, before.get(user_id), self._stuck.get(user_id))
+                self._publish()
+            return dropped
+
+    def stuck_users(self):
+        """Return the current stuck-user snapshot"""
+        return self._snapshot.users
+
+    def snapshot(self):
+        """Return the current StuckSnapshot (version and users together)"""
+        return self._snapshot
+
+    def get_context(self, user_id):
+        """Return the cached {'context', 'struggling_with'} of a stuck user, or None
+
+        Entries are rebuilt whenever the user's events change, so this is a
+        dictionary lookup rather than a pass over their history.
+        """
+        entry = self._stuck.get(user_id)
+        if entry is None:
+            return None
+        return {'context': entry['context'], 'struggling_with': entry['struggling_with']}
+
+    def _state(self, user_id):
+        state = self._states.get(user_id)
+        if state is None:
+            state = self._states[user_id] = UserState(self.session_gap)
+            for event in self.store.user_events(user_id):
+                state.apply(event)
+        return state
+
+    def _refresh(self, user_id):
+        """Re-evaluate one user; return True if their stuck entry changed"""
+        features = self.engine.evaluate(self.store, user_id)
+
+        if features:
+            context = self._state(user_id).context()
+            self._stuck[user_id] = {
+                'user_id': user_id,
+                'app_opens': self.store.event_count(user_id, APP_OPEN_EVENT),
+                'features': features,
+                'last_event': self.store.last_event(user_id),
+                'context': context,
+                'struggling_with': determine_struggle(context)
+            }
+            return True
+        return self._stuck.pop(user_id, None) is not None
+
+    def changes_since(self, sequence, timeout=None):
+        """Return the changes after sequence, waiting up to timeout for one
+
+        Returns [] on timeout, or None when the change log no longer reaches
+        back to sequence (or it is from another process); the caller should
+        then reload the full stuck-user list.
+        """
+        with self._changed:
+            if sequence > self.sequence:
+                return None
+            if not self._changed.wait_for(lambda: self.sequence > sequence, timeout):
+                return []
+            if self._changes[0]['seq'] > sequence + 1:
+                return None
+            return [change for change in self._changes if change['seq'] > sequence]
+
+    def _record(self, user_id, before, after):
+        """Append the delta between two stuck entries of a user, if any"""
+        if before is None and after is None:
+            return
+        if before is None:
+            kind = 'became_stuck'
+        elif after is None:
+            kind = 'recovered'
+        elif (before['struggling_with'] != after['struggling_with']
+              or _feature_names(before) != _feature_names(after)):
+            kind = 'label_changed'
+        else:
+            return
+        self.sequence += 1
+        self._changes.append({
+            'seq': self.sequence,
+            'type': kind,
+            'user_id': user_id,
+            'struggling_with': after['struggling_with'] if after else [],
+            'features': after['features'] if after else []
+        })
+
+    def _publish(self):
+        # Swap in a new snapshot so readers never see a half-updated one
+        self.version += 1
+        self._snapshot = StuckSnapshot(self.version, self._stuck.values(), self.sequence)
+        self._changed.notify_all()
@@ -0,0 +1,160 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+TRIGGER, SUCCESS, ERROR = range(3)
+
+
+class FeatureRule:
+    """When a user counts as stuck on one feature
+
+    A user is stuck once they fired trigger events at least min_triggers
+    times and their successes stay at or below max_successes and/or below
+    max_success_rate of their triggers, with at least min_errors errors.
+    With a window (seconds) only events from the last window seconds are
+    counted, up to the newest event in the store.
+    """
+
+    def __init__(self, name, trigger_events, success_events=(), error_events=(),
+                 min_triggers=1, max_successes=None, max_success_rate=None,
+                 min_errors=0, window=None):
+        if min_triggers < 1:
+            raise ValueError(f"Rule {name!r}: min_triggers must be at least 1")
+        if max_successes is None and max_success_rate is None:
+            max_successes = 0
+        self.name = name
+        self.trigger_events = tuple(trigger_events)
+        self.success_events = tuple(success_events)
+        self.error_events = tuple(error_events)
+        self.min_triggers = min_triggers
+        self.max_successes = max_successes
+        self.max_success_rate = max_success_rate
+        self.min_errors = min_errors
+        self.window = window
+
+    @classmethod
+    def for_feature(cls, feature, **thresholds):
+        """Rule over the {feature}_attempt / _complete / _error event convention"""
+        return cls(feature, [f"{feature}_attempt"], [f"{feature}_complete"], [f"{feature}_error"], **thresholds)
+
+    @classmethod
+    def from_dict(cls, spec):
+        spec = dict(spec)
+        if 'feature' in spec:
+            return cls.for_feature(spec.pop('feature'), **spec)
+        return cls(**spec)
+
+    def matches(self, triggers, successes, errors):
+        if triggers < self.min_triggers or errors < self.min_errors:
+            return False
+        if self.max_successes is not None and successes > self.max_successes:
+            return False
+        if self.max_success_rate is not None and successes / triggers >= self.max_success_rate:
+            return False
+        return True
+
+
+# The original rule, plus the features sketched in implementation_plan:
+# more than 3 attempts with under 30% completed over the last week
+DEFAULT_RULES = [
+    FeatureRule('favorite_sandwich', ['app open'], ['favorite sandwich'], min_triggers=5),
+] + [
+    FeatureRule.for_feature(feature, min_triggers=4, max_success_rate=0.3, window=7 * 24 * 3600)
+    for feature in ('data_export', 'custom_report', 'user_cohorts')
+]
+
+
+def load_rules(path):
+    """Read a JSON list of rule specs (FeatureRule keyword arguments)"""
+    with open(path) as f:
+        rules = [FeatureRule.from_dict(spec) for spec in json.load(f)]
+    logger.info(f"Loaded {len(rules)} stuck-user rules from {path}")
+    return rules
+
+
+class RuleEngine:
+    """Evaluates every rule for a user in one pass over their events
+
+    Each event name maps to the (rule, role) slots it feeds, so the cost of
+    evaluating a user grows with their distinct events (plus one time-bucket
+    range query per distinct window), not with the number of rules.
+    """
+
+    def __init__(self, rules=None):
+        self.rules = list(DEFAULT_RULES if rules is None else rules)
+        self._slots_by_name = {}
+        for index, rule in enumerate(self.rules):
+            for role, names in ((TRIGGER, rule.trigger_events), (SUCCESS, rule.success_events),
+                               (ERROR, rule.error_events)):
+                for name in names:
+                    self._slots_by_name.setdefault(name, []).append((index, role))
+        # Distinct windows, each answered by one bucketed range query per user
+        self._windows = sorted({rule.window for rule in self.rules if rule.window is not None})
+        # Slots indexed by event name code, extended as the store's dictionary
+        # grows and rebuilt when compaction gives the store a new one
+        self._slots_by_code = []
+        self._slots_names = None
+
+    def trigger_events(self):
+        return {name for rule in self.rules for name in rule.trigger_events}
+
+    def candidate_users(self, store, windowed_only=False):
+        """Users who fired at least one trigger event (insertion ordered)
+
+        With windowed_only, only trigger events of windowed rules count:
+        those users' status can change as time moves on.
+        """
+        names = {name for rule in self.rules if rule.window is not None or not windowed_only
+                 for name in rule.trigger_events}
+        users = {}
+        for name in sorted(names):
+            users.update(dict.fromkeys(store.users_with_event(name)))
+        return list(users)
+
+    def _code_slots(self, store):
+        names = store.event_names
+        if names is not self._slots_names:
+            self._slots_by_code = []
+            self._slots_names = names
+        while len(self._slots_by_code) < len(names):
+            self._slots_by_code.append(self._slots_by_name.get(names[len(self._slots_by_code)]))
+        return self._slots_by_code
+
+    @property
+    def windowed(self):
+        return bool(self._windows)
+
+    def evaluate(self, store, user_id):
+        """Return [{'feature', 'triggers', 'successes', 'errors'}] for every rule the user is stuck on
+
+        Windows end at the store's newest event time.
+        """
+        user_code = store.user_ids.code(user_id)
+        if user_code is None:
+            return []
+        slots_by_code = self._code_slots(store)
+        totals = {}
+
+        # Unwindowed rules come straight from the per-user counters
+        for name_code, count in store.user_counts(user_code).items():
+            for index, role in slots_by_code[name_code] or ():
+                if self.rules[index].window is None:
+                    totals.setdefault(index, [0, 0, 0])[role] += count
+
+        # Windowed rules count back from the newest event in the store
+        now = store.newest_time if self._windows else None
+        if now is not None:
+            for window in self._windows:
+                for name, count in store.window_counts(user_id, now - window).items():
+                    for index, role in self._slots_by_name.get(name, ()):
+                        if self.rules[index].window == window:
+                            totals.setdefault(index, [0, 0, 0])[role] += count
+
+        stuck = []
+        for index in sorted(totals):
+            triggers, successes, errors = totals[index]
+            rule = self.rules[index]
+            if rule.matches(triggers, successes, errors):
+                stuck.append({'feature': rule.name, 'triggers': triggers, 'successes': successes, 'errors': errors})
+        return stuck
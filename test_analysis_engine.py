@@ -0,0 +1,83 @@
+import random
+
+from analysis_engine import (AnalysisEngine, DistinctUsers, EventCounts, HyperLogLog, KeywordClassifier,
+                             TopK, UserSequences, jql_events, report, standard_engine)
+from test_event_store import make_event
+
+
+def test_single_pass_matches_direct_computation():
+    rng = random.Random(5)
+    names = ['app open', 'checkout_error', 'view menu', 'payment failed', 'order']
+    events = [make_event(rng.choice(names), f"u{rng.randrange(30)}", float(t), screen=t % 3) for t in range(2000)]
+
+    engine = standard_engine()
+    for start in range(0, len(events), 300):
+        engine.consume(events[start:start + 300])
+    results = engine.results()
+
+    counts = {}
+    for event in events:
+        counts[event['event']] = counts.get(event['event'], 0) + 1
+    assert results['event_counts'] == counts
+    assert results['event_properties']['order'] == ['distinct_id', 'screen', 'time']
+    assert set(results['keywords']['struggle']) == {'checkout_error', 'payment failed'}
+    assert results['keywords']['journey'] == {'view menu': counts['view menu']}
+    assert results['distinct_users']['total'] == 30
+    assert results['user_sequences']['u0'][-1] == [e['event'] for e in events if e['properties']['distinct_id'] == 'u0'][-1]
+
+
+def test_jql_rows_are_weighted():
+    engine = AnalysisEngine()
+    engine.register('counts', EventCounts())
+    engine.register('classes', KeywordClassifier({'struggle': ['error']}))
+    engine.register('users', DistinctUsers())
+
+    engine.consume_weighted(jql_events([
+        {'key': ['save_error', {'screen': 'a'}], 'value': 4},
+        {'key': ['save_error'], 'value': 3},
+        {'key': ['open'], 'value': 10},
+    ]))
+
+    results = engine.results()
+    assert results['counts'] == {'save_error': 7, 'open': 10}
+    assert results['classes'] == {'struggle': {'save_error': 7}}
+    assert results['users'] == {'total': 0}
+
+
+def test_bounded_aggregators():
+    top = TopK(k=2, capacity=20)
+    for name in ['a'] * 50 + ['b'] * 30 + [f"rare{i}" for i in range(100)]:
+        top.update({'event': name, 'properties': {}}, 1)
+    assert [entry['event'] for entry in top.result()] == ['a', 'b']
+
+    sequences = UserSequences(max_length=2, max_users=2)
+    for user_id in ['u1', 'u2', 'u1', 'u3']:
+        sequences.update(make_event('e', user_id, 0.0), 1)
+    assert sequences.result() == {'u1': ['e', 'e'], 'u3': ['e']}
+    assert sequences.dropped_users == 1
+
+
+def test_user_sequences_keep_latest_events_by_time():
+    sequences = UserSequences(max_length=3)
+    # Newest-first, as in the Mixpanel export
+    for name, t in [('d', 4.0), ('c', 3.0), ('b', 2.0), ('a', 1.0)]:
+        sequences.update(make_event(name, 'u1', t), 1)
+    assert sequences.result() == {'u1': ['b', 'c', 'd']}
+
+
+def test_report_lists_exact_top_events(tmp_path, capsys):
+    engine = standard_engine()
+    engine.consume([make_event(f"rare{i}", 'u1', float(i)) for i in range(150)])
+    engine.consume([make_event('common', 'u1', 0.0) for _ in range(3)])
+
+    analysis = report(engine, str(tmp_path / 'analysis.json'))
+
+    assert '- common: 3 occurrences' in capsys.readouterr().out
+    assert analysis['event_counts']['common'] == 3
+
+
+def test_hyperloglog_error_is_small():
+    sketch = HyperLogLog(precision=12)
+    for i in range(50000):
+        sketch.add(f"user-{i}")
+    assert abs(sketch.count() - 50000) / 50000 < 0.05
@@ -0,0 +1,66 @@
+import os
+
+from audio_cache import AudioCache
+
+
+class FakeSynthesizer:
+    """Writes the text itself as the 'audio' and counts calls"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, text, lang, path):
+        self.calls.append(text)
+        with open(path, 'w') as f:
+            f.write(text)
+
+
+def test_repeat_prompt_is_a_cache_hit(tmp_path):
+    synthesize = FakeSynthesizer()
+    cache = AudioCache(str(tmp_path), synthesize)
+
+    first = cache.get('hello')
+    second = cache.get('hello')
+
+    assert first == second
+    assert synthesize.calls == ['hello']
+    assert cache.get('hello', lang='fr') != first
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 2
+
+
+def test_lru_eviction_by_size(tmp_path):
+    synthesize = FakeSynthesizer()
+    cache = AudioCache(str(tmp_path), synthesize, max_bytes=10)
+
+    a = cache.get('aaaa')
+    cache.get('bbbb')
+    cache.get('aaaa')  # a is now most recently used
+    cache.get('cccc')
+
+    assert cache.stats()['evictions'] == 1
+    assert sorted(os.listdir(tmp_path)) == sorted([a, cache.get('cccc')])
+
+
+def test_prewarm_and_reload(tmp_path):
+    synthesize = FakeSynthesizer()
+    AudioCache(str(tmp_path), synthesize).prewarm(['one', 'two'])
+
+    reloaded = AudioCache(str(tmp_path), synthesize)
+    reloaded.get('one')
+
+    assert synthesize.calls == ['one', 'two']
+    assert reloaded.stats()['entries'] == 2
+
+
+def test_streamed_audio_is_cached_for_next_time(tmp_path):
+    synthesize = FakeSynthesizer()
+    cache = AudioCache(str(tmp_path), synthesize)
+
+    assert cache.lookup('hi there') is None
+    assert list(cache.stream('hi there', 'en', iter([b'hi ', b'there']))) == [b'hi ', b'there']
+
+    filename = cache.lookup('hi there')
+    assert filename == cache.get('hi there')
+    assert (tmp_path / filename).read_bytes() == b'hi there'
+    assert synthesize.calls == []
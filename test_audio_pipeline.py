@@ -0,0 +1,13 @@
+import wave
+
+from audio_pipeline import TARGET_RATE, pcm_to_wav
+
+
+def test_pcm_to_wav_is_16khz_mono():
+    pcm = b'\x01\x00' * TARGET_RATE
+
+    with wave.open(pcm_to_wav(pcm)) as wav:
+        assert wav.getframerate() == TARGET_RATE
+        assert wav.getnchannels() == 1
+        assert wav.getsampwidth() == 2
+        assert wav.readframes(wav.getnframes()) == pcm
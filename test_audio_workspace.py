@@ -0,0 +1,24 @@
+import os
+
+from audio_workspace import AudioWorkspace
+
+
+def test_request_dirs_are_private_and_removed(tmp_path):
+    workspace = AudioWorkspace(str(tmp_path))
+
+    with workspace.request_dir() as first, workspace.request_dir() as second:
+        assert first != second
+        open(os.path.join(first, 'input.webm'), 'wb').close()
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_cleanup_removes_only_expired(tmp_path):
+    workspace = AudioWorkspace(str(tmp_path), ttl=60)
+    stale = tmp_path / 'voice-stale'
+    stale.mkdir()
+    os.utime(stale, (0, 0))
+    (tmp_path / 'voice-fresh').mkdir()
+
+    assert workspace.cleanup_expired() == 1
+    assert os.listdir(tmp_path) == ['voice-fresh']
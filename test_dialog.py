@@ -0,0 +1,90 @@
+import itertools
+
+from dialog import DIALOG, Dialog, IntentMatcher
+
+
+def legacy_respond(state, text, context=None):
+    """The if/elif chain generate_response used before the dialog table"""
+    if context and state['context']:
+        struggles = state['context'].get('struggling_with', [])
+        if 'repeated_attempts_favorite_sandwich' in struggles:
+            return 'struggle_repeated_attempts'
+        elif 'frequent_errors' in struggles:
+            return 'struggle_frequent_errors'
+        elif 'confused_navigation' in struggles:
+            return 'struggle_confused_navigation'
+        elif 'long_time_sandwich_builder' in struggles:
+            return 'struggle_long_time_builder'
+    text = text.lower()
+    if state['stage'] == 'initial':
+        if any(word in text for word in ['help', 'stuck', 'confused', 'how', 'what']):
+            state['stage'] = 'help_needed'
+            return 'help_needed'
+        elif any(word in text for word in ['don\'t know', 'not sure', 'explain']):
+            state['stage'] = 'explanation_needed'
+            return 'explanation_needed'
+        state['stage'] = 'clarification_needed'
+        return 'clarification_needed'
+    elif state['stage'] == 'help_needed':
+        if any(word in text for word in ['save', 'remember', 'store']):
+            state['stage'] = 'tutorial'
+            return 'save_tutorial'
+        return 'help_needed_retry'
+    elif state['stage'] == 'explanation_needed':
+        if any(word in text for word in ['yes', 'sure', 'okay', 'show']):
+            state['stage'] = 'tutorial'
+            return 'tutorial_start'
+        state['stage'] = 'initial'
+        return 'explanation_declined'
+    elif state['stage'] == 'clarification_needed':
+        if any(word in text for word in ['find', 'where', 'location']):
+            state['stage'] = 'location_help'
+            return 'location_help'
+        state['stage'] = 'initial'
+        return 'clarification_declined'
+    elif state['stage'] == 'tutorial':
+        if any(word in text for word in ['yes', 'see', 'found']):
+            state['stage'] = 'next_step'
+            return 'next_step'
+        return 'tutorial_retry'
+    elif state['stage'] == 'next_step':
+        if any(word in text for word in ['done', 'finished', 'saved']):
+            state['stage'] = 'complete'
+            return 'complete'
+        return 'next_step_retry'
+
+
+UTTERANCES = [
+    "I need help", "I'm not sure, can you EXPLAIN", "explain how it works", "where is it",
+    "yes please", "I don't know what to do", "okay show me", "I found it", "all done",
+    "I saved it", "no thanks", "somewhere", "what?", "store it for later", "", "Whatever",
+]
+
+
+def test_matches_legacy_chain_for_every_stage():
+    dialog = Dialog()
+    stages = list(DIALOG) + ['location_help', 'complete']
+    for stage, text in itertools.product(stages, UTTERANCES):
+        expected_state = {'stage': stage, 'context': None}
+        state = dict(expected_state)
+        assert dialog.respond(state, text) == legacy_respond(expected_state, text), (stage, text)
+        assert state == expected_state
+
+
+def test_struggle_context_takes_priority():
+    context = {'struggling_with': ['confused_navigation', 'frequent_errors']}
+    state = {'stage': 'initial', 'context': context}
+
+    dialog = Dialog()
+    assert dialog.respond(state, 'help', context) == 'struggle_frequent_errors'
+    assert state['stage'] == 'initial'
+    # Only once per conversation; then the stage flow takes over
+    assert dialog.respond(state, 'help', context) == 'help_needed'
+
+
+def test_earlier_intent_wins_regardless_of_position():
+    matcher = IntentMatcher([('help',), ('explain',)])
+
+    assert matcher.match('explain, then help') == 0
+    assert matcher.match('just explain') == 1
+    assert matcher.match('nothing') is None
@@ -0,0 +1,39 @@
+import io
+import json
+
+from event_loader import LoadProgress, _iter_text_chunks, iter_events, iter_json_array, load_events
+from test_event_store import make_event
+
+EVENTS = [make_event('app open', f"u{i}", float(i), **{'$city': 'Zürich'}) for i in range(20)]
+
+
+def test_json_array_split_across_tiny_chunks():
+    """Elements and multi-byte characters split between reads still parse"""
+    data = json.dumps(EVENTS, indent=2, ensure_ascii=False).encode('utf-8')
+    progress = LoadProgress('test')
+    chunks = _iter_text_chunks(io.BytesIO(data), progress, chunk_size=3)
+
+    assert list(iter_json_array(chunks, progress)) == EVENTS
+    assert progress.events == len(EVENTS)
+    assert progress.bytes_read == len(data)
+
+
+def test_ndjson_skips_blank_and_bad_lines():
+    """Raw Export API output is detected and malformed lines are counted"""
+    lines = [json.dumps(e) for e in EVENTS[:3]]
+    data = '\n'.join([lines[0], '', 'not json', lines[1], lines[2]]).encode('utf-8')
+    progress = LoadProgress('test')
+
+    assert list(iter_events(io.BytesIO(data), progress)) == EVENTS[:3]
+    assert progress.skipped == 1
+
+
+def test_load_events_feeds_batches(tmp_path):
+    path = tmp_path / 'export.json'
+    path.write_text(json.dumps(EVENTS))
+    batches = []
+
+    stats = load_events(str(path), batches.append, batch_size=8)
+
+    assert [len(b) for b in batches] == [8, 8, 4]
+    assert stats['events'] == len(EVENTS)
@@ -0,0 +1,61 @@
+import json
+
+from event_snapshot import load_store, snapshot_path
+from event_store import EventStore
+from test_event_store import make_event
+
+EVENTS = [
+    make_event('app open', 'u1', 3.0, **{'$city': 'Eagan', 'mp_country_code': 'US'}),
+    make_event('favorite sandwich', 'u2', 2.0),
+    make_event('app open', 'u1', 1.0, rating=4),
+]
+
+
+def assert_same_store(expected, actual):
+    assert list(actual.users()) == list(expected.users())
+    for user_id in expected.users():
+        assert actual.user_events(user_id) == expected.user_events(user_id)
+        assert actual.event_counts(user_id) == expected.event_counts(user_id)
+    for event_name in expected.event_names.values:
+        assert actual.users_with_event(event_name) == expected.users_with_event(event_name)
+
+
+def test_snapshot_reload_matches_parse(tmp_path):
+    """The second load maps the snapshot and sees the same data"""
+    export = tmp_path / 'events.json'
+    export.write_text(json.dumps(EVENTS))
+
+    parsed = load_store(str(export))
+    mapped = load_store(str(export))
+
+    assert parsed._snapshot is None
+    assert mapped._snapshot is not None
+    assert_same_store(EventStore(EVENTS), mapped)
+
+
+def test_mapped_store_accepts_appends(tmp_path):
+    export = tmp_path / 'events.json'
+    export.write_text(json.dumps(EVENTS))
+    load_store(str(export))
+    mapped = load_store(str(export))
+    expected = EventStore(EVENTS)
+
+    for store in (mapped, expected):
+        store.add(make_event('app open', 'u2', 0.5, **{'$city': 'Ebetsu'}))
+        store.add(make_event('order sandwich', 'u3', 4.0))
+
+    assert_same_store(expected, mapped)
+
+
+def test_stale_snapshot_is_rebuilt(tmp_path):
+    export = tmp_path / 'events.json'
+    export.write_text(json.dumps(EVENTS))
+    load_store(str(export))
+
+    export.write_text(json.dumps(EVENTS[:1]))
+    reloaded = load_store(str(export))
+
+    assert reloaded._snapshot is None
+    assert len(reloaded) == 1
+    assert (tmp_path / 'events.json.snapshot').exists()
+    assert snapshot_path(str(export)).endswith('.snapshot')
@@ -0,0 +1,128 @@
+import random
+
+import pytest
+
+from event_store import EventStore
+
+
+def make_event(name, user_id, time, **properties):
+    """Build an event in the Mixpanel export shape"""
+    properties.update({'time': time, 'distinct_id': user_id})
+    return {'event': name, 'properties': properties}
+
+
+def test_user_events_are_time_sorted():
+    """Newest-first exports come back oldest-first per user"""
+    store = EventStore([
+        make_event('app open', 'u1', 30.0),
+        make_event('app open', 'u2', 20.0),
+        make_event('favorite sandwich', 'u1', 10.0),
+    ])
+
+    assert [e['properties']['time'] for e in store.user_events('u1')] == [10.0, 30.0]
+    assert store.last_event('u1')['properties']['time'] == 30.0
+    assert store.user_events('missing') == []
+
+
+def test_counters_and_event_index():
+    """Per-user counters and the event -> users index stay in step"""
+    store = EventStore()
+    touched = store.extend([
+        make_event('app open', 'u1', 1.0),
+        make_event('app open', 'u1', 2.0),
+        make_event('app open', 'u2', 3.0),
+    ])
+
+    assert touched == {'u1', 'u2'}
+    assert len(store) == 3
+    assert store.event_count('u1', 'app open') == 2
+    assert store.event_count('u1', 'favorite sandwich') == 0
+    assert list(store.users_with_event('app open')) == ['u1', 'u2']
+    assert list(store.users_with_event('favorite sandwich')) == []
+
+
+def test_columnar_round_trip():
+    """Sparse properties and interned names come back as the original events"""
+    events = [
+        make_event('app open', 'u1', 1.0, **{'$city': 'Eagan', 'mp_country_code': 'US'}),
+        make_event('app open', 'u1', 2.0),
+        make_event('rate sandwich', 'u2', 3.0, rating=5, verified=True),
+    ]
+    store = EventStore(events)
+
+    assert store.user_events('u1') == events[:2]
+    assert store.user_events('u2') == events[2:]
+    assert len(store.event_names) == 2
+    assert store.event_totals() == {'app open': 2, 'rate sandwich': 1}
+    assert store.event_property_keys('rate sandwich') == {'time', 'distinct_id', 'rating', 'verified'}
+
+
+def test_window_counts_match_a_row_scan():
+    rng = random.Random(3)
+    events = [make_event(rng.choice(['a', 'b', 'c']), 'u1', rng.uniform(0, 20000)) for _ in range(500)]
+    store = EventStore(events, bucket_seconds=600)
+    # Appends after the buckets are built must keep them current
+    store.window_counts('u1', 0)
+    extra = [make_event('a', 'u1', rng.uniform(0, 20000)) for _ in range(50)]
+    store.extend(extra)
+
+    for start, end in [(0, None), (1234.5, 5000), (600, 1800), (19999, None), (300, 301)]:
+        expected = {}
+        for event in events + extra:
+            t = event['properties']['time']
+            if t >= start and (end is None or t < end):
+                expected[event['event']] = expected.get(event['event'], 0) + 1
+        assert store.window_counts('u1', start, end) == expected
+
+
+def test_compact_drops_old_events_users_and_names():
+    store = EventStore([
+        make_event('signup', 'u1', 1.0, plan='free'),
+        make_event('checkout', 'u2', 9.0),
+        make_event('app open', 'u2', 5.0, screen_name='home'),
+    ])
+
+    assert store.compact(4.0) == 1
+
+    assert store.users() == ['u2']
+    assert store.event_names.values == ['checkout', 'app open']
+    assert store.user_events('u1') == []
+    assert store.last_event('u1') is None
+    assert 'plan' not in store.properties
+    assert store.users_with_event('app open') == ['u2']
+    assert store.event_counts('u2') == {'app open': 1, 'checkout': 1}
+    assert [event['event'] for event in store.user_events('u2')] == ['app open', 'checkout']
+    assert store.user_events('u2')[0]['properties']['screen_name'] == 'home'
+    assert store.event_property_keys('app open') == {'time', 'distinct_id', 'screen_name'}
+    assert store.window_counts('u2', 0) == {'app open': 1, 'checkout': 1}
+
+    # The compacted store keeps indexing appends
+    store.extend([make_event('app open', 'u3', 10.0)])
+    assert store.users_with_event('app open') == ['u2', 'u3']
+
+
+def test_compacted_catches_up_rows_appended_during_the_build():
+    store = EventStore([make_event('app open', 'u1', 1.0), make_event('app open', 'u2', 5.0, screen='home')])
+    point = store.compaction_point()
+    # New rows and a new property key arrive while the copy is built
+    store.extend([make_event('checkout', 'u1', 6.0, coupon='x'), make_event('app open', 'u2', 7.0, screen='menu')])
+    compacted = store.compacted(4.0, point)
+
+    assert store.install(compacted, point) == 1
+    assert store.users() == ['u2', 'u1']
+    assert store.event_counts('u1') == {'checkout': 1}
+    assert [event['properties'].get('screen') for event in store.user_events('u2')] == ['home', 'menu']
+    assert store.user_events('u1')[0]['properties']['coupon'] == 'x'
+
+
+def test_malformed_events_leave_the_store_untouched():
+    store = EventStore([make_event('app open', 'u1', 1.0)])
+
+    for bad in [make_event('app open', 'u2', 'yesterday'), make_event('app open', None, 2.0),
+                {'event': '', 'properties': {'time': 1, 'distinct_id': 'u3'}}, {'event': 'x'}]:
+        with pytest.raises(ValueError):
+            store.add(bad)
+
+    assert len(store) == 1 and store.users() == ['u1'] and store.event_names.values == ['app open']
+    store.extend([make_event('checkout', 'u4', 3.0)])
+    assert store.user_events('u4')[0]['event'] == 'checkout'
@@ -0,0 +1,117 @@
+import random
+
+from event_store import EventStore
+from funnel import FunnelIndex
+from test_stuck_detector import make_event
+
+STEPS = ['app open', 'view__ingredients__modal', 'order sandwich', 'favorite sandwich']
+
+
+def reference_funnel(store, steps, window=None):
+    """Reference path: walk every user's sorted events, greedily matching steps"""
+    reached = [0] * len(steps)
+    for user_id in store.users():
+        step, entered_at = 0, None
+        for event in store.user_events(user_id):
+            if step == len(steps):
+                break
+            if event['event'] != steps[step]:
+                continue
+            at = event['properties']['time']
+            if step == 0:
+                entered_at = at
+            elif window is not None and at - entered_at > window:
+                break
+            reached[step] += 1
+            step += 1
+    return reached
+
+
+def random_store(count=400, users=60, seed=3):
+    rng = random.Random(seed)
+    return EventStore(
+        make_event(rng.choice(STEPS), f"u{rng.randrange(users)}", rng.uniform(0, 10000))
+        for _ in range(count)
+    )
+
+
+def test_funnel_matches_reference():
+    store = random_store()
+    index = FunnelIndex(store)
+
+    for window in (None, 500, 3000):
+        result = index.funnel(STEPS, window=window)
+        assert [step['users'] for step in result['steps']] == reference_funnel(store, STEPS, window)
+
+
+def test_funnel_resolves_steps_out_of_first_occurrence_order():
+    # u1 ordered once before opening the app, then again after
+    store = EventStore([
+        make_event('order sandwich', 'u1', 1), make_event('app open', 'u1', 2),
+        make_event('order sandwich', 'u1', 50), make_event('app open', 'u2', 1)
+    ])
+
+    steps = FunnelIndex(store).funnel(['app open', 'order sandwich'], window=100)['steps']
+
+    assert [step['users'] for step in steps] == [2, 1]
+    assert steps[1]['conversion'] == 0.5
+    assert steps[1]['median_seconds'] == 48
+
+
+def test_funnel_follows_appends_and_compaction():
+    store = EventStore([make_event('app open', 'u1', 10)])
+    index = FunnelIndex(store)
+    assert [step['users'] for step in index.funnel(['app open', 'order sandwich'])['steps']] == [1, 0]
+
+    store.extend([make_event('order sandwich', 'u1', 20), make_event('app open', 'u2', 30)])
+    assert [step['users'] for step in index.funnel(['app open', 'order sandwich'])['steps']] == [2, 1]
+
+    store.compact(25)
+    assert [step['users'] for step in index.funnel(['app open', 'order sandwich'])['steps']] == [1, 0]
+
+
+def test_compare_intervention():
+    store = EventStore([
+        # Helped, then succeeded
+        make_event('feature_export', 'u1', 1), make_event('assistant help', 'u1', 2),
+        make_event('export_complete', 'u1', 3),
+        # Succeeded before help only
+        make_event('export_complete', 'u2', 1), make_event('assistant help', 'u2', 2),
+        # Not helped: one succeeded, one did not
+        make_event('feature_export', 'u3', 1), make_event('export_complete', 'u3', 2),
+        make_event('feature_export', 'u4', 1)
+    ])
+    index = FunnelIndex(store)
+
+    result = index.compare_intervention('assistant help', 'export_complete', 'feature_export')
+
+    assert result == {'treated': 2, 'success_before': 0.5, 'success_after': 0.5, 'recovered': 1,
+                      'control': 2, 'control_success': 0.5}
+    assert index.compare_intervention({'u4': 0}, 'export_complete')['treated'] == 1
+
+
+def test_funnel_steps_never_reuse_a_row():
+    store = EventStore([
+        make_event('a', 'u1', 1),
+        # u2 fires both steps in the same second, then 'a' again
+        make_event('a', 'u2', 5), make_event('b', 'u2', 5), make_event('a', 'u2', 7),
+        # u3 fires 'b' before 'a' at the same time
+        make_event('b', 'u3', 5), make_event('a', 'u3', 5)
+    ])
+    index = FunnelIndex(store)
+
+    for steps in (['a', 'a'], ['a', 'b'], ['a', 'b', 'a'], ['b', 'a', 'b']):
+        result = index.funnel(steps)
+        assert [step['users'] for step in result['steps']] == reference_funnel(store, steps), steps
+    assert [step['users'] for step in index.funnel(['a', 'a'])['steps']] == [3, 1]
+    assert [step['users'] for step in index.funnel(['a', 'b'])['steps']] == [3, 1]
+
+
+def test_funnel_repeated_steps_match_reference():
+    store = random_store(count=600, users=30, seed=8)
+    index = FunnelIndex(store)
+    steps = ['app open', 'order sandwich', 'app open', 'order sandwich']
+
+    for window in (None, 2000):
+        result = index.funnel(steps, window=window)
+        assert [step['users'] for step in result['steps']] == reference_funnel(store, steps, window)
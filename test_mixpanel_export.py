@@ -0,0 +1,110 @@
+import json
+import threading
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+pytest.importorskip('requests')
+
+from mixpanel_export import ExportError, ExportFetcher, load_partitions, partition_path
+
+
+def day_lines(day, count=3):
+    return b''.join(
+        json.dumps({'event': 'app open', 'properties': {'time': i, 'distinct_id': f"{day}-{i}"}}).encode() + b'\n'
+        for i in range(count)
+    )
+
+
+@pytest.fixture
+def stub_server():
+    """Export API stand-in: per-day NDJSON, scripted failures, Range support"""
+    state = {'requests': [], 'fail': {}, 'delay': 0.0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            day = parse_qs(urlparse(self.path).query)['from_date'][0]
+            state['requests'].append((day, self.headers.get('Range')))
+            if state['fail'].get(day):
+                state['fail'][day] -= 1
+                self.send_response(503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            time.sleep(state['delay'])
+            body = day_lines(day)
+            status = 200
+            if self.headers.get('Range'):
+                body = body[int(self.headers['Range'][len('bytes='):-1]):]
+                status = 206
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    state['url'] = f"http://127.0.0.1:{server.server_port}/api/2.0/export"
+    yield state
+    server.shutdown()
+
+
+def make_fetcher(stub_server, directory, **kwargs):
+    return ExportFetcher('secret', '1', str(directory), url=stub_server['url'], backoff=0.01, **kwargs)
+
+
+def test_days_download_in_parallel_and_load(stub_server, tmp_path):
+    stub_server['delay'] = 0.2
+    fetcher = make_fetcher(stub_server, tmp_path, workers=10)
+
+    started = time.monotonic()
+    results = fetcher.fetch(date(2025, 3, 1), date(2025, 3, 10))
+
+    assert time.monotonic() - started < 1.5
+    assert [r['status'] for r in results] == ['downloaded'] * 10
+    events = []
+    assert load_partitions(str(tmp_path), events.extend)['partitions'] == 10
+    assert len(events) == 30
+
+
+def test_retries_server_errors_and_skips_completed_days(stub_server, tmp_path):
+    stub_server['fail']['2025-03-02'] = 2
+    fetcher = make_fetcher(stub_server, tmp_path)
+
+    fetcher.fetch(date(2025, 3, 1), date(2025, 3, 2))
+    stub_server['requests'].clear()
+    results = fetcher.fetch(date(2025, 3, 1), date(2025, 3, 3))
+
+    assert [r['status'] for r in results] == ['cached', 'cached', 'downloaded']
+    assert stub_server['requests'] == [('2025-03-03', None)]
+
+
+def test_partial_day_resumes_from_last_complete_line(stub_server, tmp_path):
+    day = date(2025, 3, 1)
+    full = day_lines('2025-03-01')
+    first_line = full.index(b'\n') + 1
+    with open(partition_path(str(tmp_path), day) + '.part', 'wb') as f:
+        f.write(full[:first_line + 5])
+
+    make_fetcher(stub_server, tmp_path).fetch(day, day)
+
+    assert stub_server['requests'] == [('2025-03-01', f"bytes={first_line}-")]
+    with open(partition_path(str(tmp_path), day), 'rb') as f:
+        assert f.read() == full
+
+
+def test_failed_days_are_reported(stub_server, tmp_path):
+    stub_server['fail']['2025-03-02'] = 100
+    fetcher = make_fetcher(stub_server, tmp_path, retries=1)
+
+    with pytest.raises(ExportError) as error:
+        fetcher.fetch(date(2025, 3, 1), date(2025, 3, 2))
+
+    assert list(error.value.failures) == ['2025-03-02']
+    assert not (tmp_path / '2025-03-02.ndjson').exists()
@@ -0,0 +1,82 @@
+import json
+from datetime import date, timedelta
+
+import pytest
+
+from partition_cache import PartitionCache
+
+
+class ExportError(Exception):
+    """Stands in for mixpanel_export.ExportError without importing requests"""
+
+
+class StubFetcher:
+    """Writes a fixed NDJSON day into the staging directory, recording requests"""
+
+    def __init__(self, fail=()):
+        self.directory = None
+        self.fetched = []
+        self.fail = set(fail)
+
+    def fetch_days(self, days, refresh_days=()):
+        for day in days:
+            self.fetched.append(day)
+            if day in self.fail:
+                continue
+            with open(f"{self.directory}/{day:%Y-%m-%d}.ndjson", 'w') as f:
+                for i in range(2):
+                    f.write(json.dumps({'event': 'app open', 'properties': {'time': i, 'distinct_id': f"{day}"}}) + '\n')
+        if self.fail:
+            raise ExportError({f"{day:%Y-%m-%d}": None for day in self.fail})
+
+
+def test_refresh_fetches_only_missing_and_mutable_days(tmp_path):
+    today = date(2025, 3, 8)
+    start = today - timedelta(days=7)
+    fetcher = StubFetcher()
+    cache = PartitionCache(str(tmp_path))
+
+    assert len(cache.refresh(fetcher, start, today, today)) == 8
+
+    # Next day: the last two days may still get late events, plus the new day
+    fetcher.fetched.clear()
+    tomorrow = today + timedelta(days=1)
+    PartitionCache(str(tmp_path)).refresh(fetcher, start, tomorrow, tomorrow)
+    assert fetcher.fetched == [today - timedelta(days=1), today, tomorrow]
+
+    # With a one-day lag, only days not yet final plus the new day are fetched
+    fetcher.fetched.clear()
+    after = tomorrow + timedelta(days=1)
+    PartitionCache(str(tmp_path), mutable_days=1).refresh(fetcher, start, after, after)
+    assert fetcher.fetched == [today, tomorrow, after]
+
+
+def test_refresh_keeps_completed_days_when_others_fail(tmp_path):
+    today = date(2025, 3, 8)
+    start = today - timedelta(days=3)
+    fetcher = StubFetcher(fail=[today - timedelta(days=2)])
+    cache = PartitionCache(str(tmp_path))
+
+    with pytest.raises(ExportError):
+        cache.refresh(fetcher, start, today, today)
+
+    assert cache.days() == [start, today - timedelta(days=1), today]
+    fetcher = StubFetcher()
+    PartitionCache(str(tmp_path)).refresh(fetcher, start, today, today)
+    assert fetcher.fetched == [today - timedelta(days=2), today - timedelta(days=1), today]
+
+
+def test_load_reads_compressed_partitions_offline(tmp_path):
+    day = date(2025, 3, 1)
+    fetcher = StubFetcher()
+    PartitionCache(str(tmp_path)).refresh(fetcher, day, day + timedelta(days=1), day + timedelta(days=1))
+
+    cache = PartitionCache(str(tmp_path))
+    events = []
+    stats = cache.load(events.extend, days=[day])
+
+    assert stats['partitions'] == 1 and len(events) == 2
+    assert cache.stats()['partitions'] == 2
+    # Fetched one day later, both days are still inside the mutable window
+    assert cache.stats()['final'] == 0
+    assert cache.stats()['events'] == 4
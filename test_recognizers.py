@@ -0,0 +1,40 @@
+import pytest
+
+sr = pytest.importorskip('speech_recognition')
+
+from recognizers import FixtureBackend, RecognizerBackend, RecognizerRouter
+
+
+class FailingBackend(RecognizerBackend):
+    name = 'flaky'
+
+    def recognize(self, recognizer, audio):
+        raise sr.RequestError("service unavailable")
+
+
+def make_audio(data=b'\x00\x01' * 100):
+    return sr.AudioData(data, 16000, 2)
+
+
+def test_fixture_backend_is_deterministic(tmp_path):
+    audio = make_audio()
+    fixture = tmp_path / 'fixture.json'
+    fixture.write_text(f'{{"{FixtureBackend.audio_key(audio)}": "how do I save"}}')
+    backend = FixtureBackend(str(fixture))
+
+    assert backend.recognize(None, audio) == 'how do I save'
+    with pytest.raises(sr.UnknownValueError):
+        backend.recognize(None, make_audio(b'\x02\x03' * 100))
+
+
+def test_router_fails_over_and_tracks_health():
+    router = RecognizerRouter([FailingBackend(), FixtureBackend(default_text='help')])
+
+    assert router.recognize(None, make_audio()) == ('help', 'fixture')
+    stats = router.stats()['backends']
+    assert stats['flaky']['failures'] == 1
+    assert stats['flaky']['healthy'] is False
+    assert stats['fixture']['calls'] == 1
+    # The failed backend is skipped while it cools down
+    router.recognize(None, make_audio())
+    assert router.stats()['backends']['flaky']['failures'] == 1
@@ -0,0 +1,97 @@
+from collections import Counter
+
+import pytest
+
+from event_store import EventStore
+from sequence_mining import HeavyHitters, SequenceMiner, mine_sequences
+from test_stuck_detector import make_event, random_events
+
+
+def exact_ngrams(store, n):
+    """Reference path: plain Counter over each user's sorted event names"""
+    counts = Counter()
+    for user_id in store.users():
+        names = [event['event'] for event in store.user_events(user_id)]
+        counts.update(tuple(names[i:i + n]) for i in range(len(names) - n + 1))
+    return counts
+
+
+def test_paths_dropoff_and_struggle():
+    events = [
+        make_event('app open', 'a', 1), make_event('view__ingredients__modal', 'a', 2),
+        make_event('order sandwich', 'a', 3), make_event('favorite sandwich', 'a', 4),
+        make_event('app open', 'b', 1), make_event('view__ingredients__modal', 'b', 2),
+        make_event('order sandwich', 'b', 3), make_event('payment failed', 'b', 4),
+        make_event('app open', 'c', 1), make_event('view__ingredients__modal', 'c', 2)
+    ]
+    results = mine_sequences(EventStore(events))
+
+    assert results['users'] == 3
+    assert results['converted'] == 1
+    assert results['ngrams'][0] == {
+        'path': ['app open', 'view__ingredients__modal', 'order sandwich'], 'count': 2}
+    assert results['transitions'][0]['count'] == 3
+    assert {entry['event']: entry['users'] for entry in results['dropoff']} == {
+        'payment failed': 1, 'view__ingredients__modal': 1}
+    assert results['before_target'] == [{'event': 'order sandwich', 'count': 1}]
+    assert results['paths_to_struggle'] == [{
+        'path': ['app open', 'view__ingredients__modal', 'order sandwich', 'payment failed'], 'count': 1}]
+
+
+def test_session_gap_restarts_paths():
+    events = [make_event('app open', 'a', 0), make_event('order sandwich', 'a', 10),
+              make_event('app open', 'a', 10000), make_event('order sandwich', 'a', 10010)]
+
+    miner = SequenceMiner(EventStore(events), n=3, session_gap=1800).run()
+
+    assert miner.ngrams.candidates == {}
+    assert miner.results()['transitions'] == [{'from': 'app open', 'to': 'order sandwich', 'count': 2}]
+
+
+def test_ngram_counts_match_exact_counter():
+    store = EventStore(random_events(3000, seed=5))
+    expected = exact_ngrams(store, 3)
+
+    results = mine_sequences(store, top=5, session_gap=float('inf'))
+
+    # Compare counts rather than paths, since tied paths may come in any order
+    assert [entry['count'] for entry in results['ngrams']] == [count for _, count in expected.most_common(5)]
+    for entry in results['ngrams']:
+        assert entry['count'] == expected[tuple(entry['path'])]
+
+
+def test_heavy_hitters_memory_is_bounded():
+    sketch = HeavyHitters(width_bits=10, capacity=20)
+    for key in range(1, 5000):
+        sketch.add(key)
+        sketch.add(7)
+
+    assert len(sketch.candidates) == 20
+    top_key, count = sketch.top(1)[0]
+    assert top_key == 7
+    assert count >= 5000
+
+
+def test_analyze_v3_sink_skips_events_without_a_user():
+    pytest.importorskip('dotenv')
+    pytest.importorskip('requests')
+    from analysis_engine import standard_engine
+    from analyze_events_v3 import analysis_sink
+
+    engine, store = standard_engine(), EventStore()
+    analysis_sink(engine, store)([
+        make_event('app open', 'u1', 1), {'event': 'y', 'properties': {'time': 2}}
+    ])
+
+    assert engine.events == 2
+    assert store.users() == ['u1'] and len(store) == 1
+
+
+def test_transitions_grow_with_observed_pairs_only():
+    # Thousands of distinct names, each user a short chain through a few of them
+    events = [make_event(f"screen_{u * 3 + i}", f"u{u}", float(i)) for u in range(2000) for i in range(3)]
+    miner = SequenceMiner(EventStore(events)).run()
+
+    assert len(miner.names) == 6000
+    assert len(miner.transitions) == 4000
+    assert miner.results(1)['transitions'][0]['count'] == 1
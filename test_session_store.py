@@ -0,0 +1,62 @@
+import time
+
+import pytest
+
+from session_store import MemorySessionStore, SQLiteSessionStore
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_store(request, tmp_path):
+    def make(**kwargs):
+        if request.param == 'sqlite':
+            return SQLiteSessionStore(str(tmp_path / 'sessions.db'), **kwargs)
+        return MemorySessionStore(**kwargs)
+    return make
+
+
+def test_round_trip_returns_copies(make_store):
+    store = make_store()
+    store.set('u1', {'stage': 'initial', 'context': None})
+
+    state = store.get('u1')
+    state['stage'] = 'tutorial'
+
+    assert store.get('u1')['stage'] == 'initial'
+    assert store.get('missing') is None
+
+
+def test_expired_sessions_are_dropped(make_store):
+    store = make_store(ttl=0.05)
+    store.set('u1', {'stage': 'tutorial'})
+    time.sleep(0.1)
+
+    assert store.get('u1') is None
+    assert store.stats()['expirations'] == 1
+
+
+def test_reading_a_session_keeps_it_alive(make_store):
+    store = make_store(ttl=0.2)
+    store.set('u1', {'stage': 'tutorial'})
+    for _ in range(3):
+        time.sleep(0.1)
+        assert store.get('u1') == {'stage': 'tutorial'}
+
+    time.sleep(0.25)
+    assert store.get('u1') is None
+
+
+def test_least_recently_used_session_is_evicted(make_store):
+    store = make_store(max_size=2)
+    store.set('u1', {'stage': 'a'})
+    time.sleep(0.01)
+    store.set('u2', {'stage': 'b'})
+    time.sleep(0.01)
+    store.get('u1')
+    time.sleep(0.01)
+    store.set('u3', {'stage': 'c'})
+
+    assert store.get('u2') is None
+    assert store.get('u1') == {'stage': 'a'}
+    stats = store.stats()
+    assert stats['live_sessions'] == 2
+    assert stats['evictions'] == 1
@@ -0,0 +1,52 @@
+import json
+
+from event_store import EventStore
+from struggle_scoring import main, score_struggles
+from stuck_detector import analyze_user_context, determine_struggle
+from test_stuck_detector import random_events
+
+
+def per_user_labels(store):
+    """Reference path: analyze_user_context + determine_struggle per user"""
+    return {
+        user_id: determine_struggle(analyze_user_context(store.user_events(user_id)))
+        for user_id in store.users()
+    }
+
+
+def test_batch_labels_match_per_user_path():
+    """Every user gets exactly the labels, in the same order, as today's code"""
+    events = random_events(3000, seed=11)
+    # Several features per user so label order depends on first-seen time
+    for i, event in enumerate(events):
+        if event['event'] == 'feature_builder' and i % 3 == 0:
+            event['event'] = 'feature_checkout'
+    store = EventStore(events)
+
+    expected = per_user_labels(store)
+
+    assert score_struggles(store) == expected
+    assert any(len(labels) > 1 for labels in expected.values())
+
+
+def test_batch_labels_for_selected_users():
+    store = EventStore(random_events(500))
+    selected = list(store.users())[:5] + ['unknown-user']
+
+    labels = score_struggles(store, selected)
+
+    assert list(labels) == list(store.users())[:5]
+    assert labels == {user_id: per_user_labels(store)[user_id] for user_id in labels}
+
+
+def test_main_scores_an_export(tmp_path, monkeypatch, capsys):
+    events = random_events(300, seed=4)
+    export = tmp_path / 'export.json'
+    export.write_text('\n'.join(json.dumps(event) for event in events))
+    output = tmp_path / 'labels.json'
+    monkeypatch.setattr('sys.argv', ['struggle_scoring.py', str(export), '--output', str(output)])
+
+    main()
+
+    assert json.loads(output.read_text()) == per_user_labels(EventStore(events))
+    assert f"Users: {len(EventStore(events).users())}" in capsys.readouterr().out
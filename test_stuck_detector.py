@@ -0,0 +1,197 @@
+import random
+import threading
+
+import pytest
+
+from event_store import EventStore
+from stuck_detector import (InvalidEvent, StuckSnapshot, StuckUserDetector, analyze_user_context,
+                            determine_struggle)
+from test_event_store import make_event
+
+
+def detect_from_scratch(events):
+    """Reference implementation: regroup everything and rescan each user"""
+    user_events = {}
+    for event in events:
+        user_events.setdefault(event['properties']['distinct_id'], []).append(event)
+
+    stuck = {}
+    for user_id, user_events_list in user_events.items():
+        app_opens = [e for e in user_events_list if e['event'] == 'app open']
+        feature_uses = [e for e in user_events_list if e['event'] == 'favorite sandwich']
+        if len(app_opens) >= 5 and len(feature_uses) == 0:
+            context = analyze_user_context(user_events_list)
+            stuck[user_id] = {
+                'app_opens': len(app_opens),
+                'context': context,
+                'struggling_with': determine_struggle(context)
+            }
+    return stuck
+
+
+def random_events(count, seed=7):
+    rng = random.Random(seed)
+    names = ['app open'] * 10 + ['feature_builder'] * 4 + ['page_view'] * 6 + [
+        'favorite sandwich', 'checkout_error', 'payment failed', 'order sandwich']
+    events = []
+    for _ in range(count):
+        name = rng.choice(names)
+        properties = {}
+        if name == 'page_view':
+            properties['screen_name'] = rng.choice(['home', 'menu', 'builder', 'cart'])
+        events.append(make_event(name, f"u{rng.randrange(40)}", rng.uniform(0, 1000), **properties))
+    return events
+
+
+def as_comparable(stuck_users):
+    return {
+        u['user_id']: {
+            'app_opens': u['app_opens'],
+            'context': u['context'],
+            'struggling_with': u['struggling_with']
+        }
+        for u in stuck_users
+    }
+
+
+def test_incremental_matches_full_rescan():
+    """Appending in shuffled batches ends in the same state as a full rescan"""
+    events = random_events(600)
+    detector = StuckUserDetector()
+    for start in range(0, len(events), 50):
+        detector.append_events(events[start:start + 50])
+
+    assert as_comparable(detector.stuck_users()) == detect_from_scratch(events)
+    assert detector.stuck_users()
+
+
+def test_user_recovers_after_feature_use():
+    """A stuck user drops out of the snapshot once they use the feature"""
+    detector = StuckUserDetector(EventStore([make_event('app open', 'u1', float(t)) for t in range(5)]))
+    assert [u['user_id'] for u in detector.stuck_users()] == ['u1']
+    version = detector.version
+
+    changed = detector.append_events([make_event('favorite sandwich', 'u1', 10.0)])
+
+    assert changed == ['u1']
+    assert detector.stuck_users() == []
+    assert detector.version == version + 1
+
+
+def test_cached_context_follows_appends():
+    """get_context serves the precomputed labels and is invalidated by new events"""
+    events = [make_event('app open', 'u1', float(t)) for t in range(5)]
+    detector = StuckUserDetector(EventStore(events))
+    assert detector.get_context('u1')['struggling_with'] == []
+    assert detector.get_context('nobody') is None
+
+    detector.append_events([make_event('checkout_error', 'u1', 6.0), make_event('checkout_failed', 'u1', 7.0)])
+    assert detector.get_context('u1')['struggling_with'] == ['frequent_errors']
+
+    detector.append_events([make_event('favorite sandwich', 'u1', 8.0)])
+    assert detector.get_context('u1') is None
+
+
+def test_dwell_time_and_sessions():
+    """Time is credited to the current screen and reset across session gaps"""
+    events = [
+        make_event('screen_view', 'u1', 0.0, screen_name='sandwich_builder'),
+        make_event('view__ingredients__modal', 'u1', 200.0),
+        make_event('order sandwich', 'u1', 400.0),
+        # More than 30 minutes later: new session, no screen yet
+        make_event('app open', 'u1', 4000.0),
+        make_event('screen_view', 'u1', 4100.0, screen_name='menu'),
+        make_event('app open', 'u1', 4150.0),
+    ]
+
+    context = analyze_user_context(events)
+
+    assert context['time_spent'] == {'sandwich_builder': 400.0, 'menu': 50.0}
+    assert context['sessions']['session_count'] == 2
+    assert determine_struggle(context) == ['long_time_sandwich_builder']
+    assert analyze_user_context(events, session_gap=100)['time_spent'] == {'menu': 50.0}
+
+
+def test_retention_forgets_old_app_opens():
+    """Users drop out once the events that flagged them age past the retention"""
+    events = [make_event('app open', 'u1', float(t)) for t in range(5)]
+    events.append(make_event('checkout', 'u2', 100.0))
+    detector = StuckUserDetector(EventStore(events))
+    assert [u['user_id'] for u in detector.stuck_users()] == ['u1']
+
+    assert detector.apply_retention(97.5) == 3
+    assert detector.stuck_users() == []
+
+
+def test_snapshot_pages_by_user_id_and_struggle():
+    snapshot = StuckSnapshot(3, [
+        {'user_id': user_id, 'struggling_with': labels}
+        for user_id, labels in [('u3', ['frequent_errors']), ('u1', []), ('u2', ['frequent_errors'])]
+    ])
+
+    page, last, total = snapshot.page(limit=2)
+    assert [u['user_id'] for u in page] == ['u1', 'u2'] and last == 'u2' and total == 3
+    page, last, _ = snapshot.page(after=last, limit=2)
+    assert [u['user_id'] for u in page] == ['u3'] and last is None
+
+    page, last, total = snapshot.page(struggle='frequent_errors', after='u2')
+    assert [u['user_id'] for u in page] == ['u3'] and total == 2
+    assert snapshot.page(struggle='confused_navigation') == ([], None, 0)
+
+
+def test_change_log_streams_deltas():
+    detector = StuckUserDetector(EventStore([make_event('app open', 'u1', float(t)) for t in range(5)]))
+    start = detector.snapshot().sequence
+    assert detector.changes_since(start, timeout=0) == []
+
+    detector.append_events([make_event('app open', 'u2', float(t)) for t in range(5)])
+    detector.append_events([make_event('a_error', 'u2', 6.0), make_event('b_error', 'u2', 7.0)])
+    detector.append_events([make_event('app open', 'u2', 8.0)])
+    detector.append_events([make_event('favorite sandwich', 'u1', 9.0)])
+
+    changes = detector.changes_since(start)
+    assert [(c['type'], c['user_id']) for c in changes] == [
+        ('became_stuck', 'u2'), ('label_changed', 'u2'), ('recovered', 'u1')
+    ]
+    assert changes[1]['struggling_with'] == ['frequent_errors']
+    assert detector.changes_since(changes[0]['seq']) == changes[1:]
+    # A sequence from another process can't be resumed
+    assert detector.changes_since(detector.sequence + 5) is None
+
+
+def test_retention_runs_while_events_arrive():
+    store = EventStore([make_event('app open', f"u{i % 50}", float(i), **{f"k{i}": i}) for i in range(600)])
+    detector = StuckUserDetector(store)
+    errors = []
+
+    def ingest():
+        try:
+            for i in range(600, 2600):
+                detector.append_events([make_event('app open', f"u{i % 50}", float(i), **{f"k{i}": i})])
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=ingest)
+    thread.start()
+    while thread.is_alive():
+        detector.apply_retention(300)
+    thread.join()
+
+    assert errors == []
+    detector.apply_retention(300)
+    assert len(store) == 301 and min(store.time_col) == 2299.0
+
+
+def test_malformed_batch_is_rejected_whole():
+    detector = StuckUserDetector(EventStore([make_event('app open', 'u1', float(t)) for t in range(4)]))
+    version = detector.version
+
+    with pytest.raises(InvalidEvent) as raised:
+        detector.append_events([make_event('app open', 'u1', 10.0), make_event('app open', 'u1', 'later')])
+
+    assert raised.value.index == 1
+    assert len(detector.store) == 4 and detector.version == version
+    # The corrected batch goes in once
+    detector.append_events([make_event('app open', 'u1', 10.0), make_event('app open', 'u1', 11.0)])
+    assert len(detector.store) == 6
+    assert [u['user_id'] for u in detector.stuck_users()] == ['u1']
@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from event_store import EventStore
+from stuck_detector import StuckUserDetector
+from stuck_rules import FeatureRule, RuleEngine, load_rules
+from test_event_store import make_event
+
+DAY = 24 * 3600
+
+
+def naive_evaluate(rules, events, user_id):
+    """Reference: one scan of the user's events per rule, windows ending at the newest event"""
+    user_events = [e for e in events if e['properties']['distinct_id'] == user_id]
+    latest = max(e['properties']['time'] for e in events)
+    stuck = []
+    for rule in rules:
+        recent = [e['event'] for e in user_events
+                  if rule.window is None or latest - e['properties']['time'] <= rule.window]
+        triggers = sum(recent.count(name) for name in rule.trigger_events)
+        successes = sum(recent.count(name) for name in rule.success_events)
+        errors = sum(recent.count(name) for name in rule.error_events)
+        if rule.matches(triggers, successes, errors):
+            stuck.append({'feature': rule.name, 'triggers': triggers, 'successes': successes, 'errors': errors})
+    return stuck
+
+
+def test_single_pass_matches_per_rule_scans():
+    rules = [FeatureRule.for_feature(f"f{i}", min_triggers=2, max_success_rate=0.5, window=(i % 3) * DAY or None)
+             for i in range(20)]
+    events = []
+    for t in range(300):
+        feature = f"f{t % 20}"
+        suffix = ('attempt', 'attempt', 'complete', 'error')[t % 7 % 4]
+        events.append(make_event(f"{feature}_{suffix}", f"u{t % 6}", t * 3600.0))
+    store = EventStore(events)
+    engine = RuleEngine(rules)
+
+    for user_id in store.users():
+        assert engine.evaluate(store, user_id) == naive_evaluate(rules, events, user_id)
+
+
+def test_window_counts_only_recent_attempts():
+    rule = FeatureRule.for_feature('data_export', min_triggers=4, max_success_rate=0.3, window=7 * DAY)
+    events = [make_event('data_export_attempt', 'u1', t * DAY) for t in (0, 1, 10, 11, 12, 13)]
+    store = EventStore(events)
+
+    assert RuleEngine([rule]).evaluate(store, 'u1') == [
+        {'feature': 'data_export', 'triggers': 4, 'successes': 0, 'errors': 0}
+    ]
+    # Two of four recent attempts completed: 50% is above the threshold
+    store.extend([make_event('data_export_complete', 'u1', 14 * DAY), make_event('data_export_complete', 'u1', 15 * DAY)])
+    assert RuleEngine([rule]).evaluate(store, 'u1') == []
+
+
+def test_detector_flags_users_per_feature(tmp_path):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps([{'feature': 'custom_report', 'min_triggers': 2, 'min_errors': 1}]))
+    events = [
+        make_event('custom_report_attempt', 'u1', 1.0),
+        make_event('custom_report_attempt', 'u1', 2.0),
+        make_event('custom_report_error', 'u1', 3.0),
+        make_event('custom_report_attempt', 'u2', 1.0),
+    ]
+    detector = StuckUserDetector(EventStore(events), rules=load_rules(str(path)))
+
+    [entry] = detector.stuck_users()
+    assert entry['user_id'] == 'u1'
+    assert entry['features'] == [{'feature': 'custom_report', 'triggers': 2, 'successes': 0, 'errors': 1}]
+
+
+def test_rules_need_at_least_one_trigger(tmp_path):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps([{'feature': 'custom_report', 'min_triggers': 0, 'max_success_rate': 0.3}]))
+
+    with pytest.raises(ValueError, match='min_triggers'):
+        load_rules(str(path))
+
+
+def test_windows_end_at_the_newest_event_in_the_store():
+    rule = FeatureRule.for_feature('data_export', min_triggers=4, max_success_rate=0.3, window=7 * DAY)
+    events = [make_event('data_export_attempt', 'u1', t * DAY) for t in range(4)]
+    detector = StuckUserDetector(EventStore(events), rules=[rule])
+    assert [u['user_id'] for u in detector.stuck_users()] == ['u1']
+
+    # A year on, u1's attempts are no longer recent even though u1 did nothing since
+    detector.append_events([make_event('app open', 'u2', 365 * DAY)])
+    assert RuleEngine([rule]).evaluate(detector.store, 'u1') == []
+    assert detector.stuck_users() == []
@@ -0,0 +1,52 @@
+import threading
+import time
+
+import pytest
+
+from voice_jobs import QueueFull, StageTimeout, VoiceJobPool
+
+
+def test_jobs_complete_and_report_timings():
+    def handler(job, payload):
+        with job.run_stage('recognize'):
+            return payload.upper()
+
+    pool = VoiceJobPool(handler, workers=2)
+    job = pool.submit('hello')
+
+    assert job.wait(5)
+    assert job.to_dict()['result'] == 'HELLO'
+    assert 'recognize' in job.timings
+    assert pool.get(job.id) is job
+
+
+def test_full_queue_is_rejected_with_depth_hint():
+    release = threading.Event()
+    pool = VoiceJobPool(lambda job, payload: release.wait(5), workers=1, max_queue=1)
+    pool.submit('running')
+    # Give the worker a moment to take the first job off the queue
+    deadline = time.time() + 5
+    while pool.stats()['busy'] == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    pool.submit('queued')
+
+    with pytest.raises(QueueFull) as excinfo:
+        pool.submit('rejected')
+
+    assert excinfo.value.depth == 1
+    assert excinfo.value.retry_after >= 1
+    assert pool.stats()['rejected'] == 1
+    release.set()
+
+
+def test_stage_overrun_fails_the_job():
+    def handler(job, payload):
+        with job.run_stage('decode'):
+            time.sleep(0.05)
+
+    pool = VoiceJobPool(handler, workers=1, stage_timeouts={'decode': 0.01})
+    job = pool.submit(None)
+
+    assert job.wait(5)
+    assert job.status == 'failed'
+    assert str(StageTimeout('decode', 0.01)) == job.error
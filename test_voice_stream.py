@@ -0,0 +1,90 @@
+import threading
+from array import array
+
+import pytest
+
+from audio_pipeline import TARGET_RATE
+import voice_stream
+from voice_stream import ChunkReader, EndOfSpeechDetector, VoiceStreamRegistry
+
+
+def tone(ms, amplitude):
+    """16-bit PCM alternating +/- amplitude (RMS == amplitude)"""
+    samples = TARGET_RATE * ms // 1000
+    return array('h', [amplitude if i % 2 else -amplitude for i in range(samples)]).tobytes()
+
+
+def test_end_of_speech_after_trailing_silence():
+    detector = EndOfSpeechDetector()
+
+    assert not detector.feed(tone(300, 20))    # background noise calibration
+    assert not detector.feed(tone(600, 4000))  # speech
+    assert not detector.feed(tone(300, 20))    # a short pause is not the end
+    assert detector.feed(tone(600, 20))
+    # Ends after calibration, speech and 23 silent 30 ms frames
+    assert detector.end_sample == TARGET_RATE * (300 + 600 + 23 * 30) // 1000
+
+
+def test_silence_alone_never_ends_speech():
+    detector = EndOfSpeechDetector()
+
+    assert not detector.feed(tone(3000, 20))
+
+
+def test_chunk_reader_blocks_until_fed():
+    reader = ChunkReader()
+    received = []
+    thread = threading.Thread(target=lambda: received.append(reader.read()))
+    thread.start()
+
+    reader.feed(b'abc')
+    reader.feed(b'def')
+    reader.finish()
+    thread.join(5)
+
+    assert b''.join(received) == b'abcdef'
+
+
+def test_chunks_must_arrive_in_order():
+    registry = VoiceStreamRegistry()
+    stream = registry.create('u1')
+
+    stream.add_chunk(0, b'one')
+    with pytest.raises(ValueError):
+        stream.add_chunk(2, b'three')
+    stream.add_chunk(1, b'two')
+
+    assert bytes(stream.received) == b'onetwo'
+
+
+def test_idle_streams_expire():
+    registry = VoiceStreamRegistry(ttl=10, max_streams=1)
+    stream = registry.create('u1')
+
+    assert registry.create('u2') is None
+    assert registry.expire(now=stream.last_activity + 11) == 1
+    assert registry.get(stream.id) is None
+    assert registry.create('u2') is not None
+
+
+def test_finished_streams_free_their_slot():
+    registry = VoiceStreamRegistry(max_streams=1)
+    stream = registry.create('u1')
+    stream.finish()
+
+    # Awaiting its reply, but no longer an open upload
+    other = registry.create('u2')
+    assert other is not None
+    assert registry.stats()['open'] == 1 and registry.stats()['awaiting_reply'] == 1
+
+    registry.remove(stream.id)
+    assert registry.get(stream.id) is None
+    assert registry.stats()['awaiting_reply'] == 0
+
+
+def test_finish_without_a_decoder_does_not_wait(monkeypatch):
+    monkeypatch.setattr(voice_stream, 'av', None)
+    stream = VoiceStreamRegistry().create('u1')
+
+    assert not stream.incremental
+    assert stream.wait_decoded(0)
@@ -0,0 +1,185 @@
+import logging
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) for each stage of a voice turn
+DEFAULT_STAGE_TIMEOUTS = {
+    'decode': 10,
+    'recognize': 15,
+    'respond': 15
+}
+
+
+class QueueFull(Exception):
+    """Raised by submit() when the job queue is at capacity"""
+
+    def __init__(self, depth, retry_after):
+        super().__init__(f"Voice job queue is full ({depth} queued)")
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+class StageTimeout(Exception):
+    """Raised when a stage of a job runs past its time budget"""
+
+    def __init__(self, stage, limit):
+        super().__init__(f"Stage '{stage}' exceeded {limit}s")
+        self.stage = stage
+        self.limit = limit
+
+
+class VoiceJob:
+    """One queued unit of work and its outcome"""
+
+    def __init__(self, payload, stage_timeouts):
+        self.id = uuid.uuid4().hex
+        self.payload = payload
+        self.stage_timeouts = stage_timeouts
+        self.status = 'queued'
+        self.stage = None
+        self.result = None
+        self.error = None
+        self.timings = {}
+        self.created = time.time()
+        self.finished = None
+        self._done = threading.Event()
+
+    def timeout(self, stage):
+        return self.stage_timeouts.get(stage)
+
+    @contextmanager
+    def run_stage(self, stage):
+        """Time a stage and fail the job if it overran its budget
+
+        Python threads can't be interrupted, so the budget should also be
+        passed to the blocking call itself (see timeout()); this guard makes
+        sure an overrun is reported rather than silently returned late.
+        """
+        self.stage = stage
+        started = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - started
+        self.timings[stage] = round(elapsed, 3)
+        limit = self.timeout(stage)
+        if limit is not None and elapsed > limit:
+            raise StageTimeout(stage, limit)
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'result': self.result,
+            'error': self.error,
+            'timings': self.timings
+        }
+
+
+class VoiceJobPool:
+    """Fixed set of worker threads draining a bounded job queue"""
+
+    def __init__(self, handler, workers=4, max_queue=64, stage_timeouts=None, job_ttl=300):
+        self.handler = handler
+        self.workers = workers
+        self.max_queue = max_queue
+        self.stage_timeouts = dict(DEFAULT_STAGE_TIMEOUTS, **(stage_timeouts or {}))
+        self.job_ttl = job_ttl
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._recent_durations = []
+
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"voice-worker-{i}", daemon=True).start()
+
+    def submit(self, payload):
+        """Queue a job, raising QueueFull when there is no room"""
+        self._expire()
+        job = VoiceJob(payload, self.stage_timeouts)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            depth = self._queue.qsize()
+            raise QueueFull(depth, self._retry_after(depth))
+        with self._lock:
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _retry_after(self, depth):
+        """Estimate seconds until a slot frees up from recent job durations"""
+        with self._lock:
+            durations = list(self._recent_durations)
+        average = sum(durations) / len(durations) if durations else 1.0
+        return max(1, round(average * depth / self.workers))
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                self._busy += 1
+            job.status = 'running'
+            started = time.perf_counter()
+            try:
+                job.result = self.handler(job, job.payload)
+                job.status = 'done'
+            except Exception as e:
+                logger.error(f"Voice job {job.id} failed in stage {job.stage}: {e}")
+                job.error = str(e)
+                job.status = 'failed'
+            finally:
+                job.payload = None
+                job.finished = time.time()
+                with self._lock:
+                    self._busy -= 1
+                    if job.status == 'done':
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+                    self._recent_durations.append(time.perf_counter() - started)
+                    del self._recent_durations[:-50]
+                job._done.set()
+                self._queue.task_done()
+
+    def _expire(self):
+        """Forget finished jobs nobody collected within job_ttl"""
+        cutoff = time.time() - self.job_ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished is not None and job.finished < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'busy': self._busy,
+                'queue_depth': self._queue.qsize(),
+                'max_queue': self.max_queue,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'tracked_jobs': len(self._jobs)
+            }
@@ -0,0 +1,265 @@
+import io
+import logging
+import math
+import threading
+import time
+import uuid
+from array import array
+
+from audio_pipeline import SAMPLE_WIDTH, TARGET_RATE, av
+
+logger = logging.getLogger(__name__)
+
+FRAME_MS = 30
+# Silence after speech that counts as the end of the utterance
+END_SILENCE_MS = 700
+# Leading audio used to estimate the background noise level
+NOISE_CALIBRATION_MS = 300
+MIN_SPEECH_RMS = 300
+DEFAULT_STREAM_TTL = 120
+
+
+class ChunkReader(io.RawIOBase):
+    """Blocking, non-seekable file object fed with uploaded chunks
+
+    The decoder thread reads from it as if it were a file; reads block until
+    the next chunk arrives or the upload is finished.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._buffer = bytearray()
+        self._finished = False
+        self._cond = threading.Condition()
+
+    def feed(self, data):
+        with self._cond:
+            self._buffer += data
+            self._cond.notify_all()
+
+    def finish(self):
+        with self._cond:
+            self._finished = True
+            self._cond.notify_all()
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        with self._cond:
+            while not self._buffer and not self._finished:
+                self._cond.wait()
+            count = min(len(target), len(self._buffer))
+            target[:count] = self._buffer[:count]
+            del self._buffer[:count]
+            return count
+
+
+class EndOfSpeechDetector:
+    """Energy-based voice activity detection over 16-bit mono PCM
+
+    Calibrates a noise floor from the first few hundred milliseconds, then
+    reports end of speech once speech has been heard and is followed by
+    END_SILENCE_MS of audio below the threshold.
+    """
+
+    def __init__(self, rate=TARGET_RATE, end_silence_ms=END_SILENCE_MS):
+        self.frame_samples = rate * FRAME_MS // 1000
+        self.end_silence_frames = end_silence_ms // FRAME_MS
+        self.calibration_frames = NOISE_CALIBRATION_MS // FRAME_MS
+        self.noise_levels = []
+        self.threshold = MIN_SPEECH_RMS
+        self.heard_speech = False
+        self.silent_frames = 0
+        self.ended = False
+        self.end_sample = None
+        self._pending = array('h')
+        self._samples = 0
+
+    def feed(self, pcm):
+        """Consume PCM bytes; return True once end of speech is detected"""
+        if self.ended:
+            return True
+        samples = array('h')
+        samples.frombytes(pcm[:len(pcm) - len(pcm) % SAMPLE_WIDTH])
+        self._pending.extend(samples)
+        while len(self._pending) >= self.frame_samples:
+            frame = self._pending[:self.frame_samples]
+            del self._pending[:self.frame_samples]
+            self._samples += len(frame)
+            if self._feed_frame(frame):
+                self.ended = True
+                self.end_sample = self._samples
+                return True
+        return False
+
+    def _feed_frame(self, frame):
+        rms = math.sqrt(sum(sample * sample for sample in frame) / len(frame))
+        if len(self.noise_levels) < self.calibration_frames:
+            self.noise_levels.append(rms)
+            self.threshold = max(MIN_SPEECH_RMS, 3 * sum(self.noise_levels) / len(self.noise_levels))
+            return False
+        if rms >= self.threshold:
+            self.heard_speech = True
+            self.silent_frames = 0
+        elif self.heard_speech:
+            self.silent_frames += 1
+        return self.heard_speech and self.silent_frames >= self.end_silence_frames
+
+
+class VoiceStream:
+    """One in-progress voice turn uploaded as chunks while the user speaks
+
+    With PyAV installed a decoder thread turns chunks into 16 kHz PCM as they
+    arrive and watches for end of speech, calling on_speech_end(stream) the
+    moment it is detected. Without PyAV the upload is decoded in one go when
+    it finishes.
+    """
+
+    def __init__(self, user_id, on_speech_end=None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.on_speech_end = on_speech_end
+        self.created = time.time()
+        self.last_activity = self.created
+        self.next_seq = 0
+        self.received = bytearray()
+        self.pcm = bytearray()
+        self.detector = EndOfSpeechDetector()
+        self.speech_ended = False
+        self.finished = False
+        self.decode_error = None
+        self.job = None
+        self.reply_text = None
+        self._lock = threading.Lock()
+        self._decoded = threading.Event()
+        self._reader = None
+
+        if av is not None:
+            self._reader = ChunkReader()
+            threading.Thread(target=self._decode_loop, name=f"voice-stream-{self.id[:8]}", daemon=True).start()
+        else:
+            # Nothing to wait for: the upload is decoded in one go at finish
+            self._decoded.set()
+
+    @property
+    def incremental(self):
+        return self._reader is not None
+
+    def add_chunk(self, seq, data):
+        """Append the chunk numbered seq; chunks must arrive in order"""
+        with self._lock:
+            if self.finished:
+                raise ValueError("Stream already finished")
+            if seq != self.next_seq:
+                raise ValueError(f"Expected chunk {self.next_seq}, got {seq}")
+            self.next_seq += 1
+            self.last_activity = time.time()
+            self.received += data
+        if self._reader is not None:
+            self._reader.feed(data)
+
+    def finish(self):
+        """Mark the upload complete; no more chunks will arrive"""
+        with self._lock:
+            self.finished = True
+            self.last_activity = time.time()
+        if self._reader is not None:
+            self._reader.finish()
+
+    def wait_decoded(self, timeout=None):
+        return self._decoded.wait(timeout)
+
+    def utterance_pcm(self):
+        """PCM up to the detected end of speech (or everything decoded)"""
+        if self.detector.end_sample is not None:
+            return bytes(self.pcm[:self.detector.end_sample * SAMPLE_WIDTH])
+        return bytes(self.pcm)
+
+    def _decode_loop(self):
+        try:
+            resampler = av.AudioResampler(format='s16', layout='mono', rate=TARGET_RATE)
+            with av.open(self._reader, format='webm') as container:
+                for frame in container.decode(audio=0):
+                    for resampled in resampler.resample(frame):
+                        self._on_pcm(bytes(resampled.planes[0])[:resampled.samples * SAMPLE_WIDTH])
+            for resampled in resampler.resample(None):
+                self._on_pcm(bytes(resampled.planes[0])[:resampled.samples * SAMPLE_WIDTH])
+        except Exception as e:
+            logger.warning(f"Incremental decode of voice stream {self.id} failed: {e}")
+            self.decode_error = e
+        finally:
+            self._decoded.set()
+
+    def _on_pcm(self, pcm):
+        self.pcm += pcm
+        if not self.speech_ended and self.detector.feed(pcm):
+            self.speech_ended = True
+            logger.debug(f"End of speech in voice stream {self.id} at {self.detector.end_sample} samples")
+            if self.on_speech_end is not None:
+                self.on_speech_end(self)
+
+    def to_dict(self):
+        return {
+            'stream_id': self.id,
+            'received_bytes': len(self.received),
+            'decoded_seconds': round(len(self.pcm) / SAMPLE_WIDTH / TARGET_RATE, 2),
+            'speech_ended': self.speech_ended,
+            'finished': self.finished,
+            'incremental': self.incremental
+        }
+
+
+class VoiceStreamRegistry:
+    """Tracks voice streams and drops idle ones
+
+    Only unfinished uploads count against max_streams; callers remove() a
+    stream once its reply has been served so its audio is freed right away.
+    """
+
+    def __init__(self, ttl=DEFAULT_STREAM_TTL, max_streams=256):
+        self.ttl = ttl
+        self.max_streams = max_streams
+        self.expired = 0
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def create(self, user_id, on_speech_end=None):
+        self.expire()
+        with self._lock:
+            if sum(not s.finished for s in self._streams.values()) >= self.max_streams:
+                return None
+            stream = VoiceStream(user_id, on_speech_end)
+            self._streams[stream.id] = stream
+            return stream
+
+    def get(self, stream_id):
+        with self._lock:
+            return self._streams.get(stream_id)
+
+    def remove(self, stream_id):
+        with self._lock:
+            stream = self._streams.pop(stream_id, None)
+        if stream is not None:
+            stream.finish()
+
+    def expire(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            idle = [s for s in self._streams.values() if now - s.last_activity > self.ttl]
+            for stream in idle:
+                del self._streams[stream.id]
+            self.expired += len(idle)
+        for stream in idle:
+            # Unblock the decoder thread of an abandoned stream
+            stream.finish()
+        return len(idle)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'open': sum(not s.finished for s in self._streams.values()),
+                'awaiting_reply': sum(s.finished for s in self._streams.values()),
+                'expired': self.expired,
+                'max_streams': self.max_streams
+            }